@@ -8,8 +8,21 @@ from loguru import logger as log
 
 from app.config import settings
 from app.db.database import get_db_connection_pool
+from app.images.image_logic import extract_image_metadata
 from app.models.enums import HTTPStatus
-from app.projects.project_logic import process_all_drone_images, process_drone_images
+from app.projects import odm_poller
+from app.projects.image_processing import process_assets_from_odm
+from app.projects.project_logic import (
+    build_project_orthomosaic,
+    process_all_drone_images,
+    process_drone_images,
+)
+from app.projects.split_merge import (
+    merge_submodels,
+    process_split_merge,
+    process_submodel_from_odm,
+)
+from app.s3 import s3_client
 
 
 async def startup(ctx: Dict[Any, Any]) -> None:
@@ -24,11 +37,22 @@ async def startup(ctx: Dict[Any, Any]) -> None:
     ctx["db_pool"] = await get_db_connection_pool()
     log.info("Database pool initialized")
 
+    # Create the shared S3 client, reused by all jobs in this worker
+    s3_client()
+
+    # Poll the progress of ODM tasks, see odm_poller
+    ctx["odm_poller"] = asyncio.create_task(odm_poller.run(ctx))
+
 
 async def shutdown(ctx: Dict[Any, Any]) -> None:
     """Cleanup ARQ resources"""
     log.info("Shutting down ARQ worker")
 
+    # Stop polling ODM tasks
+    if poller := ctx.get("odm_poller"):
+        poller.cancel()
+        await asyncio.gather(poller, return_exceptions=True)
+
     # Close Redis
     if redis := ctx.get("redis"):
         await redis.close()
@@ -84,6 +108,12 @@ class WorkerSettings:
         count_project_tasks,
         process_drone_images,
         process_all_drone_images,
+        process_assets_from_odm,
+        process_split_merge,
+        process_submodel_from_odm,
+        merge_submodels,
+        build_project_orthomosaic,
+        extract_image_metadata,
     ]
 
     queue_name = "default_queue"
@@ -2,7 +2,7 @@ import os
 import base64
 import secrets
 from functools import lru_cache
-from typing import Annotated, Any, Optional, Union
+from typing import Annotated, Any, Literal, Optional, Union
 
 import bcrypt
 from loguru import logger as log
@@ -90,6 +90,29 @@ class Settings(BaseSettings):
     FRONTEND_URL: str = "http://localhost:3040"
     BACKEND_URL: str = "http://localhost:8000"
     NODE_ODM_URL: Optional[str] = "http://nodeodm:9900"
+    # More nodes to schedule processing on, comma separated, each with an
+    # optional capacity weight, e.g. "http://odm1:3000|2,http://odm2:3000"
+    NODE_ODM_URLS: Optional[str] = ""
+    # Nodes not answering /info within this many seconds are tried last
+    NODE_ODM_HEALTH_TIMEOUT: float = 5
+    # Projects with more images are processed as submodels of adjacent
+    # tasks, each of at most this many images counting the overlap with
+    # neighbouring tasks, then merged
+    SPLIT_MERGE_MAX_IMAGES: int = 1500
+    # Bounds of the interval between polls of an ODM task's progress, in
+    # seconds. It doubles while the progress stalls.
+    ODM_POLL_MIN_INTERVAL: float = 5
+    ODM_POLL_MAX_INTERVAL: float = 120
+    # Staging of images before processing, for projects enabling it (see
+    # image_staging): the processes resampling images, their JPEG quality,
+    # and the culling thresholds, in metres
+    IMAGE_STAGING_WORKERS: int = 4
+    IMAGE_STAGING_QUALITY: int = 90
+    IMAGE_CULL_MIN_DISTANCE: float = 1
+    IMAGE_CULL_AREA_MARGIN: float = 50
+    # Stream imagery from S3 straight to NodeODM, instead of staging on disk.
+    # Off by default: the streamed sizes are not checked against the manifest
+    NODE_ODM_DIRECT_UPLOAD: bool = False
     REDIS_DSN: str = "redis://redis:6379/0"
 
     S3_ENDPOINT: str = "http://minio:9000"
@@ -97,9 +120,31 @@ class Settings(BaseSettings):
     S3_SECRET_KEY: Optional[str] = ""
     S3_BUCKET_NAME: str = "dtm-bucket"
     S3_DOWNLOAD_ROOT: Optional[str] = None
+    # Set to skip the bucket location lookup when presigning URLs
+    S3_REGION: Optional[str] = None
+    # Connections kept alive per S3 host, shared by all threads of a process
+    S3_POOL_MAXSIZE: int = 32
+    S3_CONNECT_TIMEOUT: float = 10
+    S3_READ_TIMEOUT: float = 300
+    S3_MAX_RETRIES: int = 5
+    # Parallel multipart mode for large server-side uploads, e.g. ODM outputs
+    S3_UPLOAD_PART_SIZE: int = 64 * 1024 * 1024
+    S3_UPLOAD_CONCURRENCY: int = 8
+    # Part size suggested to browsers for multipart uploads (S3 minimum 5 MiB)
+    S3_MULTIPART_PART_SIZE: int = 16 * 1024 * 1024
 
     JAXA_AUTH_TOKEN: Optional[str] = ""
 
+    # Clustered vector tiles for the global project map
+    CENTROID_TILE_CACHE_SIZE: int = 2048
+    CENTROID_TILE_MAX_CLUSTER_ZOOM: int = 14
+
+    # Lossy compression of orthophoto COGs, and its quality (1-100)
+    ORTHOPHOTO_COMPRESSION: Literal["JPEG", "WEBP"] = "JPEG"
+    ORTHOPHOTO_QUALITY: int = 85
+    # Orthophoto raster tiles kept in memory, per API process
+    ORTHOPHOTO_TILE_CACHE_SIZE: int = 512
+
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 60 * 24 * 1  # 1 day
     REFRESH_TOKEN_EXPIRE_MINUTES: int = 60 * 60 * 24 * 8  # 8 day
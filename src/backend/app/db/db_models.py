@@ -4,6 +4,7 @@ from typing import cast
 from geoalchemy2 import Geometry, WKBElement
 from sqlalchemy import (
     ARRAY,
+    BigInteger,
     Boolean,
     Column,
     DateTime,
@@ -15,6 +16,8 @@ from sqlalchemy import (
     LargeBinary,
     SmallInteger,
     String,
+    UniqueConstraint,
+    text,
 )
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import (
@@ -103,6 +106,8 @@ class DbProject(Base):
     per_task_instructions = cast(str, Column(String))
     created_at = cast(datetime, Column(DateTime, default=timestamp, nullable=False))
     last_updated = cast(datetime, Column(DateTime, default=timestamp))
+    # Bumped by triggers on any change to the project, its tasks or events
+    version = cast(int, Column(BigInteger, nullable=False, server_default="0"))
     deadline_at = cast(datetime, Column(DateTime, default=timestamp))
     # GEOMETRY
     outline = cast(WKBElement, Column(Geometry("POLYGON", srid=4326)))
@@ -125,6 +130,12 @@ class DbProject(Base):
     gsd_cm_px = cast(float, Column(Float, nullable=True))  # in cm_px
     altitude_from_ground = cast(float, Column(Float, nullable=True))
     gsd_cm_px = cast(float, Column(Float, nullable=True))
+    # Images are downscaled to this GSD before processing, when set
+    processing_gsd_cm_px = cast(float, Column(Float, nullable=True))
+    # Leave out images taken outside the task area, or at the same position
+    cull_images = cast(
+        bool, Column(Boolean, nullable=False, server_default=text("false"))
+    )
     camera_bearings = cast(list[int], Column(ARRAY(SmallInteger), nullable=True))
     gimble_angles_degrees = cast(list, Column(ARRAY(SmallInteger), nullable=True))
     is_terrain_follow = cast(bool, Column(Boolean, default=False))
@@ -195,6 +206,7 @@ class DbProject(Base):
 
     __table_args__ = (
         Index("idx_geometry", outline, postgresql_using="gist"),
+        Index("idx_projects_centroid", centroid, postgresql_using="gist"),
         {},
     )
 
@@ -251,10 +263,150 @@ class TaskEvent(Base):
     __table_args__ = (
         Index("idx_task_event_composite", "task_id", "project_id"),
         Index("idx_task_event_project_id_user_id", "user_id", "project_id"),
+        Index("idx_task_event_project_id_created_at", "project_id", "created_at"),
     )
     updated_at = cast(datetime, Column(DateTime, nullable=True))
 
 
+class DbImage(Base):
+    """Manifest of the images uploaded for each task."""
+
+    __tablename__ = "images"
+
+    id = cast(
+        str,
+        Column(
+            UUID(as_uuid=True),
+            primary_key=True,
+            server_default=text("gen_random_uuid()"),
+        ),
+    )
+    project_id = cast(
+        str, Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False)
+    )
+    task_id = cast(
+        str, Column(UUID(as_uuid=True), ForeignKey("tasks.id"), nullable=False)
+    )
+    name = cast(str, Column(String, nullable=False))
+    s3_key = cast(str, Column(String, nullable=False))
+    size = cast(int, Column(BigInteger, nullable=True))
+    etag = cast(str, Column(String, nullable=True))
+    uploaded_at = cast(datetime, Column(DateTime(timezone=True), nullable=True))
+    # From the image EXIF GPS tags, when known
+    location = cast(
+        WKBElement,
+        Column(Geometry("POINT", srid=4326, spatial_index=False), nullable=True),
+    )
+    # Metadata read from the image header after upload, see
+    # image_logic.extract_image_metadata
+    altitude = cast(float, Column(Float, nullable=True))
+    relative_altitude = cast(float, Column(Float, nullable=True))
+    captured_at = cast(datetime, Column(DateTime(timezone=True), nullable=True))
+    camera_make = cast(str, Column(String, nullable=True))
+    camera_model = cast(str, Column(String, nullable=True))
+    focal_length_35mm = cast(float, Column(Float, nullable=True))
+    gimbal_yaw = cast(float, Column(Float, nullable=True))
+    gimbal_pitch = cast(float, Column(Float, nullable=True))
+    width = cast(int, Column(Integer, nullable=True))
+    height = cast(int, Column(Integer, nullable=True))
+    metadata_read_at = cast(datetime, Column(DateTime(timezone=True), nullable=True))
+    # Name of the file on the NodeODM node, and in the ODM outputs, recorded
+    # when it is staged for processing
+    node_name = cast(str, Column(String, nullable=True))
+
+    __table_args__ = (
+        UniqueConstraint("task_id", "name", name="uq_images_task_id_name"),
+        Index("idx_images_project_id", "project_id"),
+        Index("idx_images_location", location, postgresql_using="gist"),
+    )
+
+
+class DbImageFootprint(Base):
+    """Ground footprint of each processed task image, for GCP lookups."""
+
+    __tablename__ = "image_footprints"
+
+    id = cast(
+        str,
+        Column(
+            UUID(as_uuid=True),
+            primary_key=True,
+            server_default=text("gen_random_uuid()"),
+        ),
+    )
+    project_id = cast(
+        str, Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False)
+    )
+    task_id = cast(
+        str, Column(UUID(as_uuid=True), ForeignKey("tasks.id"), nullable=False)
+    )
+    # The uploaded image, from the images manifest
+    name = cast(str, Column(String, nullable=False))
+    s3_key = cast(str, Column(String, nullable=False))
+    # Image size in pixels
+    width = cast(int, Column(Integer, nullable=False))
+    height = cast(int, Column(Integer, nullable=False))
+    # Corners of the image, from its top left corner clockwise
+    footprint = cast(
+        WKBElement,
+        Column(Geometry("POLYGON", srid=4326, spatial_index=False), nullable=False),
+    )
+
+    __table_args__ = (
+        UniqueConstraint("task_id", "name", name="uq_image_footprints_task_id_name"),
+        Index("idx_image_footprints_project_id", "project_id"),
+        Index("idx_image_footprints_footprint", footprint, postgresql_using="gist"),
+    )
+
+
+class DbODMTask(Base):
+    """The NodeODM node owning each ODM task created for processing."""
+
+    __tablename__ = "odm_tasks"
+
+    # The NodeODM task UUID
+    id = cast(str, Column(String, primary_key=True))
+    node_url = cast(str, Column(String, nullable=False))
+    project_id = cast(
+        str, Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False)
+    )
+    # Not set for tasks processing a whole project
+    task_id = cast(
+        str, Column(UUID(as_uuid=True), ForeignKey("tasks.id"), nullable=True)
+    )
+    created_at = cast(
+        datetime,
+        Column(DateTime(timezone=True), nullable=False, server_default=text("now()")),
+    )
+    # Split-merge processing: the submodel index, the number of submodels of
+    # the run, and the tasks it covers
+    submodel = cast(int, Column(Integer, nullable=True))
+    submodel_count = cast(int, Column(Integer, nullable=True))
+    task_ids = cast(list, Column(ARRAY(UUID(as_uuid=True)), nullable=True))
+    status = cast(
+        ImageProcessingStatus, Column(Enum(ImageProcessingStatus), nullable=True)
+    )
+
+
+class DbMultipartUpload(Base):
+    """The file sent by each unfinished browser-direct multipart upload."""
+
+    __tablename__ = "multipart_uploads"
+
+    # The S3 upload ID
+    id = cast(str, Column(String, primary_key=True))
+    project_id = cast(
+        str, Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False)
+    )
+    s3_key = cast(str, Column(String, nullable=False, unique=True))
+    size = cast(int, Column(BigInteger, nullable=False))
+    fingerprint = cast(str, Column(String, nullable=False))
+    created_at = cast(
+        datetime,
+        Column(DateTime(timezone=True), nullable=False, server_default=text("now()")),
+    )
+
+
 class Drone(Base):
     __tablename__ = "drones"
 
@@ -1,372 +1,393 @@
-import math
+import asyncio
+import json
 import uuid
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional
 
-import requests
+import numpy as np
+import shapely
 from loguru import logger as log
-from pyproj import Transformer
-from shapely.geometry import Point, Polygon
+from minio import S3Error
+from psycopg import Connection
 
 from app.config import settings
-from app.s3 import get_presigned_url
+from app.gcp import gcp_schemas
+from app.models.enums import State
+from app.s3 import async_s3_client
 from app.waypoints import waypoint_schemas
 
+# Diagonal field of view of the camera, in degrees (DJI Mini 4 Pro)
+DEFAULT_FOV_DEGREE = 82.1
+EARTH_RADIUS = 6378137
+# Corners of an image relative to its centre, in fractions of its size along
+# the image axes (right, up), from the top left corner clockwise
+IMAGE_CORNERS = np.array([[-0.5, 0.5], [0.5, 0.5], [0.5, -0.5], [-0.5, -0.5]])
 
-async def calculate_bounding_box(
-    lat: float,
-    long: float,
-    width: float,
-    height: float,
-    focal_ratio: float,
-    fnumber: float,
+
+def calculate_footprints(
+    longitudes: np.ndarray,
+    latitudes: np.ndarray,
+    widths: np.ndarray,
+    heights: np.ndarray,
+    yaws: np.ndarray,
     altitude: float,
-    sensor_width: float = 6.17,  # These are drone specific
-    sensor_height: float = 4.55,  # These are drone specific
-) -> List[float]:
-    """Calculate the geographic bounding box of an image taken by a drone.
+    fov_degree: float = DEFAULT_FOV_DEGREE,
+) -> np.ndarray:
+    """Calculate the ground footprints of nadir images, all at once.
+
+    The size of a footprint follows from the flight altitude and the diagonal
+    field of view of the camera, see
+    https://www.techforwildlife.com/blog/2019/1/29/calculating-a-drone-cameras-image-footprint
 
     Args:
-        lat (float): Latitude of the image center.
-        long (float): Longitude of the image center.
-        width (int): Image width in pixels.
-        height (int): Image height in pixels.
-        focal_ratio (float): Focal ratio of the camera.
-        fnumber (float): Aperture number of the camera.
-        altitude (float): Altitude of the drone in meters.
-        sensor_width (float): Physical width of the sensor in mm (default: 6.17mm).
-        sensor_height (float): Physical height of the sensor in mm (default: 4.55mm).
+        longitudes (np.ndarray): Longitudes of the image centres.
+        latitudes (np.ndarray): Latitudes of the image centres.
+        widths (np.ndarray): Image widths in pixels.
+        heights (np.ndarray): Image heights in pixels.
+        yaws (np.ndarray): Camera yaws, in degrees clockwise from north.
+        altitude (float): Flight altitude above ground, in metres.
+        fov_degree (float): Diagonal field of view of the camera.
 
     Returns:
-        dict: Bounding box with north, south, east, west bounds.
+        np.ndarray: The (longitude, latitude) of the corners of each image, of
+            shape (n, 4, 2), ordered like IMAGE_CORNERS.
     """
-    # Convert sensor dimensions to meters
-    sensor_width_m = sensor_width / 1000
-    sensor_height_m = sensor_height / 1000
-
-    # Calculate the focal length in meters
-    focal_length = fnumber * focal_ratio
-
-    # Calculate GSD (Ground Sampling Distance)
-    gsd_width = (sensor_width_m * altitude) / (focal_length * width)
-    gsd_height = (sensor_height_m * altitude) / (focal_length * height)
-
-    # Calculate the ground coverage of the image
-    coverage_width = gsd_width * width
-    coverage_height = gsd_height * height
-
-    # Earth radius in meters
-    earth_radius = 6378137
-
-    # Calculate latitudinal and longitudinal offsets
-    delta_lat = (coverage_height / 2) / earth_radius * (180 / math.pi)
-    delta_lon = (
-        (coverage_width / 2)
-        / (earth_radius * math.cos(math.radians(lat)))
-        * (180 / math.pi)
+    aspect_ratio = widths / heights
+    diagonal = 2 * altitude * np.tan(np.radians(fov_degree) / 2)
+    ground_height = diagonal / np.sqrt(1 + aspect_ratio**2)
+    ground_width = aspect_ratio * ground_height
+
+    # Offsets of the corners from the image centre in metres, along the image
+    # axes, then rotated by the yaw to east and north
+    right = IMAGE_CORNERS[:, 0] * ground_width[:, None]
+    up = IMAGE_CORNERS[:, 1] * ground_height[:, None]
+    yaw = np.radians(yaws)[:, None]
+    east = right * np.cos(yaw) + up * np.sin(yaw)
+    north = up * np.cos(yaw) - right * np.sin(yaw)
+
+    latitudes = latitudes[:, None]
+    corner_longitudes = longitudes[:, None] + np.degrees(
+        east / (EARTH_RADIUS * np.cos(np.radians(latitudes)))
     )
+    corner_latitudes = latitudes + np.degrees(north / EARTH_RADIUS)
+    return np.stack([corner_longitudes, corner_latitudes], axis=-1)
 
-    # Bounding box coordinates
-    north = lat + delta_lat
-    south = lat - delta_lat
-    east = long + delta_lon
-    west = long - delta_lon
-
-    return [west, south, east, north]
-
-
-def fetch_json_from_presigned_url(url: str):
-    """Fetch a JSON file from an AWS presigned URL."""
-    try:
-        response = requests.get(url)
-        response.raise_for_status()  # Raise an exception for HTTP errors
-        return response.json()
-    except Exception as e:
-        log.warning(f"Error fetching JSON file: {e}")
-        return None
-
-
-async def find_matching_images_that_contains_point(bounding_boxes, gps_coordinate):
-    """Find images whose bounding boxes contain the specified GPS coordinate."""
-    matching_images = []
-    point = Point(gps_coordinate)  # Longitude, Latitude format
-    for filename, bbox in bounding_boxes.items():
-        min_lon, min_lat, max_lon, max_lat = bbox
-        polygon = Polygon(
-            [
-                (min_lon, min_lat),
-                (min_lon, max_lat),
-                (max_lon, max_lat),
-                (max_lon, min_lat),
-                (min_lon, min_lat),
-            ]
-        )
-
-        if polygon.contains(point):
-            matching_images.append(filename)
-    return matching_images
-
-
-async def calculate_bbox_from_images_file(
-    images_json_url: str, fov_degree: float, altitude: float
-):
-    """Create bounding boxes for all images from a presigned JSON file URL."""
-    # Fetch the JSON data from the presigned URL
-    images = fetch_json_from_presigned_url(images_json_url)
-
-    # Calculate bounding boxes for each image
-    bounding_boxes = {}
-    for image in images or []:
-        filename = image["filename"]
-        lat = image["latitude"]
-        lon = image["longitude"]
-        width = image["width"]
-        height = image["height"]
-
-        aspect_ratio = width / height
 
-        bbox = await calc_bbox(lat, lon, altitude, fov_degree, aspect_ratio)
-        bounding_boxes[filename] = bbox
-    return bounding_boxes
+def calculate_pixel_coordinates(
+    corners: np.ndarray,
+    widths: np.ndarray,
+    heights: np.ndarray,
+    points: np.ndarray,
+) -> np.ndarray:
+    """Locate points in images from their footprints, all at once.
 
+    The footprints are treated as planar parallelograms, which holds at the
+    scale of an image.
 
-async def calculate_footprints_of_image(altitude, fov_in_degree, aspect_ratio):
-    """Calculate the width (A) and height (B) of an image given:
-    - altitude: Drone height
-    - fov_in_degree: Field of View (in degrees)
-    - aspect_ratio: Aspect Ratio (width/height)
-
-    The calculations is done based on this blog post:
-    https://www.techforwildlife.com/blog/2019/1/29/calculating-a-drone-cameras-image-footprint
+    Args:
+        corners (np.ndarray): The corners of each footprint, of shape
+            (n, 4, 2), see calculate_footprints.
+        widths (np.ndarray): Image widths in pixels.
+        heights (np.ndarray): Image heights in pixels.
+        points (np.ndarray): The (longitude, latitude) of the point to locate
+            in each image, of shape (n, 2).
 
     Returns:
-    - Width of the image , Height of the image
+        np.ndarray: The (x, y) pixel coordinates of each point, from the top
+            left corner of its image, of shape (n, 2).
     """
-    # Convert theta from degrees to radians
-    fov_in_radian = math.radians(fov_in_degree)
-
-    # Calculate the diagonal of the image (D)
-    D = 2 * altitude * math.tan(fov_in_radian / 2)
-
-    # Calculate width of the image
-    width = D / math.sqrt(1 + aspect_ratio**2)
-
-    # Calculate height of the image
-    height = (aspect_ratio * D) / math.sqrt(1 + aspect_ratio**2)
-
-    return width, height
-
-
-async def calc_bbox(lat, long, altitude, fov_degree, aspect_ratio):
-    # Define the bounding box coordinates in EPSG:3857
-    # Update offset function to work with EPSG:3857 coordinates
-    async def offset_coordinates_3857(x, y, dx, dy):
-        """Calculate new coordinates in EPSG:3857 given distance offsets."""
-        new_x = x + dx
-        new_y = y + dy
-        return new_x, new_y
-
-    # Initialize transformer for WGS84 to EPSG:3857 and vice versa
-    wgs84_to_3857 = Transformer.from_crs("EPSG:4326", "EPSG:3857", always_xy=True)
-    epsg_3857_to_wgs84 = Transformer.from_crs("EPSG:3857", "EPSG:4326", always_xy=True)
-
-    # Convert centroid coordinates to EPSG:3857
-    centroid_3857 = wgs84_to_3857.transform(long, lat)
-
-    # Calculate the width and height of the image footprint
-    footprint_width, footprint_height = await calculate_footprints_of_image(
-        altitude, fov_degree, aspect_ratio
+    if not len(points):
+        return np.empty((0, 2))
+    # Degrees of longitude shrink with the latitude
+    scale = np.stack([np.cos(np.radians(points[:, 1])), np.ones(len(points))], axis=-1)
+    top_left = corners[:, 0]
+    # Solve for the point as a combination of the image's top and left edges
+    edges = np.stack(
+        [(corners[:, 1] - top_left) * scale, (corners[:, 3] - top_left) * scale],
+        axis=-1,
     )
+    fractions = np.linalg.solve(edges, ((points - top_left) * scale)[..., None])
+    return fractions[..., 0] * np.stack([widths, heights], axis=-1)
 
-    # Calculate half-width and half-height in meters (same as before)
-    half_width = footprint_width / 2
-    half_height = footprint_height / 2
 
-    # Calculate the four corners in EPSG:3857
-    top_left_3857 = await offset_coordinates_3857(
-        centroid_3857[0], centroid_3857[1], -half_width, half_height
-    )
-    top_right_3857 = await offset_coordinates_3857(
-        centroid_3857[0], centroid_3857[1], half_width, half_height
-    )
-    bottom_right_3857 = await offset_coordinates_3857(
-        centroid_3857[0], centroid_3857[1], half_width, -half_height
-    )
-    bottom_left_3857 = await offset_coordinates_3857(
-        centroid_3857[0], centroid_3857[1], -half_width, -half_height
-    )
+async def save_task_footprints(
+    db: Connection,
+    project_id: uuid.UUID,
+    task_id: uuid.UUID,
+    images: List[dict],
+) -> int:
+    """Compute and store the footprints of the processed images of a task.
 
-    # Convert corners back to WGS84
-    top_left_wgs84 = epsg_3857_to_wgs84.transform(top_left_3857[0], top_left_3857[1])
-    top_right_wgs84 = epsg_3857_to_wgs84.transform(top_right_3857[0], top_right_3857[1])
-    bottom_right_wgs84 = epsg_3857_to_wgs84.transform(
-        bottom_right_3857[0], bottom_right_3857[1]
-    )
-    bottom_left_wgs84 = epsg_3857_to_wgs84.transform(
-        bottom_left_3857[0], bottom_left_3857[1]
-    )
+    ODM names the images by their names on the node, which are matched to
+    the manifest through the node names recorded when staging. Images
+    without a match, e.g. of tasks staged before node names were recorded,
+    are left out.
 
-    # Extract longitude and latitude values
-    longitudes = [
-        top_left_wgs84[0],
-        top_right_wgs84[0],
-        bottom_right_wgs84[0],
-        bottom_left_wgs84[0],
-    ]
-    latitudes = [
-        top_left_wgs84[1],
-        top_right_wgs84[1],
-        bottom_right_wgs84[1],
-        bottom_left_wgs84[1],
-    ]
+    Args:
+        images (List[dict]): The entries of the images.json output by ODM.
 
-    # Calculate the bounding box: [min_longitude, min_latitude, max_longitude, max_latitude]
-    bbox = [
-        min(longitudes),  # min_longitude
-        min(latitudes),  # min_latitude
-        max(longitudes),  # max_longitude
-        max(latitudes),  # max_latitude
+    Returns:
+        int: The number of footprints stored.
+    """
+    async with db.cursor() as cur:
+        await cur.execute(
+            "SELECT altitude_from_ground FROM projects WHERE id = %(project_id)s",
+            {"project_id": project_id},
+        )
+        row = await cur.fetchone()
+    altitude = row[0] if row else None
+    if not altitude:
+        log.warning(f"Project {project_id} has no altitude, can't compute footprints")
+        return 0
+
+    images = [
+        image
+        for image in images
+        if image.get("latitude") is not None
+        and image.get("longitude") is not None
+        and image.get("width")
+        and image.get("height")
     ]
+    widths = np.array([image["width"] for image in images], dtype=int)
+    heights = np.array([image["height"] for image in images], dtype=int)
+    corners = calculate_footprints(
+        np.array([image["longitude"] for image in images], dtype=float),
+        np.array([image["latitude"] for image in images], dtype=float),
+        widths,
+        heights,
+        np.array([image.get("yaw") or 0 for image in images], dtype=float),
+        altitude,
+    )
+    # Closed rings
+    footprints = shapely.polygons(np.concatenate([corners, corners[:, :1]], axis=1))
+    node_names = [image["filename"] for image in images]
+
+    async with db.cursor() as cur:
+        await cur.execute(
+            """
+            INSERT INTO image_footprints
+                (project_id, task_id, name, s3_key, width, height, footprint)
+            -- The uploaded images may be larger than the processed ones, see
+            -- image_staging
+            SELECT %(project_id)s, %(task_id)s, i.name, i.s3_key,
+                COALESCE(i.width, f.width), COALESCE(i.height, f.height),
+                ST_GeomFromWKB(f.footprint, 4326)
+            FROM unnest(
+                %(node_names)s::text[],
+                %(widths)s::int[],
+                %(heights)s::int[],
+                %(footprints)s::bytea[]
+            ) AS f(node_name, width, height, footprint)
+            JOIN images i ON i.task_id = %(task_id)s AND i.node_name = f.node_name
+            ON CONFLICT (task_id, name) DO UPDATE
+            SET s3_key = EXCLUDED.s3_key,
+                width = EXCLUDED.width,
+                height = EXCLUDED.height,
+                footprint = EXCLUDED.footprint
+            RETURNING name
+            """,
+            {
+                "project_id": project_id,
+                "task_id": task_id,
+                "node_names": node_names,
+                "widths": widths.tolist(),
+                "heights": heights.tolist(),
+                "footprints": list(shapely.to_wkb(footprints)),
+            },
+        )
+        names = [row[0] for row in await cur.fetchall()]
+        if len(names) < len(node_names):
+            log.warning(
+                f"{len(node_names) - len(names)} processed images of task "
+                f"{task_id} aren't in its manifest, they have no footprint"
+            )
+        await cur.execute(
+            """
+            DELETE FROM image_footprints
+            WHERE task_id = %(task_id)s AND name <> ALL(%(names)s::text[])
+            """,
+            {"task_id": task_id, "names": names},
+        )
+    log.info(f"Stored {len(names)} image footprints of task {task_id}")
+    return len(names)
 
-    return bbox
-
-
-def find_images_with_coordinate(
-    bounding_boxes: Dict[str, Tuple[float, float, float, float]],
-    gps_coordinate: Tuple[float, float],
-) -> List[str]:
-    """Find images whose bounding boxes contain the specified GPS coordinate.
 
-    Parameters:
-        bounding_boxes (Dict[str, Tuple[float, float, float, float]]):
-            A dictionary where keys are image filenames, and values are bounding box coordinates
-            as (min_longitude, min_latitude, max_longitude, max_latitude).
-        gps_coordinate (Tuple[float, float]):
-            A GPS coordinate as a tuple (longitude, latitude).
+async def save_missing_footprints(
+    db: Connection, project_id: uuid.UUID, task_id: Optional[uuid.UUID] = None
+):
+    """Store the footprints of processed tasks which have none.
 
-    Returns:
-        List[str]: A list of image filenames whose bounding boxes contain the GPS coordinate.
+    Footprints are stored when a task is processed. Tasks processed before
+    that get them from their images.json in S3, on their first lookup, if
+    the node names of their images were recorded.
     """
-    matching_images: List[str] = []
-    point = Point(
-        gps_coordinate
-    )  # Create a point for the GPS coordinate (longitude, latitude)
-
-    for filename, bbox in bounding_boxes.items():
-        min_lon, min_lat, max_lon, max_lat = bbox
-        # Create a polygon for the bounding box
-        polygon = Polygon(
-            [
-                (min_lon, min_lat),
-                (min_lon, max_lat),
-                (max_lon, max_lat),
-                (max_lon, min_lat),
-                (min_lon, min_lat),
-            ]
+    async with db.cursor() as cur:
+        await cur.execute(
+            """
+            SELECT t.id
+            FROM tasks t
+            JOIN LATERAL (
+                SELECT state
+                FROM task_events
+                WHERE task_id = t.id
+                ORDER BY created_at DESC
+                LIMIT 1
+            ) te ON true
+            WHERE t.project_id = %(project_id)s
+                AND (%(task_id)s::uuid IS NULL OR t.id = %(task_id)s::uuid)
+                AND te.state = %(state)s
+                AND NOT EXISTS (
+                    SELECT 1 FROM image_footprints f WHERE f.task_id = t.id
+                )
+                AND EXISTS (
+                    SELECT 1
+                    FROM images i
+                    WHERE i.task_id = t.id AND i.node_name IS NOT NULL
+                )
+            """,
+            {
+                "project_id": project_id,
+                "task_id": task_id,
+                "state": State.IMAGE_PROCESSING_FINISHED.name,
+            },
         )
-        # Check if the point is within the polygon
-        if polygon.contains(point):
-            matching_images.append(filename)
+        task_ids = [row[0] for row in await cur.fetchall()]
+    if not task_ids:
+        return
+
+    s3 = async_s3_client()
+
+    async def get_images_json(task_id: uuid.UUID) -> Optional[list]:
+        s3_path = f"dtm-data/projects/{project_id}/{task_id}/images.json"
+        try:
+            return json.loads(await s3.get(settings.S3_BUCKET_NAME, s3_path))
+        except (S3Error, ValueError) as e:
+            log.warning(f"Can't read {s3_path}: {e}")
+            return None
 
-    return matching_images
+    images_jsons = await asyncio.gather(*(get_images_json(id) for id in task_ids))
+    for task_id, images in zip(task_ids, images_jsons):
+        if images:
+            await save_task_footprints(db, project_id, task_id, images)
 
 
-async def find_images_in_a_project_for_point(
+async def find_images_for_point(
+    db: Connection,
     project_id: uuid.UUID,
-    task_id_list: List[uuid.UUID],
     point: waypoint_schemas.PointField,
-    fov_degree: float,
-    altitude: float,
+    task_id: Optional[uuid.UUID] = None,
 ) -> List[str]:
-    """Process images to find those containing a specific point and return their pre-signed URLs.
+    """Find the processed images of a project containing a point.
 
     Args:
         project_id (uuid.UUID): The ID of the project.
-        task_id (uuid.UUID): The ID of the task.
         point (waypoint_schemas.PointField): The point to check.
+        task_id (uuid.UUID, optional): Only search the images of this task.
 
     Returns:
         List[str]: A list of pre-signed URLs for matching images.
     """
-    # Extract the longitude and latitude of the point
-    point_tuple = (point.longitude, point.latitude)
-
-    # Find the matching images from each task
-    images_list = []
-    for task_id in task_id_list:
-        task_id_str = str(task_id[0])
-        s3_images_json_path_for_task = (
-            f"dtm-data/projects/{project_id}/{task_id_str}/images.json"
-        )
-        s3_images_json_url = get_presigned_url(
-            settings.S3_BUCKET_NAME, s3_images_json_path_for_task
+    await save_missing_footprints(db, project_id, task_id)
+
+    async with db.cursor() as cur:
+        await cur.execute(
+            """
+            SELECT s3_key
+            FROM image_footprints
+            WHERE project_id = %(project_id)s
+                AND (%(task_id)s::uuid IS NULL OR task_id = %(task_id)s::uuid)
+                AND ST_Contains(
+                    footprint,
+                    ST_SetSRID(ST_MakePoint(%(longitude)s, %(latitude)s), 4326)
+                )
+            ORDER BY task_id, name
+            """,
+            {
+                "project_id": project_id,
+                "task_id": task_id,
+                "longitude": point.longitude,
+                "latitude": point.latitude,
+            },
         )
-
-        # Fetch bounding boxes from the `images.json` file
-        bbox_list = await calculate_bbox_from_images_file(
-            s3_images_json_url, fov_degree, altitude
-        )
-
-        # Find images whose bounding boxes contain the given point
-        matching_images = await find_matching_images_that_contains_point(
-            bbox_list, point_tuple
-        )
-        images_list += [f"{task_id_str}/images/{image}" for image in matching_images]
+        images = await cur.fetchall()
 
     # Generate pre-signed URLs for the matching images
-    presigned_urls = [
-        get_presigned_url(
-            settings.S3_BUCKET_NAME,
-            f"dtm-data/projects/{project_id}/{image}",
-        )
-        for image in images_list
-    ]
-
-    return presigned_urls
+    s3 = async_s3_client()
+    return await asyncio.gather(
+        *(s3.presign(settings.S3_BUCKET_NAME, s3_key) for (s3_key,) in images)
+    )
 
 
-async def find_images_in_a_task_for_point(
-    project_id: uuid.UUID,
-    task_id: uuid.UUID,
-    point: waypoint_schemas.PointField,
-    fov_degree: float,
-    altitude: float,
-) -> List[str]:
-    """Process images to find those containing a specific point and return their pre-signed URLs.
+async def find_images_for_points(
+    db: Connection, project_id: uuid.UUID, points: List[waypoint_schemas.PointField]
+) -> List[gcp_schemas.PointImages]:
+    """Find the processed images of a project containing each of a list of points.
 
-    Args:
-        project_id (uuid.UUID): The ID of the project.
-        task_id (uuid.UUID): The ID of the task.
-        point (waypoint_schemas.PointField): The point to check.
+    All points are matched in one query, and located in their images at once,
+    e.g. to draft the GCP file of a project.
 
     Returns:
-        List[str]: A list of pre-signed URLs for matching images.
+        List[gcp_schemas.PointImages]: The matching images of each point, in
+            order, with the pixel coordinates of the point in them.
     """
-    # S3 path for the `images.json` file provided by ODM
-    s3_images_json_path = f"dtm-data/projects/{project_id}/{task_id}/images.json"
-
-    # Generate pre-signed URL for the `images.json` file
-    s3_images_json_url = get_presigned_url(settings.S3_BUCKET_NAME, s3_images_json_path)
-
-    # Fetch bounding boxes from the `images.json` file
-    bbox_list = await calculate_bbox_from_images_file(
-        s3_images_json_url, fov_degree, altitude
+    await save_missing_footprints(db, project_id)
+
+    async with db.cursor() as cur:
+        await cur.execute(
+            """
+            SELECT p.index, f.task_id, f.name, f.width, f.height,
+                ST_AsBinary(f.footprint), f.s3_key
+            FROM unnest(%(longitudes)s::float8[], %(latitudes)s::float8[])
+                WITH ORDINALITY AS p(longitude, latitude, index)
+            JOIN image_footprints f
+                ON f.project_id = %(project_id)s
+                AND ST_Contains(
+                    f.footprint,
+                    ST_SetSRID(ST_MakePoint(p.longitude, p.latitude), 4326)
+                )
+            ORDER BY p.index, f.task_id, f.name
+            """,
+            {
+                "project_id": project_id,
+                "longitudes": [point.longitude for point in points],
+                "latitudes": [point.latitude for point in points],
+            },
+        )
+        rows = await cur.fetchall()
+
+    # Ordinality starts at 1
+    point_indexes = [row[0] - 1 for row in rows]
+    footprints = shapely.from_wkb([bytes(row[5]) for row in rows])
+    pixels = calculate_pixel_coordinates(
+        shapely.get_coordinates(footprints).reshape(-1, 5, 2)[:, :4],
+        np.array([row[3] for row in rows], dtype=float),
+        np.array([row[4] for row in rows], dtype=float),
+        np.array(
+            [(points[i].longitude, points[i].latitude) for i in point_indexes],
+            dtype=float,
+        ).reshape(-1, 2),
     )
 
-    # Extract the longitude and latitude of the point
-    point_tuple = (point.longitude, point.latitude)
-
-    # Find images whose bounding boxes contain the given point
-    matching_images = await find_matching_images_that_contains_point(
-        bbox_list, point_tuple
+    # An image may contain several points, its URL is only generated once
+    s3 = async_s3_client()
+    s3_keys: List[str] = list(dict.fromkeys(row[6] for row in rows))
+    urls: Dict[str, str] = dict(
+        zip(
+            s3_keys,
+            await asyncio.gather(
+                *(s3.presign(settings.S3_BUCKET_NAME, s3_key) for s3_key in s3_keys)
+            ),
+        )
     )
 
-    # Generate pre-signed URLs for the matching images
-    presigned_urls = [
-        get_presigned_url(
-            settings.S3_BUCKET_NAME,
-            f"dtm-data/projects/{project_id}/{task_id}/images/{image}",
+    results = [gcp_schemas.PointImages(point=point, images=[]) for point in points]
+    for index, row, (pixel_x, pixel_y) in zip(point_indexes, rows, pixels):
+        results[index].images.append(
+            gcp_schemas.PointImage(
+                task_id=row[1],
+                name=row[2],
+                url=urls[row[6]],
+                pixel_x=pixel_x,
+                pixel_y=pixel_y,
+            )
         )
-        for image in matching_images
-    ]
-
-    return presigned_urls
+    return results
@@ -1,15 +1,17 @@
 import uuid
 from typing import Annotated, List
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException
 from psycopg import Connection
 
 from app.db import database
-from app.gcp import gcp_crud
-from app.projects import project_schemas
-from app.tasks.task_logic import list_task_id_for_project
+from app.gcp import gcp_crud, gcp_schemas
+from app.models.enums import HTTPStatus
 from app.waypoints import waypoint_schemas
 
+# Most projects mark 5 to 20 ground control points
+MAX_BATCH_POINTS = 100
+
 router = APIRouter(
     prefix="/gcp",
     tags=["gcp"],
@@ -25,11 +27,7 @@ async def find_images(
     point: waypoint_schemas.PointField = None,
 ) -> List[str]:
     """Find images that contain a specified point."""
-    fov_degree = 82.1  # For DJI Mini 4 Pro
-    result = await project_schemas.DbProject.one(db, project_id)
-    return await gcp_crud.find_images_in_a_task_for_point(
-        project_id, task_id, point, fov_degree, result.altitude_from_ground
-    )
+    return await gcp_crud.find_images_for_point(db, project_id, point, task_id)
 
 
 @router.post("/find-project-images/")
@@ -39,11 +37,23 @@ async def find_images_for_a_project(
     point: waypoint_schemas.PointField = None,
 ) -> List[str]:
     """Find images that contain a specified point in a project."""
-    fov_degree = 82.1  # For DJI Mini 4 Pro
-    result = await project_schemas.DbProject.one(db, project_id)
-    # Get all task IDs for the project from database
-    task_id_list = await list_task_id_for_project(db, project_id)
-
-    return await gcp_crud.find_images_in_a_project_for_point(
-        project_id, task_id_list, point, fov_degree, result.altitude_from_ground
-    )
+    return await gcp_crud.find_images_for_point(db, project_id, point)
+
+
+@router.post("/find-project-images-batch/")
+async def find_images_for_points(
+    project_id: uuid.UUID,
+    points: List[waypoint_schemas.PointField],
+    db: Annotated[Connection, Depends(database.get_db)],
+) -> List[gcp_schemas.PointImages]:
+    """Find the images that contain each of a list of points in a project.
+
+    The pixel coordinates of each point in its images are returned with them,
+    so a GCP file can be drafted from them.
+    """
+    if not points or len(points) > MAX_BATCH_POINTS:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail=f"Between 1 and {MAX_BATCH_POINTS} points are required.",
+        )
+    return await gcp_crud.find_images_for_points(db, project_id, points)
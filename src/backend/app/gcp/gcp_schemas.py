@@ -0,0 +1,22 @@
+import uuid
+from typing import List
+
+from pydantic import BaseModel
+
+from app.waypoints.waypoint_schemas import PointField
+
+
+class PointImage(BaseModel):
+    """An image containing a point, and where the point is in it."""
+
+    task_id: uuid.UUID
+    name: str
+    url: str
+    # Pixel coordinates of the point, from the top left corner of the image
+    pixel_x: float
+    pixel_y: float
+
+
+class PointImages(BaseModel):
+    point: PointField
+    images: List[PointImage]
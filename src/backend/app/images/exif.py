@@ -0,0 +1,265 @@
+"""Read the EXIF and XMP metadata of JPEG images, without decoding them.
+
+Only the segments before the image data are parsed, so the metadata of an
+image can be read from its first HEADER_BYTES, e.g. with an S3 range request.
+"""
+
+import re
+import struct
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+
+# Enough for the EXIF (with its thumbnail), XMP and frame header segments
+HEADER_BYTES = 256 * 1024
+
+XMP_HEADER = b"http://ns.adobe.com/xap/1.0/\x00"
+EXIF_HEADER = b"Exif\x00\x00"
+# Start of frame markers, which carry the image dimensions (0xC4, 0xC8 and
+# 0xCC are other markers)
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+# Byte size of each TIFF field type, and its struct format
+TIFF_TYPES = {
+    1: (1, "B"),
+    2: (1, "s"),
+    3: (2, "H"),
+    4: (4, "I"),
+    5: (8, "II"),
+    6: (1, "b"),
+    7: (1, "B"),
+    8: (2, "h"),
+    9: (4, "i"),
+    10: (8, "ii"),
+    11: (4, "f"),
+    12: (8, "d"),
+}
+
+# TIFF tags read, by IFD
+EXIF_IFD_POINTER = 0x8769
+GPS_IFD_POINTER = 0x8825
+MAKE = 0x010F
+MODEL = 0x0110
+DATE_TIME_ORIGINAL = 0x9003
+OFFSET_TIME_ORIGINAL = 0x9011
+FOCAL_LENGTH_35MM = 0xA405
+PIXEL_X_DIMENSION = 0xA002
+PIXEL_Y_DIMENSION = 0xA003
+GPS_LATITUDE_REF = 1
+GPS_LATITUDE = 2
+GPS_LONGITUDE_REF = 3
+GPS_LONGITUDE = 4
+GPS_ALTITUDE_REF = 5
+GPS_ALTITUDE = 6
+
+
+class ExifError(Exception):
+    """Raised when the metadata of an image can't be read."""
+
+
+@dataclass
+class ImageMetadata:
+    width: Optional[int] = None
+    height: Optional[int] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
+    # GPS altitude above sea level, in metres
+    altitude: Optional[float] = None
+    # Altitude above the take-off point (DJI XMP), in metres
+    relative_altitude: Optional[float] = None
+    captured_at: Optional[datetime] = None
+    make: Optional[str] = None
+    model: Optional[str] = None
+    focal_length_35mm: Optional[float] = None
+    gimbal_yaw: Optional[float] = None
+    gimbal_pitch: Optional[float] = None
+    # The raw APP1 segments, to copy the metadata into a resampled image
+    exif_segment: Optional[bytes] = None
+    xmp_segment: Optional[bytes] = None
+
+
+def read_ifd(tiff: bytes, offset: int, endian: str) -> Dict[int, Tuple[Any, int, int]]:
+    """Read the entries of a TIFF image file directory.
+
+    Returns:
+        Dict[int, Tuple[Any, int, int]]: The value of each tag, a tuple
+            unless it is a string, the offset of the value in the TIFF data
+            and the field type.
+    """
+    (count,) = struct.unpack_from(f"{endian}H", tiff, offset)
+    entries = {}
+    for index in range(count):
+        entry = offset + 2 + 12 * index
+        tag, field_type, value_count = struct.unpack_from(f"{endian}HHI", tiff, entry)
+        if field_type not in TIFF_TYPES:
+            continue
+        size, value_format = TIFF_TYPES[field_type]
+        value_offset = entry + 8
+        if size * value_count > 4:
+            (value_offset,) = struct.unpack_from(f"{endian}I", tiff, value_offset)
+        if value_offset + size * value_count > len(tiff):
+            continue
+
+        if field_type == 2:
+            raw = tiff[value_offset : value_offset + value_count]
+            value = raw.split(b"\x00", 1)[0].decode("utf-8", "replace").strip()
+        else:
+            value = struct.unpack_from(
+                f"{endian}{value_format * value_count}", tiff, value_offset
+            )
+            if field_type in {5, 10}:
+                value = tuple(
+                    value[i] / value[i + 1] if value[i + 1] else 0.0
+                    for i in range(0, len(value), 2)
+                )
+        entries[tag] = (value, value_offset, field_type)
+    return entries
+
+
+def tiff_endian(tiff: bytes) -> str:
+    """Get the struct byte order of TIFF data, from its header."""
+    if tiff[:2] == b"II":
+        return "<"
+    if tiff[:2] == b"MM":
+        return ">"
+    raise ExifError("Invalid TIFF header in EXIF segment")
+
+
+def parse_exif(tiff: bytes, metadata: ImageMetadata):
+    """Read the tags used by DTM from the TIFF data of an EXIF segment."""
+    endian = tiff_endian(tiff)
+    (ifd_offset,) = struct.unpack_from(f"{endian}I", tiff, 4)
+    ifd0 = read_ifd(tiff, ifd_offset, endian)
+
+    def value(ifd: dict, tag: int) -> Any:
+        return ifd[tag][0] if tag in ifd else None
+
+    metadata.make = value(ifd0, MAKE)
+    metadata.model = value(ifd0, MODEL)
+
+    if EXIF_IFD_POINTER in ifd0:
+        exif_ifd = read_ifd(tiff, value(ifd0, EXIF_IFD_POINTER)[0], endian)
+        if focal_length := value(exif_ifd, FOCAL_LENGTH_35MM):
+            metadata.focal_length_35mm = float(focal_length[0]) or None
+        if not metadata.width and PIXEL_X_DIMENSION in exif_ifd:
+            metadata.width = value(exif_ifd, PIXEL_X_DIMENSION)[0]
+            metadata.height = (value(exif_ifd, PIXEL_Y_DIMENSION) or (None,))[0]
+        if date_time := value(exif_ifd, DATE_TIME_ORIGINAL):
+            metadata.captured_at = parse_datetime(
+                date_time, value(exif_ifd, OFFSET_TIME_ORIGINAL)
+            )
+
+    if GPS_IFD_POINTER in ifd0:
+        gps_ifd = read_ifd(tiff, value(ifd0, GPS_IFD_POINTER)[0], endian)
+        latitude = value(gps_ifd, GPS_LATITUDE)
+        longitude = value(gps_ifd, GPS_LONGITUDE)
+        if latitude and longitude and len(latitude) == len(longitude) == 3:
+            metadata.latitude = degrees(latitude, value(gps_ifd, GPS_LATITUDE_REF))
+            metadata.longitude = degrees(longitude, value(gps_ifd, GPS_LONGITUDE_REF))
+        if altitude := value(gps_ifd, GPS_ALTITUDE):
+            below_sea_level = value(gps_ifd, GPS_ALTITUDE_REF) == (1,)
+            metadata.altitude = -altitude[0] if below_sea_level else altitude[0]
+
+
+def degrees(dms: Tuple[float, float, float], ref: Optional[str]) -> float:
+    """Convert degrees, minutes and seconds to signed decimal degrees."""
+    value = dms[0] + dms[1] / 60 + dms[2] / 3600
+    return -value if ref in {"S", "W"} else value
+
+
+def parse_datetime(value: str, offset: Optional[str] = None) -> Optional[datetime]:
+    """Parse an EXIF date, UTC unless its time zone offset is recorded."""
+    try:
+        captured_at = datetime.strptime(value, "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+    tz = timezone.utc
+    if offset and (match := re.fullmatch(r"([+-])(\d{2}):(\d{2})", offset)):
+        sign = -1 if match[1] == "-" else 1
+        tz = timezone(sign * timedelta(hours=int(match[2]), minutes=int(match[3])))
+    return captured_at.replace(tzinfo=tz)
+
+
+def xmp_number(xmp: str, name: str) -> Optional[float]:
+    """Get a numeric XMP property, written as an attribute or an element."""
+    match = re.search(rf'{name}(?:="|>)\s*([-+]?[\d.]+)', xmp)
+    return float(match[1]) if match else None
+
+
+def read_metadata(data: bytes) -> ImageMetadata:
+    """Read the metadata of a JPEG image, from its first bytes.
+
+    Args:
+        data (bytes): The start of the image, see HEADER_BYTES.
+
+    Returns:
+        ImageMetadata: The metadata found, unknown fields are None.
+    """
+    if data[:2] != b"\xff\xd8":
+        raise ExifError("Not a JPEG image")
+
+    metadata = ImageMetadata()
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            raise ExifError(f"Invalid JPEG marker at byte {position}")
+        marker = data[position + 1]
+        if marker == 0xFF:
+            # Fill byte
+            position += 1
+            continue
+        if marker in {0xDA, 0xD9}:
+            # Start of the image data, or end of image
+            break
+
+        (length,) = struct.unpack_from(">H", data, position + 2)
+        end = position + 2 + length
+        if end > len(data):
+            break
+        payload = data[position + 4 : end]
+
+        if marker == 0xE1 and payload.startswith(EXIF_HEADER):
+            metadata.exif_segment = data[position:end]
+            try:
+                parse_exif(payload[len(EXIF_HEADER) :], metadata)
+            except struct.error as e:
+                raise ExifError("Truncated EXIF segment") from e
+        elif marker == 0xE1 and payload.startswith(XMP_HEADER):
+            metadata.xmp_segment = data[position:end]
+            xmp = payload[len(XMP_HEADER) :].decode("utf-8", "replace")
+            metadata.relative_altitude = xmp_number(xmp, "RelativeAltitude")
+            metadata.gimbal_yaw = xmp_number(xmp, "GimbalYawDegree")
+            metadata.gimbal_pitch = xmp_number(xmp, "GimbalPitchDegree")
+        elif marker in SOF_MARKERS:
+            metadata.height, metadata.width = struct.unpack_from(">HH", payload, 1)
+        position = end
+
+    return metadata
+
+
+def set_exif_dimensions(exif_segment: bytes, width: int, height: int) -> bytes:
+    """Update the pixel dimensions recorded in an EXIF segment.
+
+    The EXIF of a resampled image must match its new size, as ODM reads the
+    image dimensions from it.
+    """
+    segment = bytearray(exif_segment)
+    # Marker, segment length and the EXIF header come before the TIFF data
+    tiff_start = 4 + len(EXIF_HEADER)
+    tiff = bytes(segment[tiff_start:])
+    endian = tiff_endian(tiff)
+    (ifd_offset,) = struct.unpack_from(f"{endian}I", tiff, 4)
+    ifd0 = read_ifd(tiff, ifd_offset, endian)
+    if EXIF_IFD_POINTER not in ifd0:
+        return exif_segment
+
+    exif_ifd = read_ifd(tiff, ifd0[EXIF_IFD_POINTER][0][0], endian)
+    for tag, dimension in ((PIXEL_X_DIMENSION, width), (PIXEL_Y_DIMENSION, height)):
+        if tag not in exif_ifd:
+            continue
+        _, value_offset, field_type = exif_ifd[tag]
+        # SHORT or LONG
+        value_format = "H" if field_type == 3 else "I"
+        struct.pack_into(
+            f"{endian}{value_format}", segment, tiff_start + value_offset, dimension
+        )
+    return bytes(segment)
@@ -0,0 +1,352 @@
+import asyncio
+import re
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+from loguru import logger as log
+from minio import S3Error
+from psycopg import Connection
+from psycopg.rows import dict_row
+
+from app.config import settings
+from app.images.exif import HEADER_BYTES, ExifError, ImageMetadata, read_metadata
+from app.s3 import async_s3_client
+from app.utils import timestamp
+
+# File types counted as images, other uploads (e.g. .txt, .laz) are only
+# kept in the manifest so they can be staged for processing
+IMAGE_COUNT_PATTERN = r"\.(jpe?g|png|tiff?)$"
+# Images whose metadata is read from their EXIF header
+EXIF_IMAGE_PATTERN = r"\.jpe?g$"
+
+
+def task_images_prefix(project_id: uuid.UUID, task_id: uuid.UUID) -> str:
+    """Get the S3 prefix of the images uploaded for a task."""
+    return f"dtm-data/projects/{project_id}/{task_id}/images/"
+
+
+async def upsert_images(
+    db: Connection,
+    project_id: uuid.UUID,
+    task_id: uuid.UUID,
+    images: Iterable[dict],
+):
+    """Add or update manifest entries, in one statement.
+
+    Args:
+        images (Iterable[dict]): Dicts with the name, s3_key, size, etag and
+            uploaded_at of each image.
+    """
+    images = list(images)
+    if not images:
+        return
+
+    sql = """
+        INSERT INTO images (project_id, task_id, name, s3_key, size, etag, uploaded_at)
+        SELECT %(project_id)s, %(task_id)s, *
+        FROM unnest(
+            %(names)s::text[],
+            %(s3_keys)s::text[],
+            %(sizes)s::bigint[],
+            %(etags)s::text[],
+            %(uploaded_ats)s::timestamptz[]
+        )
+        ON CONFLICT (task_id, name) DO UPDATE
+        SET s3_key = EXCLUDED.s3_key,
+            size = EXCLUDED.size,
+            etag = EXCLUDED.etag,
+            uploaded_at = EXCLUDED.uploaded_at,
+            -- A replaced image may have been taken somewhere else, and its
+            -- metadata is read again
+            location = CASE
+                WHEN images.etag IS DISTINCT FROM EXCLUDED.etag THEN NULL
+                ELSE images.location
+            END,
+            metadata_read_at = CASE
+                WHEN images.etag IS DISTINCT FROM EXCLUDED.etag THEN NULL
+                ELSE images.metadata_read_at
+            END
+    """
+    async with db.cursor() as cur:
+        await cur.execute(
+            sql,
+            {
+                "project_id": project_id,
+                "task_id": task_id,
+                "names": [image["name"] for image in images],
+                "s3_keys": [image["s3_key"] for image in images],
+                "sizes": [image.get("size") for image in images],
+                "etags": [image.get("etag") for image in images],
+                "uploaded_ats": [image.get("uploaded_at") for image in images],
+            },
+        )
+
+
+async def set_node_names(db: Connection, task_id: uuid.UUID, names: Dict[str, str]):
+    """Record the names the images of a task are staged with for processing.
+
+    The ODM outputs (e.g. images.json) only know the images by these names.
+
+    Args:
+        names (Dict[str, str]): The name on the node of each image, by its
+            manifest name.
+    """
+    async with db.cursor() as cur:
+        await cur.execute(
+            """
+            UPDATE images
+            SET node_name = n.node_name
+            FROM unnest(%(names)s::text[], %(node_names)s::text[])
+                AS n(name, node_name)
+            WHERE images.task_id = %(task_id)s AND images.name = n.name
+            """,
+            {
+                "task_id": task_id,
+                "names": list(names),
+                "node_names": list(names.values()),
+            },
+        )
+    await db.commit()
+
+
+async def sync_task_images(
+    db: Connection, project_id: uuid.UUID, task_id: uuid.UUID
+) -> int:
+    """Rebuild the manifest of a task from one listing of its S3 images.
+
+    Run when an upload session completes, as browsers upload directly to
+    S3 with presigned URLs. Entries for deleted objects are removed.
+
+    Returns:
+        int: The number of images uploaded for the task.
+    """
+    prefix = task_images_prefix(project_id, task_id)
+    objects = await async_s3_client().list(settings.S3_BUCKET_NAME, prefix)
+    images = [
+        {
+            "name": obj.object_name[len(prefix) :],
+            "s3_key": obj.object_name,
+            "size": obj.size,
+            "etag": obj.etag,
+            "uploaded_at": obj.last_modified,
+        }
+        for obj in objects
+        if not obj.is_dir
+    ]
+
+    await upsert_images(db, project_id, task_id, images)
+    async with db.cursor() as cur:
+        await cur.execute(
+            """
+            DELETE FROM images
+            WHERE task_id = %(task_id)s AND name <> ALL(%(names)s::text[])
+            """,
+            {"task_id": task_id, "names": [image["name"] for image in images]},
+        )
+    log.debug(f"Synced image manifest of task {task_id}: {len(images)} files")
+
+    return sum(
+        1 for image in images if re.search(IMAGE_COUNT_PATTERN, image["name"].lower())
+    )
+
+
+async def get_task_image_count(db: Connection, task_id: uuid.UUID) -> int:
+    """Get the number of images uploaded for a task.
+
+    Tasks uploaded before the manifest existed fall back to the count
+    recorded on the task.
+    """
+    async with db.cursor() as cur:
+        await cur.execute(
+            """
+            SELECT COALESCE(
+                NULLIF(
+                    (
+                        SELECT count(*) FROM images
+                        WHERE task_id = %(task_id)s AND lower(name) ~ %(pattern)s
+                    ),
+                    0
+                ),
+                (SELECT total_image_uploaded FROM tasks WHERE id = %(task_id)s),
+                0
+            )
+            """,
+            {"task_id": task_id, "pattern": IMAGE_COUNT_PATTERN},
+        )
+        return (await cur.fetchone())[0]
+
+
+async def get_image_counts(
+    db: Connection, project_id: uuid.UUID
+) -> Dict[uuid.UUID, int]:
+    """Get the number of images uploaded for each task of a project.
+
+    Tasks uploaded before the manifest existed fall back to the count
+    recorded on the task.
+    """
+    async with db.cursor() as cur:
+        await cur.execute(
+            """
+            SELECT t.id, COALESCE(i.image_count, t.total_image_uploaded, 0)
+            FROM tasks t
+            LEFT JOIN (
+                SELECT task_id, count(*) AS image_count
+                FROM images
+                WHERE project_id = %(project_id)s AND lower(name) ~ %(pattern)s
+                GROUP BY task_id
+            ) i ON i.task_id = t.id
+            WHERE t.project_id = %(project_id)s
+            """,
+            {"project_id": project_id, "pattern": IMAGE_COUNT_PATTERN},
+        )
+        return dict(await cur.fetchall())
+
+
+async def get_task_images(
+    db: Connection,
+    task_id: uuid.UUID,
+    extensions: Optional[Iterable[str]] = None,
+) -> List[dict]:
+    """Get the manifest entries of a task, optionally filtered by extension."""
+    async with db.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
+            """
+            SELECT name, s3_key, size, etag, uploaded_at
+            FROM images
+            WHERE task_id = %(task_id)s
+            ORDER BY name
+            """,
+            {"task_id": task_id},
+        )
+        images = await cur.fetchall()
+
+    if extensions:
+        extensions = tuple(ext.lower() for ext in extensions)
+        images = [
+            image for image in images if image["name"].lower().endswith(extensions)
+        ]
+    return images
+
+
+async def read_s3_image_metadata(s3_key: str) -> Optional[ImageMetadata]:
+    """Read the metadata of an image in S3, from a range request for its header.
+
+    Returns None, logging why, when it can't be read.
+    """
+    try:
+        header = await async_s3_client().get(
+            settings.S3_BUCKET_NAME, s3_key, length=HEADER_BYTES
+        )
+        return read_metadata(header)
+    except (S3Error, ExifError) as e:
+        log.warning(f"Can't read the metadata of image {s3_key}: {e}")
+        return None
+
+
+async def save_image_metadata(
+    db: Connection, image_ids: List[uuid.UUID], metadata: List[Optional[ImageMetadata]]
+):
+    """Store the metadata read for images, in one statement.
+
+    Images whose metadata couldn't be read are marked as read, with no
+    metadata, so they aren't read again until they are replaced.
+    """
+    metadata = [image_metadata or ImageMetadata() for image_metadata in metadata]
+    columns: Dict[str, List[Any]] = {
+        "latitudes": [image.latitude for image in metadata],
+        "longitudes": [image.longitude for image in metadata],
+        "altitudes": [image.altitude for image in metadata],
+        "relative_altitudes": [image.relative_altitude for image in metadata],
+        "captured_ats": [image.captured_at for image in metadata],
+        "camera_makes": [image.make for image in metadata],
+        "camera_models": [image.model for image in metadata],
+        "focal_lengths_35mm": [image.focal_length_35mm for image in metadata],
+        "gimbal_yaws": [image.gimbal_yaw for image in metadata],
+        "gimbal_pitches": [image.gimbal_pitch for image in metadata],
+        "widths": [image.width for image in metadata],
+        "heights": [image.height for image in metadata],
+    }
+    async with db.cursor() as cur:
+        await cur.execute(
+            """
+            UPDATE images
+            SET location = CASE
+                    WHEN m.latitude IS NOT NULL AND m.longitude IS NOT NULL
+                    THEN ST_SetSRID(ST_MakePoint(m.longitude, m.latitude), 4326)
+                END,
+                altitude = m.altitude,
+                relative_altitude = m.relative_altitude,
+                captured_at = m.captured_at,
+                camera_make = m.camera_make,
+                camera_model = m.camera_model,
+                focal_length_35mm = m.focal_length_35mm,
+                gimbal_yaw = m.gimbal_yaw,
+                gimbal_pitch = m.gimbal_pitch,
+                width = m.width,
+                height = m.height,
+                metadata_read_at = %(read_at)s
+            FROM unnest(
+                %(ids)s::uuid[],
+                %(latitudes)s::float8[],
+                %(longitudes)s::float8[],
+                %(altitudes)s::float8[],
+                %(relative_altitudes)s::float8[],
+                %(captured_ats)s::timestamptz[],
+                %(camera_makes)s::text[],
+                %(camera_models)s::text[],
+                %(focal_lengths_35mm)s::float8[],
+                %(gimbal_yaws)s::float8[],
+                %(gimbal_pitches)s::float8[],
+                %(widths)s::int[],
+                %(heights)s::int[]
+            ) AS m(
+                id, latitude, longitude, altitude, relative_altitude, captured_at,
+                camera_make, camera_model, focal_length_35mm, gimbal_yaw,
+                gimbal_pitch, width, height
+            )
+            WHERE images.id = m.id
+            """,
+            {"ids": image_ids, "read_at": timestamp(), **columns},
+        )
+
+
+async def extract_image_metadata(
+    ctx: Dict[Any, Any], project_id: uuid.UUID, task_id: uuid.UUID
+) -> Dict[str, int]:
+    """ARQ job reading the EXIF metadata of a task's uploaded images.
+
+    Enqueued when the upload of a task completes. Only the header of each
+    image is downloaded, with concurrent range requests, so the positions of
+    the images are known before they are processed (e.g. for coverage
+    checks and GCP lookups). Images already read are skipped.
+    """
+    async with ctx["db_pool"].connection() as db:
+        async with db.cursor() as cur:
+            await cur.execute(
+                """
+                SELECT id, s3_key
+                FROM images
+                WHERE task_id = %(task_id)s
+                    AND metadata_read_at IS NULL
+                    AND lower(name) ~ %(pattern)s
+                """,
+                {"task_id": task_id, "pattern": EXIF_IMAGE_PATTERN},
+            )
+            images = await cur.fetchall()
+        if not images:
+            return {"images": 0, "located": 0}
+
+        # Concurrency is bounded by the S3 client's thread pool
+        metadata = await asyncio.gather(
+            *(read_s3_image_metadata(s3_key) for _, s3_key in images)
+        )
+        await save_image_metadata(db, [image_id for image_id, _ in images], metadata)
+
+    located = sum(1 for image in metadata if image and image.latitude is not None)
+    if located < len(images):
+        log.warning(
+            f"{len(images) - located} of {len(images)} images of task {task_id} "
+            "have no GPS position"
+        )
+    log.info(f"Read the metadata of {len(images)} images of task {task_id}")
+    return {"images": len(images), "located": located}
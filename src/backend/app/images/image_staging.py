@@ -0,0 +1,268 @@
+"""Cull and downsample task images before they are sent to ODM.
+
+Configured per project. With `processing_gsd_cm_px` set, images are
+downscaled to that ground sample distance, which cuts ODM runtime and
+transfer size when the imagery is finer than the outputs need. With
+`cull_images`, frames taken outside the task area, or at the position of the
+previous frame (e.g. while hovering), are left out.
+"""
+
+import asyncio
+import math
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import List, Optional, Tuple
+
+from loguru import logger as log
+from osgeo import gdal
+from shapely.geometry import Point
+from shapely.prepared import prep
+
+from app.config import settings
+from app.images.exif import (
+    HEADER_BYTES,
+    ExifError,
+    ImageMetadata,
+    read_metadata,
+    set_exif_dimensions,
+)
+
+JPEG_EXTENSIONS = (".jpg", ".jpeg")
+# Images are only resampled when this shrinks them by 10% or more
+MAX_DOWNSAMPLE_SCALE = 0.9
+EARTH_RADIUS = 6371008.8
+# Frames whose gimbal differs by more degrees are never duplicates, e.g.
+# oblique captures at one waypoint
+DUPLICATE_MAX_ANGLE = 5
+
+
+@dataclass
+class StagingOptions:
+    # Target ground sample distance, None to keep the full resolution
+    gsd_cm_px: Optional[float] = None
+    cull: bool = False
+    # Flight altitude above ground, to compute the GSD of the images
+    altitude: Optional[float] = None
+    # Planned GSD of the images, used when it can't be computed
+    image_gsd_cm_px: Optional[float] = None
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.gsd_cm_px) or self.cull
+
+
+def read_image_metadata(path: str) -> Optional[ImageMetadata]:
+    """Read the metadata of a JPEG file, None if it can't be read."""
+    with open(path, "rb") as image_file:
+        header = image_file.read(HEADER_BYTES)
+    try:
+        return read_metadata(header)
+    except ExifError as e:
+        log.warning(f"Can't read the metadata of {path}: {e}")
+        return None
+
+
+def image_gsd(metadata: ImageMetadata, options: StagingOptions) -> Optional[float]:
+    """Get the ground sample distance of an image, in cm/px."""
+    altitude = options.altitude or metadata.relative_altitude
+    if altitude and metadata.focal_length_35mm and metadata.width:
+        # A 35mm equivalent focal length is relative to a 36mm wide sensor
+        return 100 * altitude * 36 / (metadata.focal_length_35mm * metadata.width)
+    return options.image_gsd_cm_px
+
+
+def distance(a: ImageMetadata, b: ImageMetadata) -> float:
+    """Approximate ground distance between two images, in metres."""
+    mean_latitude = math.radians((a.latitude + b.latitude) / 2)
+    dx = math.radians(b.longitude - a.longitude) * math.cos(mean_latitude)
+    dy = math.radians(b.latitude - a.latitude)
+    return EARTH_RADIUS * math.hypot(dx, dy)
+
+
+def is_duplicate(previous: ImageMetadata, current: ImageMetadata) -> bool:
+    """Whether an image was taken at the same position as the previous one."""
+    min_distance = settings.IMAGE_CULL_MIN_DISTANCE
+    if distance(previous, current) >= min_distance:
+        return False
+    previous_altitude = previous.relative_altitude or previous.altitude
+    current_altitude = current.relative_altitude or current.altitude
+    if previous_altitude is not None and current_altitude is not None:
+        if abs(previous_altitude - current_altitude) >= min_distance:
+            return False
+    for previous_angle, current_angle in (
+        (previous.gimbal_yaw, current.gimbal_yaw),
+        (previous.gimbal_pitch, current.gimbal_pitch),
+    ):
+        if previous_angle is not None and current_angle is not None:
+            difference = abs((previous_angle - current_angle + 180) % 360 - 180)
+            if difference > DUPLICATE_MAX_ANGLE:
+                return False
+    return True
+
+
+def cull_images(
+    images: List[Tuple[str, Optional[ImageMetadata]]], area=None
+) -> List[str]:
+    """Select the images to leave out of processing.
+
+    Images without a GPS position are always kept.
+
+    Args:
+        images: (path, metadata) pairs.
+        area: The area images must be taken over (EPSG:4326), or None.
+
+    Returns:
+        List[str]: The paths of the images to leave out.
+    """
+    located = [
+        (path, metadata)
+        for path, metadata in images
+        if metadata and metadata.latitude is not None
+    ]
+    culled = []
+    if area is not None:
+        area = prep(area)
+        outside = {
+            path
+            for path, metadata in located
+            if not area.contains(Point(metadata.longitude, metadata.latitude))
+        }
+        culled.extend(outside)
+        located = [image for image in located if image[0] not in outside]
+
+    # Compare each image with the last kept one, in capture order
+    located.sort(
+        key=lambda image: (image[1].captured_at is None, image[1].captured_at, image[0])
+    )
+    previous = None
+    for path, metadata in located:
+        if previous and is_duplicate(previous, metadata):
+            culled.append(path)
+        else:
+            previous = metadata
+    return culled
+
+
+def downsample_image(
+    path: str,
+    width: int,
+    height: int,
+    exif_segment: Optional[bytes] = None,
+    xmp_segment: Optional[bytes] = None,
+) -> str:
+    """Resample a JPEG image in place, keeping its EXIF and XMP metadata.
+
+    GDAL doesn't copy the metadata of JPEG images as is, so the original
+    EXIF (with updated pixel dimensions) and XMP segments are written into
+    the resampled image. Run in a separate process, see stage_images.
+    """
+    resampled_path = f"{path}.resampled"
+    with (
+        gdal.ExceptionMgr(useExceptions=True),
+        gdal.config_options({"GDAL_PAM_ENABLED": "NO"}),
+    ):
+        gdal.Translate(
+            resampled_path,
+            path,
+            options=["-nomd"],
+            format="JPEG",
+            width=width,
+            height=height,
+            resampleAlg="average",
+            creationOptions=[
+                f"QUALITY={settings.IMAGE_STAGING_QUALITY}",
+                "WRITE_EXIF_METADATA=NO",
+            ],
+        )
+
+    with open(resampled_path, "rb") as image_file:
+        data = image_file.read()
+    segments = b""
+    if exif_segment:
+        segments += set_exif_dimensions(exif_segment, width, height)
+    if xmp_segment:
+        segments += xmp_segment
+    # After the start of image marker and the JFIF segment, if any
+    insert_at = 2
+    if data[2:4] == b"\xff\xe0":
+        insert_at += 2 + int.from_bytes(data[4:6], "big")
+    with open(resampled_path, "wb") as image_file:
+        image_file.write(data[:insert_at] + segments + data[insert_at:])
+
+    os.replace(resampled_path, path)
+    return path
+
+
+async def stage_images(
+    paths: List[str], options: StagingOptions, area=None
+) -> List[str]:
+    """Cull and downsample the downloaded images of a task, in place.
+
+    Culled images are deleted, and resampled images replace the originals.
+    Other files (e.g. GCP lists) are kept as they are.
+
+    Args:
+        paths: The downloaded files.
+        options: The project's staging options.
+        area: The area images must be taken over (EPSG:4326), for culling.
+
+    Returns:
+        List[str]: The paths of the files to process.
+    """
+    jpegs = [path for path in paths if path.lower().endswith(JPEG_EXTENSIONS)]
+    metadata = await asyncio.gather(
+        *(asyncio.to_thread(read_image_metadata, path) for path in jpegs)
+    )
+
+    culled = set()
+    if options.cull:
+        culled = set(cull_images(list(zip(jpegs, metadata)), area))
+        if len(culled) == len(jpegs):
+            log.warning("Culling would leave out every image, keeping them all")
+            culled = set()
+        for path in culled:
+            os.remove(path)
+        log.info(f"Culled {len(culled)} of {len(jpegs)} images")
+
+    resampled = []
+    if options.gsd_cm_px:
+        for path, image_metadata in zip(jpegs, metadata):
+            if path in culled or not image_metadata or not image_metadata.height:
+                continue
+            gsd = image_gsd(image_metadata, options)
+            scale = gsd / options.gsd_cm_px if gsd else 1
+            if scale <= MAX_DOWNSAMPLE_SCALE:
+                resampled.append((path, image_metadata, scale))
+
+    if resampled:
+        # Spawned rather than forked, as forking a process running an event
+        # loop is unsafe
+        with ProcessPoolExecutor(
+            max_workers=settings.IMAGE_STAGING_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            loop = asyncio.get_running_loop()
+            results = await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        executor,
+                        downsample_image,
+                        path,
+                        round(image_metadata.width * scale),
+                        round(image_metadata.height * scale),
+                        image_metadata.exif_segment,
+                        image_metadata.xmp_segment,
+                    )
+                    for path, image_metadata, scale in resampled
+                ),
+                return_exceptions=True,
+            )
+        for (path, *_), result in zip(resampled, results):
+            # The original image is processed instead
+            if isinstance(result, Exception):
+                log.warning(f"Failed to downsample {path}: {result}")
+        log.info(f"Downsampled {len(resampled)} images to {options.gsd_cm_px} cm/px")
+
+    return [path for path in paths if path not in culled]
@@ -1,5 +1,4 @@
 import asyncio
-import io
 import multiprocessing
 import os
 import logging
@@ -39,13 +38,14 @@ def run_crawler_and_upload(coordinates_str: str, tif_file_path: str, project_id)
 async def upload_dem_file_s3_sync(tif_file_path: str, project_id):
     """Synchronously uploads the DEM file to S3 and updates the database."""
     try:
-        with open(tif_file_path, "rb") as dem_file:
-            file_bytes = dem_file.read()
-            file_obj = io.BytesIO(file_bytes)
-            dem = UploadFile(file=file_obj, filename="dem.tif")
-
         log.info(f"Uploading downloaded DEM for project ({project_id}) to S3")
-        dem_url = await project_logic.upload_file_to_s3(project_id, dem, "dem.tif")
+        with open(tif_file_path, "rb") as dem_file:
+            dem = UploadFile(
+                file=dem_file,
+                filename="dem.tif",
+                size=os.path.getsize(tif_file_path),
+            )
+            dem_url = await project_logic.upload_file_to_s3(project_id, dem, "dem.tif")
         log.info(f"Successfully generated and uploaded DEM file to: {dem_url}")
 
         pool = await database.get_db_connection_pool()
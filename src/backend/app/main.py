@@ -19,7 +19,9 @@ from app.drones import drone_routes
 from app.gcp import gcp_routes
 from app.models.enums import HTTPStatus
 from app.projects import project_routes
+from app.s3 import s3_client
 from app.tasks import task_routes
+from app.tasks.task_stream import TaskEventBroadcaster
 from app.users import user_routes
 from app.waypoints import waypoint_routes
 
@@ -125,8 +127,21 @@ async def lifespan(app: FastAPI):
     ) as db_pool:
         # The pool is now used within the context manager
         app.state.db_pool = db_pool
+
+        # Create the shared S3 client (and its connection pool) up front
+        s3_client()
+
+        # One task event listener per worker, shared by all SSE clients
+        task_event_broadcaster = TaskEventBroadcaster(
+            settings.DTM_DB_URL.unicode_string()
+        )
+        await task_event_broadcaster.start()
+        app.state.task_event_broadcaster = task_event_broadcaster
+
         yield  # FastAPI will run the application here
 
+        await task_event_broadcaster.stop()
+
     # Pool will be closed automatically when the context manager exits
     log.debug("Shutting down FastAPI server.")
 
@@ -0,0 +1,34 @@
+"""projects centroid index
+
+Revision ID: a1c3e5f7b9d2
+Revises: 7389d0d528c3
+Create Date: 2025-03-10 09:12:41.204118
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a1c3e5f7b9d2"
+down_revision: Union[str, None] = "7389d0d528c3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "idx_projects_centroid",
+        "projects",
+        ["centroid"],
+        unique=False,
+        postgresql_using="gist",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "idx_projects_centroid", table_name="projects", postgresql_using="gist"
+    )
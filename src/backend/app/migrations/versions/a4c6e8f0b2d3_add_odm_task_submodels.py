@@ -0,0 +1,51 @@
+"""Add submodel columns to odm_tasks, for split-merge processing
+
+Revision ID: a4c6e8f0b2d3
+Revises: f2b4d6e8a0c1
+Create Date: 2025-03-27 15:40:53.118206
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "a4c6e8f0b2d3"
+down_revision: Union[str, None] = "f2b4d6e8a0c1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("odm_tasks", sa.Column("submodel", sa.Integer(), nullable=True))
+    op.add_column("odm_tasks", sa.Column("submodel_count", sa.Integer(), nullable=True))
+    op.add_column(
+        "odm_tasks",
+        sa.Column("task_ids", postgresql.ARRAY(sa.UUID()), nullable=True),
+    )
+    op.add_column(
+        "odm_tasks",
+        sa.Column(
+            "status",
+            postgresql.ENUM(
+                "NOT_STARTED",
+                "PROCESSING",
+                "SUCCESS",
+                "FAILED",
+                name="imageprocessingstatus",
+                create_type=False,
+            ),
+            nullable=True,
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("odm_tasks", "status")
+    op.drop_column("odm_tasks", "task_ids")
+    op.drop_column("odm_tasks", "submodel_count")
+    op.drop_column("odm_tasks", "submodel")
@@ -0,0 +1,91 @@
+"""projects version counter
+
+Revision ID: b4d6f8a0c2e1
+Revises: a1c3e5f7b9d2
+Create Date: 2025-03-11 14:03:27.581930
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b4d6f8a0c2e1"
+down_revision: Union[str, None] = "a1c3e5f7b9d2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "projects",
+        sa.Column(
+            "version", sa.BigInteger(), nullable=False, server_default=sa.text("0")
+        ),
+    )
+
+    # Any direct update of a project bumps its version, unless the update
+    # already set it (e.g. from the task triggers below).
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_project_version_on_update()
+        RETURNS trigger AS $$
+        BEGIN
+            IF NEW.version = OLD.version THEN
+                NEW.version := OLD.version + 1;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER projects_bump_version
+        BEFORE UPDATE ON projects
+        FOR EACH ROW EXECUTE FUNCTION bump_project_version_on_update();
+    """)
+
+    # Task events and task changes bump the version of the owning project,
+    # once per statement and project. last_updated keeps tracking edits of
+    # the project itself.
+    op.execute("""
+        CREATE OR REPLACE FUNCTION bump_project_version_from_rows()
+        RETURNS trigger AS $$
+        BEGIN
+            UPDATE projects
+            SET version = version + 1
+            WHERE id IN (SELECT DISTINCT project_id FROM changed_rows);
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    for table, event in (
+        ("task_events", "INSERT"),
+        ("task_events", "UPDATE"),
+        ("tasks", "INSERT"),
+        ("tasks", "UPDATE"),
+    ):
+        op.execute(f"""
+            CREATE TRIGGER {table}_{event.lower()}_bump_project_version
+            AFTER {event} ON {table}
+            REFERENCING NEW TABLE AS changed_rows
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_project_version_from_rows();
+        """)
+
+
+def downgrade() -> None:
+    for table, event in (
+        ("task_events", "INSERT"),
+        ("task_events", "UPDATE"),
+        ("tasks", "INSERT"),
+        ("tasks", "UPDATE"),
+    ):
+        op.execute(
+            f"DROP TRIGGER IF EXISTS {table}_{event.lower()}_bump_project_version "
+            f"ON {table};"
+        )
+    op.execute("DROP FUNCTION IF EXISTS bump_project_version_from_rows();")
+    op.execute("DROP TRIGGER IF EXISTS projects_bump_version ON projects;")
+    op.execute("DROP FUNCTION IF EXISTS bump_project_version_on_update();")
+    op.drop_column("projects", "version")
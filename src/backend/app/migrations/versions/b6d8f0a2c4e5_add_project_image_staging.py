@@ -0,0 +1,36 @@
+"""Add image staging options to projects
+
+Revision ID: b6d8f0a2c4e5
+Revises: a4c6e8f0b2d3
+Create Date: 2025-04-02 11:26:08.734912
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b6d8f0a2c4e5"
+down_revision: Union[str, None] = "a4c6e8f0b2d3"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "projects", sa.Column("processing_gsd_cm_px", sa.Float(), nullable=True)
+    )
+    op.add_column(
+        "projects",
+        sa.Column(
+            "cull_images", sa.Boolean(), server_default=sa.false(), nullable=False
+        ),
+    )
+
+
+def downgrade() -> None:
+    op.drop_column("projects", "cull_images")
+    op.drop_column("projects", "processing_gsd_cm_px")
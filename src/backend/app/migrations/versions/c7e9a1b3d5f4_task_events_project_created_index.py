@@ -0,0 +1,31 @@
+"""task_events project_id, created_at index
+
+Revision ID: c7e9a1b3d5f4
+Revises: b4d6f8a0c2e1
+Create Date: 2025-03-12 10:47:52.318406
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c7e9a1b3d5f4"
+down_revision: Union[str, None] = "b4d6f8a0c2e1"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(
+        "idx_task_event_project_id_created_at",
+        "task_events",
+        ["project_id", "created_at"],
+        unique=False,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_task_event_project_id_created_at", table_name="task_events")
@@ -0,0 +1,51 @@
+"""Add image metadata read from EXIF to images
+
+Revision ID: c8e0a2b4d6f7
+Revises: b6d8f0a2c4e5
+Create Date: 2025-04-08 14:03:51.290418
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c8e0a2b4d6f7"
+down_revision: Union[str, None] = "b6d8f0a2c4e5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+METADATA_COLUMNS = [
+    ("altitude", sa.Float()),
+    ("relative_altitude", sa.Float()),
+    ("captured_at", sa.DateTime(timezone=True)),
+    ("camera_make", sa.String()),
+    ("camera_model", sa.String()),
+    ("focal_length_35mm", sa.Float()),
+    ("gimbal_yaw", sa.Float()),
+    ("gimbal_pitch", sa.Float()),
+    ("width", sa.Integer()),
+    ("height", sa.Integer()),
+    ("metadata_read_at", sa.DateTime(timezone=True)),
+]
+
+
+def upgrade() -> None:
+    for name, column_type in METADATA_COLUMNS:
+        op.add_column("images", sa.Column(name, column_type, nullable=True))
+    op.create_index(
+        "idx_images_location",
+        "images",
+        ["location"],
+        unique=False,
+        postgresql_using="gist",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("idx_images_location", table_name="images", postgresql_using="gist")
+    for name, _ in reversed(METADATA_COLUMNS):
+        op.drop_column("images", name)
@@ -0,0 +1,78 @@
+"""Add image_footprints table, and images node names, for GCP image lookups
+
+Revision ID: d0f2b4c6e8a9
+Revises: c8e0a2b4d6f7
+Create Date: 2025-04-10 10:41:27.618305
+
+"""
+
+from typing import Sequence, Union
+
+import geoalchemy2
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d0f2b4c6e8a9"
+down_revision: Union[str, None] = "c8e0a2b4d6f7"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column("images", sa.Column("node_name", sa.String(), nullable=True))
+    op.create_table(
+        "image_footprints",
+        sa.Column(
+            "id",
+            sa.UUID(),
+            server_default=sa.text("gen_random_uuid()"),
+            nullable=False,
+        ),
+        sa.Column("project_id", sa.UUID(), nullable=False),
+        sa.Column("task_id", sa.UUID(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("s3_key", sa.String(), nullable=False),
+        sa.Column("width", sa.Integer(), nullable=False),
+        sa.Column("height", sa.Integer(), nullable=False),
+        sa.Column(
+            "footprint",
+            geoalchemy2.types.Geometry(
+                geometry_type="POLYGON",
+                srid=4326,
+                from_text="ST_GeomFromEWKT",
+                name="geometry",
+                spatial_index=False,
+            ),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"]),
+        sa.ForeignKeyConstraint(["task_id"], ["tasks.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("task_id", "name", name="uq_image_footprints_task_id_name"),
+    )
+    op.create_index(
+        "idx_image_footprints_project_id",
+        "image_footprints",
+        ["project_id"],
+        unique=False,
+    )
+    op.create_index(
+        "idx_image_footprints_footprint",
+        "image_footprints",
+        ["footprint"],
+        unique=False,
+        postgresql_using="gist",
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        "idx_image_footprints_footprint",
+        table_name="image_footprints",
+        postgresql_using="gist",
+    )
+    op.drop_index("idx_image_footprints_project_id", table_name="image_footprints")
+    op.drop_table("image_footprints")
+    op.drop_column("images", "node_name")
@@ -0,0 +1,52 @@
+"""notify on task_events insert
+
+Revision ID: d3f5b7c9e1a6
+Revises: c7e9a1b3d5f4
+Create Date: 2025-03-13 16:20:08.774512
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d3f5b7c9e1a6"
+down_revision: Union[str, None] = "c7e9a1b3d5f4"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Comments are left out, NOTIFY payloads are limited to 8000 bytes
+    op.execute("""
+        CREATE OR REPLACE FUNCTION notify_task_event()
+        RETURNS trigger AS $$
+        BEGIN
+            PERFORM pg_notify(
+                'task_events',
+                json_build_object(
+                    'event_id', NEW.event_id,
+                    'project_id', NEW.project_id,
+                    'task_id', NEW.task_id,
+                    'user_id', NEW.user_id,
+                    'state', NEW.state,
+                    'created_at', NEW.created_at,
+                    'updated_at', NEW.updated_at
+                )::text
+            );
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+    """)
+    op.execute("""
+        CREATE TRIGGER task_events_notify
+        AFTER INSERT ON task_events
+        FOR EACH ROW EXECUTE FUNCTION notify_task_event();
+    """)
+
+
+def downgrade() -> None:
+    op.execute("DROP TRIGGER IF EXISTS task_events_notify ON task_events;")
+    op.execute("DROP FUNCTION IF EXISTS notify_task_event();")
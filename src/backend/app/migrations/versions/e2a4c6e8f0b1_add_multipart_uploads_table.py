@@ -0,0 +1,43 @@
+"""Add multipart_uploads table, identifying the file of each upload
+
+Revision ID: e2a4c6e8f0b1
+Revises: d0f2b4c6e8a9
+Create Date: 2025-04-14 09:12:48.530172
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e2a4c6e8f0b1"
+down_revision: Union[str, None] = "d0f2b4c6e8a9"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "multipart_uploads",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("project_id", sa.UUID(), nullable=False),
+        sa.Column("s3_key", sa.String(), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("fingerprint", sa.String(), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("s3_key"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("multipart_uploads")
@@ -0,0 +1,42 @@
+"""Add odm_tasks table, recording the NodeODM node owning each task
+
+Revision ID: f2b4d6e8a0c1
+Revises: e5a7c9b1d3f8
+Create Date: 2025-03-24 11:02:17.904415
+
+"""
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "f2b4d6e8a0c1"
+down_revision: Union[str, None] = "e5a7c9b1d3f8"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "odm_tasks",
+        sa.Column("id", sa.String(), nullable=False),
+        sa.Column("node_url", sa.String(), nullable=False),
+        sa.Column("project_id", sa.UUID(), nullable=False),
+        sa.Column("task_id", sa.UUID(), nullable=True),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.ForeignKeyConstraint(["project_id"], ["projects.id"]),
+        sa.ForeignKeyConstraint(["task_id"], ["tasks.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("odm_tasks")
@@ -117,6 +117,9 @@ class HTTPStatus(IntEnum):
     ACCEPTED = 202
     NO_CONTENT = 204
 
+    # Redirection
+    NOT_MODIFIED = 304
+
     # Client Error
     BAD_REQUEST = 400
     UNAUTHORIZED = 401
@@ -219,3 +222,21 @@ class OAMUploadStatus(StrEnum):
     UPLOADING = "uploading"
     UPLOADED = "uploaded"
     FAILED = "failed"
+
+
+class MultipartUploadTarget(StrEnum):
+    """Enum to describe the kinds of file uploaded in parts by the browser."""
+
+    IMAGE = "image"
+    DEM = "dem"
+
+
+class ProjectProcessingMode(StrEnum):
+    """Enum to describe the ways the imagery of a whole project is processed."""
+
+    # One ODM task with every image
+    FULL = "full"
+    # Submodels of adjacent tasks, merged, see split_merge
+    SPLIT_MERGE = "split-merge"
+    # Mosaic of the orthophotos of the processed tasks, no reprocessing
+    MOSAIC = "mosaic"
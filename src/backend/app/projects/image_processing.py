@@ -1,60 +1,98 @@
 import asyncio
+import hashlib
+import json
 import os
 import shutil
 import tempfile
 import uuid
 import zipfile
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
 
 import aiohttp
-from asgiref.sync import async_to_sync
+from arq import ArqRedis
 from loguru import logger as log
-from osgeo import gdal
+from minio.error import S3Error
 from psycopg import Connection
+from psycopg.rows import dict_row
 from pyodm import Node
+from pyodm.exceptions import OdmError
+from shapely.geometry import shape
 
 from app.config import settings
-from app.db import database
+from app.gcp import gcp_crud
+from app.images import image_logic, image_staging
 from app.models.enums import ImageProcessingStatus, State
-from app.projects import project_logic
+from app.projects import mosaic, odm_nodes, odm_poller, project_logic
+from app.projects.nodeodm import NodeODMClient, NodeODMError
 from app.s3 import (
-    add_file_to_bucket,
-    copy_file_within_bucket,
+    BatchPresigner,
+    async_s3_client,
     get_file_from_bucket,
-    get_presigned_url,
-    list_objects_from_bucket,
 )
 from app.tasks import task_logic
-from app.utils import timestamp
+from app.utils import run_in_process, strip_presigned_url_for_local_dev, timestamp
+
+
+# Files of a task that are sent for processing
+ACCEPTED_FILE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".txt", ".laz")
+
+# Streamed image downloads for ODM staging
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+DOWNLOAD_RETRIES = 4
+DOWNLOAD_BACKOFF_SECONDS = 1
+DOWNLOAD_READ_TIMEOUT = 120
+
+# Members of the ODM assets.zip uploaded on their own, and their S3 paths
+# under the task (or project) prefix. The orthophoto is reprojected first.
+ODM_ORTHOPHOTO_MEMBER = "odm_orthophoto/odm_orthophoto.tif"
+ODM_ASSET_MEMBERS = {
+    "images.json": "images.json",
+    "odm_dem/dsm.tif": "dsm/dsm.tif",
+    ODM_ORTHOPHOTO_MEMBER: "orthophoto/odm_orthophoto.tif",
+}
+
+
+class ImageDownloadError(Exception):
+    """Raised when images can't be staged for processing."""
 
 
 class DroneImageProcessor:
     def __init__(
         self,
-        node_odm_url: str,
         project_id: uuid.UUID,
         user_id: str,
         db: Connection,
         task_id: Optional[uuid.UUID] = None,
         task_ids: Optional[List[uuid.UUID]] = None,
+        node_odm_url: Optional[str] = None,
+        redis: Optional[ArqRedis] = None,
+        submodel: Optional[Dict[str, Any]] = None,
     ):
         """Base initialization for drone image processing.
 
-        :param node_odm_url: URL of the ODM node
         :param project_id: Project UUID
         :param user_id: User ID
         :param db: Database connection
         :param task_id: Optional single task ID
         :param task_ids: Optional list of task IDs
+        :param node_odm_url: URL of the ODM node, if not set the task is
+            scheduled on the least loaded node, see odm_nodes
+        :param redis: ARQ Redis pool, to poll the progress of created tasks
+            (see odm_poller)
+        :param submodel: The split-merge submodel the created task processes,
+            see odm_nodes.record_odm_task
         """
-        self.node = Node.from_url(node_odm_url)
+        self.node_odm_url = node_odm_url
+        self.node = Node.from_url(node_odm_url) if node_odm_url else None
         self.project_id = project_id
         self.user_id = user_id
         self.db = db
+        self.redis = redis
         self.task_id = task_id
         self.task_ids = task_ids or ([] if task_id is None else [task_id])
-        self.max_concurrent_downloads = 4
+        self.submodel = submodel
+        self.max_concurrent_downloads = 16
 
     def options_list_to_dict(
         self, options: List[Dict[str, Any]] = None
@@ -84,80 +122,209 @@ class DroneImageProcessor:
                 images.append(str(file))
         return images
 
-    async def download_image(self, session, url, save_path):
-        try:
-            async with session.get(url) as response:
-                if response.status == 200:
-                    with open(save_path, "wb") as f:
-                        f.write(await response.read())
-                else:
-                    log.error(f"Failed to download {url}, status: {response.status}")
-        except Exception as e:
-            log.error(f"Error downloading {url}: {e}")
+    async def get_task_images(self, task_id: uuid.UUID) -> List[dict]:
+        """Get the files of a task to process, from the image manifest.
+
+        :param task_id: Task ID
+        :return: The manifest entries of the files
+        """
+        images = await image_logic.get_task_images(
+            self.db, task_id, ACCEPTED_FILE_EXTENSIONS
+        )
+        if not images:
+            # Uploaded before the manifest existed, index it now
+            await image_logic.sync_task_images(self.db, self.project_id, task_id)
+            images = await image_logic.get_task_images(
+                self.db, task_id, ACCEPTED_FILE_EXTENSIONS
+            )
+        return images
+
+    async def get_image_urls(self, bucket_name: str, images: List[dict]) -> List[str]:
+        """Get URLs to download the given manifest entries from.
+
+        :param bucket_name: Bucket name
+        :param images: Manifest entries
+        :return: Public or pre-signed URLs, in the same order
+        """
+        s3_download_url = settings.S3_DOWNLOAD_ROOT
+        if s3_download_url:
+            return [f"{s3_download_url}/{image['s3_key']}" for image in images]
+
+        # generate pre-signed URLs for all images, locally
+        presigner = await BatchPresigner.create(bucket_name, "GET", 12)
+        return [
+            strip_presigned_url_for_local_dev(presigner.sign(image["s3_key"]))
+            for image in images
+        ]
+
+    @staticmethod
+    def staged_file_name(task_id: uuid.UUID, index: int, image: dict) -> str:
+        """Get the name of an image on the processing node.
+
+        Unique image names are maintained with the task uuid.
+        """
+        extension = os.path.splitext(image["name"])[1].lower()
+        return f"{task_id}_file_{index + 1}{extension}"
+
+    async def stage_file_names(
+        self, task_id: uuid.UUID, images: List[dict]
+    ) -> List[str]:
+        """Get the names of images on the processing node, and record them.
+
+        The ODM outputs only know the images by these names, see
+        gcp_crud.save_task_footprints.
+
+        :param task_id: Task ID
+        :param images: Manifest entries
+        :return: The names on the node, in the same order
+        """
+        names = [
+            self.staged_file_name(task_id, i, image) for i, image in enumerate(images)
+        ]
+        await image_logic.set_node_names(
+            self.db,
+            task_id,
+            {image["name"]: name for image, name in zip(images, names)},
+        )
+        return names
+
+    async def download_image(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        save_path: str,
+        etag: Optional[str] = None,
+        size: Optional[int] = None,
+    ) -> Optional[str]:
+        """Stream an image to disk, retrying with exponential backoff.
+
+        The download is checked against the object's size and, for objects
+        uploaded in a single part, the MD5 checksum in its ETag.
+
+        :return: None on success, or the error of the last attempt.
+        """
+        # Multipart ETags ("<md5>-<parts>") are not a checksum of the content
+        expected_md5 = etag.strip('"') if etag and "-" not in etag else None
+        error = None
+
+        for attempt in range(1, DOWNLOAD_RETRIES + 1):
+            try:
+                async with session.get(url) as response:
+                    response.raise_for_status()
+                    md5 = hashlib.md5()
+                    received = 0
+
+                    def write_chunk(file, chunk):
+                        md5.update(chunk)
+                        file.write(chunk)
+
+                    with open(save_path, "wb") as file:
+                        async for chunk in response.content.iter_chunked(
+                            DOWNLOAD_CHUNK_SIZE
+                        ):
+                            received += len(chunk)
+                            # Hash and write off the event loop
+                            await asyncio.to_thread(write_chunk, file, chunk)
+
+                if size is not None and received != size:
+                    raise ValueError(f"expected {size} bytes, got {received}")
+                if expected_md5 and md5.hexdigest() != expected_md5:
+                    raise ValueError("checksum does not match the ETag")
+                return None
+
+            except (
+                aiohttp.ClientError,
+                asyncio.TimeoutError,
+                OSError,
+                ValueError,
+            ) as e:
+                error = f"{type(e).__name__}: {e}"
+                if isinstance(e, aiohttp.ClientResponseError) and (
+                    400 <= e.status < 500 and e.status not in (408, 429)
+                ):
+                    # Missing object or expired URL, retrying won't help
+                    break
+                if attempt < DOWNLOAD_RETRIES:
+                    delay = DOWNLOAD_BACKOFF_SECONDS * 2 ** (attempt - 1)
+                    log.warning(
+                        f"Download of {save_path} failed ({error}), "
+                        f"retrying in {delay}s"
+                    )
+                    await asyncio.sleep(delay)
+
+        return error
 
     async def download_images_from_s3(
         self,
         bucket_name: str,
         local_dir: str,
         task_id: uuid.UUID,
-        batch_size: int = 20,
-    ):
-        """Asynchronously download images from S3 in batches.
+        concurrency: Optional[int] = None,
+    ) -> List[str]:
+        """Asynchronously download the images of a task from S3.
+
+        A fixed number of workers stream images to disk, so one slow object
+        doesn't hold up the others.
 
         :param bucket_name: Bucket name
         :param local_dir: Local directory to save images
         :param task_id: Optional specific task ID
-        :param batch_size: Number of images to download concurrently
+        :param concurrency: Number of images to download concurrently
+        :return: The paths of the downloaded files
+        :raises ImageDownloadError: If any image could not be downloaded
         """
-        prefix = f"dtm-data/projects/{self.project_id}/{task_id}"
-        objects = list_objects_from_bucket(bucket_name, prefix)
+        concurrency = concurrency or self.max_concurrent_downloads
 
-        if not objects:
+        images = await self.get_task_images(task_id)
+        if not images:
             log.warning(f"No images found in S3 for task {task_id}")
-            return
+            return []
 
-        log.info(f"Downloading images from S3 for task {task_id}...")
-
-        accepted_file_extensions = (".jpg", ".jpeg", ".png", ".txt", ".laz")
+        object_urls = await self.get_image_urls(bucket_name, images)
+        total_files = len(object_urls)
+        log.info(f"Downloading {total_files} images from S3 for task {task_id}...")
+
+        save_paths = [
+            os.path.join(local_dir, name)
+            for name in await self.stage_file_names(task_id, images)
+        ]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def download(url: str, save_path: str, image: dict):
+            async with semaphore:
+                return await self.download_image(
+                    session, url, save_path, image["etag"], image["size"]
+                )
 
-        s3_download_url = settings.S3_DOWNLOAD_ROOT
-        if s3_download_url:
-            object_urls = [
-                f"{s3_download_url}/{obj.object_name}"
-                for obj in objects
-                if obj.object_name.lower().endswith(accepted_file_extensions)
-            ]
-        else:
-            # generate pre-signed URL for each object
-            object_urls = [
-                get_presigned_url(bucket_name, obj.object_name, 12)
-                for obj in objects
-                if obj.object_name.lower().endswith(accepted_file_extensions)
-            ]
+        connector = aiohttp.TCPConnector(limit_per_host=concurrency)
+        timeout = aiohttp.ClientTimeout(
+            total=None, sock_connect=30, sock_read=DOWNLOAD_READ_TIMEOUT
+        )
+        async with aiohttp.ClientSession(
+            connector=connector, timeout=timeout
+        ) as session:
+            errors = await asyncio.gather(
+                *(
+                    download(url, save_path, image)
+                    for url, save_path, image in zip(object_urls, save_paths, images)
+                )
+            )
 
-        total_files = len(object_urls)
-        log.info(f"{total_files} images found in S3 for task {task_id}")
-
-        async with aiohttp.ClientSession() as session:
-            for i in range(0, total_files, batch_size):
-                batch = object_urls[i : i + batch_size]
-                batch_number = i // batch_size + 1
-                total_batches = (total_files + batch_size - 1) // batch_size
-
-                log.info(f"Downloading batch {batch_number}/{total_batches}")
-                tasks = [
-                    self.download_image(
-                        session,
-                        url,
-                        os.path.join(
-                            local_dir, f"{task_id}_file_{i + j + 1}.jpg"
-                        ),  # unique image name are maintained with uuid
-                    )
-                    for j, url in enumerate(batch)
-                ]
-                await asyncio.gather(*tasks)
+        failures = [
+            (image["name"], error)
+            for image, error in zip(images, errors)
+            if error is not None
+        ]
+        if failures:
+            for name, error in failures:
+                log.error(f"Failed to download {name} for task {task_id}: {error}")
+            raise ImageDownloadError(
+                f"{len(failures)} of {total_files} images could not be downloaded "
+                f"for task {task_id}, e.g. {failures[0][0]}: {failures[0][1]}"
+            )
 
         log.info(f"Completed downloading {total_files} images")
+        return save_paths
 
     def process_new_task(
         self,
@@ -166,6 +333,7 @@ class DroneImageProcessor:
         options: Optional[List[Dict[str, Any]]] = None,
         progress_callback: Optional[Any] = None,
         webhook: Optional[str] = None,
+        node: Optional[Node] = None,
     ):
         """Create a new processing task.
 
@@ -174,10 +342,11 @@ class DroneImageProcessor:
         :param options: Processing options
         :param progress_callback: Progress tracking callback
         :param webhook: Webhook URL
+        :param node: Node to create the task on, defaults to self.node
         :return: Created task object
         """
         opts = self.options_list_to_dict(options)
-        task = self.node.create_task(
+        task = (node or self.node).create_task(
             images, opts, name, progress_callback, webhook=webhook
         )
         return task
@@ -199,20 +368,46 @@ class DroneImageProcessor:
         :param single_task: Whether processing a single or multiple tasks
         :return: Created task object
         """
+        name = name or (
+            f"DTM-Task-{self.task_id}"
+            if single_task
+            else f"DTM-Project-{self.project_id}"
+        )
+        # Images staged by the project are modified, so they go through disk
+        staging = await self.get_staging_options()
+        if settings.NODE_ODM_DIRECT_UPLOAD and not staging.enabled:
+            sources = await self.get_image_sources(bucket_name, single_task)
+
+            async def submit(node_url: str):
+                return await self.submit_from_s3(
+                    node_url, sources, name, options, webhook
+                )
+
+            return await self.schedule_task(len(sources), submit, webhook)
+
         # Create a temporary directory to store downloaded images
         temp_dir = tempfile.mkdtemp()
         try:
             images_list = []
-            # Download images based on single or multiple task processing
+            # Download images based on single or multiple task processing.
+            # The input list is built from the downloads, never by rescanning.
             if single_task:  # and self.task_id:
-                await self.download_images_from_s3(bucket_name, temp_dir, self.task_id)
-                images_list = self.list_images(temp_dir)
+                images_list = await self.stage_task_images(
+                    self.task_id,
+                    await self.download_images_from_s3(
+                        bucket_name, temp_dir, self.task_id
+                    ),
+                    staging,
+                )
             else:
                 gcp_list_file = f"dtm-data/projects/{self.project_id}/gcp/gcp_list.txt"
                 gcp_file_path = os.path.join(temp_dir, "gcp_list.txt")
 
                 # Check and add the GCP file to the images list if it exists
-                if get_file_from_bucket(bucket_name, gcp_list_file, gcp_file_path):
+                await asyncio.to_thread(
+                    get_file_from_bucket, bucket_name, gcp_list_file, gcp_file_path
+                )
+                if os.path.exists(gcp_file_path):
                     images_list.append(gcp_file_path)
                 else:
                     log.info(
@@ -220,27 +415,205 @@ class DroneImageProcessor:
                     )
 
                 for task_id in self.task_ids:
-                    await self.download_images_from_s3(bucket_name, temp_dir, task_id)
-                    images_list.extend(self.list_images(temp_dir))
+                    # Each task's files are staged in their own subdirectory
+                    task_dir = os.path.join(temp_dir, str(task_id))
+                    os.makedirs(task_dir, exist_ok=True)
+                    images_list.extend(
+                        await self.stage_task_images(
+                            task_id,
+                            await self.download_images_from_s3(
+                                bucket_name, task_dir, task_id
+                            ),
+                            staging,
+                        )
+                    )
 
             # Start a new processing task
-            task = self.process_new_task(
-                list(set(images_list)),
-                name=name
-                or (
-                    f"DTM-Task-{self.task_id}"
-                    if single_task
-                    else f"DTM-Project-{self.project_id}"
-                ),
-                options=options,
-                webhook=webhook,
-            )
+            async def submit(node_url: str):
+                return await asyncio.to_thread(
+                    self.process_new_task,
+                    images_list,
+                    name=name,
+                    options=options,
+                    webhook=webhook,
+                    node=Node.from_url(node_url),
+                )
 
-            return task
+            return await self.schedule_task(len(images_list), submit, webhook)
         finally:
             # Clean up temporary directory
             shutil.rmtree(temp_dir)
 
+    async def get_staging_options(self) -> image_staging.StagingOptions:
+        """Get the project's options for staging images before processing."""
+        async with self.db.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT
+                    processing_gsd_cm_px AS gsd_cm_px,
+                    cull_images AS cull,
+                    altitude_from_ground AS altitude,
+                    gsd_cm_px AS image_gsd_cm_px
+                FROM projects
+                WHERE id = %(project_id)s
+                """,
+                {"project_id": self.project_id},
+            )
+            options = await cur.fetchone()
+        return image_staging.StagingOptions(**(options or {}))
+
+    async def stage_task_images(
+        self,
+        task_id: uuid.UUID,
+        paths: List[str],
+        staging: image_staging.StagingOptions,
+    ) -> List[str]:
+        """Cull and downsample the downloaded files of a task, if enabled.
+
+        :param task_id: Task ID
+        :param paths: The downloaded files
+        :param staging: The project's staging options
+        :return: The paths of the files to process
+        """
+        if not staging.enabled:
+            return paths
+
+        area = None
+        if staging.cull:
+            async with self.db.cursor() as cur:
+                await cur.execute(
+                    """
+                    SELECT ST_AsGeoJSON(
+                        ST_Buffer(outline::geography, %(margin)s)::geometry
+                    )
+                    FROM tasks
+                    WHERE id = %(task_id)s
+                    """,
+                    {"task_id": task_id, "margin": settings.IMAGE_CULL_AREA_MARGIN},
+                )
+                row = await cur.fetchone()
+            if row and row[0]:
+                area = shape(json.loads(row[0]))
+
+        log.info(f"Staging {len(paths)} files of task {task_id}")
+        return await image_staging.stage_images(paths, staging, area)
+
+    async def schedule_task(
+        self,
+        image_count: int,
+        submit: Callable[[str], Awaitable[Any]],
+        webhook: Optional[str] = None,
+    ):
+        """Create a processing task on the least loaded node.
+
+        If the task can't be created on a node, the next one is tried, and
+        NodeODMError is raised once all of them have failed. The
+        node owning the task is recorded, for the webhooks, and the task is
+        watched by the poller, which also finishes it if there is no webhook.
+
+        :param image_count: Number of files to process
+        :param submit: Async function creating the task on a node URL
+        :param webhook: Webhook URL the task was created with
+        :return: Created task object
+        """
+        if self.node_odm_url:
+            node_urls = [self.node_odm_url]
+        else:
+            node_urls = await odm_nodes.rank_nodes(image_count)
+
+        error = None
+        for node_url in node_urls:
+            try:
+                task = await submit(node_url)
+            except (
+                OdmError,
+                NodeODMError,
+                aiohttp.ClientError,
+                asyncio.TimeoutError,
+            ) as e:
+                log.warning(f"Failed to create task on {node_url}: {e}")
+                error = e
+                continue
+
+            log.info(f"Created ODM task {task.uuid} on {node_url}")
+            self.node_odm_url = node_url
+            self.node = Node.from_url(node_url)
+            await odm_nodes.record_odm_task(
+                self.db,
+                task.uuid,
+                node_url,
+                self.project_id,
+                self.task_id,
+                self.submodel,
+            )
+            if self.redis:
+                await odm_poller.watch(
+                    self.redis,
+                    task.uuid,
+                    node_url,
+                    self.project_id,
+                    self.user_id,
+                    self.task_id,
+                    finish=not webhook,
+                )
+            elif not webhook:
+                log.warning(f"ODM task {task.uuid} has no webhook and isn't polled")
+            return task
+
+        raise NodeODMError(f"No NodeODM node accepts {image_count} images") from error
+
+    async def get_image_sources(
+        self, bucket_name: str, single_task: bool = True
+    ) -> List[Tuple[str, str]]:
+        """Get the files to stream to the node, with the URLs to read them from.
+
+        :param bucket_name: Bucket name
+        :param single_task: Whether processing a single or multiple tasks
+        :return: (file name on the node, URL) pairs
+        """
+        sources = []
+        if not single_task:
+            gcp_list_file = f"dtm-data/projects/{self.project_id}/gcp/gcp_list.txt"
+            if await async_s3_client().exists(bucket_name, gcp_list_file):
+                gcp_url = await self.get_image_urls(
+                    bucket_name, [{"s3_key": gcp_list_file}]
+                )
+                sources.append(("gcp_list.txt", gcp_url[0]))
+            else:
+                log.info(f"GCP file not available for project ID {self.project_id}.")
+
+        for task_id in [self.task_id] if single_task else self.task_ids:
+            images = await self.get_task_images(task_id)
+            urls = await self.get_image_urls(bucket_name, images)
+            names = await self.stage_file_names(task_id, images)
+            sources.extend(zip(names, urls))
+        return sources
+
+    async def submit_from_s3(
+        self,
+        node_url: str,
+        sources: List[Tuple[str, str]],
+        name: str,
+        options: Optional[List[Dict[str, Any]]] = None,
+        webhook: Optional[str] = None,
+    ):
+        """Create a processing task by streaming the images from S3 to the node.
+
+        Nothing is staged on local disk, see NodeODMClient.create_task_from_urls.
+
+        :param node_url: URL of the ODM node
+        :param sources: Files to process, see get_image_sources
+        :param name: Task name
+        :param options: Processing options
+        :param webhook: Webhook URL
+        :return: Created task object
+        """
+        async with NodeODMClient(node_url) as node:
+            odm_task_id = await node.create_task_from_urls(
+                sources, name=name, options=options, webhook=webhook
+            )
+        return Node.from_url(node_url).get_task(odm_task_id)
+
     async def process_single_task(
         self,
         bucket_name: str,
@@ -279,16 +652,6 @@ class DroneImageProcessor:
             bucket_name, name=name, options=options, webhook=webhook, single_task=False
         )
 
-    def monitor_task(self, task):
-        """Monitors the task progress until completion.
-
-        :param task: The task object.
-        """
-        log.info(f"Monitoring task {task.uuid}...")
-        task.wait_for_completion(interval=5)
-        log.info("Task completed.")
-        return task
-
     async def process_images_from_s3(
         self,
         bucket_name: str,
@@ -296,40 +659,15 @@ class DroneImageProcessor:
         options: Optional[List[Dict[str, Any]]] = None,
         webhook: Optional[str] = None,
     ):
-        """Process images from S3 for a single task."""
-        task = await self.process_single_task(
+        """Process images from S3 for a single task.
+
+        Without a webhook, the results are handled once the poller sees the
+        task end, see odm_poller.
+        """
+        return await self.process_single_task(
             bucket_name, name=name, options=options, webhook=webhook
         )
 
-        #   If webhook is passed, webhook does this job.
-        if not webhook:
-            # Monitor task progress
-            self.monitor_task(task)
-
-            # Optionally, download results
-            output_file_path = f"/tmp/{self.project_id}"
-            path_to_download = self.download_results(task, output_path=output_file_path)
-
-            # Upload the results into s3
-            s3_path = f"dtm-data/projects/{self.project_id}/{self.task_id}/assets.zip"
-            add_file_to_bucket(bucket_name, path_to_download, s3_path)
-            # now update the task as completed in Db.
-            # Call the async function using asyncio
-
-            # Update background task status to COMPLETED
-            update_task_status_sync = async_to_sync(task_logic.update_task_state)
-            update_task_status_sync(
-                self.db,
-                self.project_id,
-                self.task_id,
-                self.user_id,
-                "Task completed.",
-                State.IMAGE_UPLOADED,
-                State.IMAGE_PROCESSING_FINISHED,
-                timestamp(),
-            )
-        return task
-
     async def process_images_for_all_tasks(
         self,
         bucket_name: str,
@@ -345,33 +683,119 @@ class DroneImageProcessor:
         return task
 
 
-def reproject_to_web_mercator(input_file, output_file):
-    """Reprojects a COG file to Web Mercator (EPSG:3857) using GDAL.
+def odm_assets_job_id(odm_task_id: str) -> str:
+    """Get the ARQ job ID processing the results of an ODM task.
 
-    Args:
-        input_file (str): Path to the input COG file.
-        output_file (str): Path to the output reprojected COG file.
+    Webhooks can be delivered more than once, ARQ enqueues a job ID once.
     """
-    try:
-        # Define the target projection (Web Mercator)
-        target_srs = "EPSG:3857"
-
-        # Use gdal.Warp to perform the reprojection
-        gdal.Warp(
-            output_file,
-            input_file,
-            dstSRS=target_srs,
-            format="COG",  # Output format as Cloud Optimized GeoTIFF
-            resampleAlg="near",  # Resampling method, 'near' for nearest neighbor
+    return f"odm-assets:{odm_task_id}"
+
+
+async def handle_odm_task_status(
+    db: Connection,
+    redis: ArqRedis,
+    odm_task_id: str,
+    status_code: int,
+    dtm_project_id: uuid.UUID,
+    dtm_user_id: str,
+    dtm_task_id: Optional[uuid.UUID] = None,
+):
+    """Enqueue the processing of the results of an ended ODM task.
+
+    Called by the webhooks, and by the poller for tasks created without a
+    webhook. Only failed (30), completed (40) and canceled (50) tasks are
+    handled, a canceled task failing like a failed one.
+
+    :param odm_task_id: UUID of the ODM task
+    :param status_code: ODM status code of the task
+    :param dtm_project_id: UUID of the project
+    :param dtm_user_id: User who started the processing
+    :param dtm_task_id: UUID of the DTM task, None if processing the project
+    """
+    if status_code == 50:
+        status_code = 30
+    if status_code not in {30, 40}:
+        return
+
+    odm_task = await odm_nodes.get_odm_task(db, odm_task_id)
+    node_odm_url = odm_task["node_url"] if odm_task else settings.NODE_ODM_URL
+    job_options = {
+        "_job_id": odm_assets_job_id(odm_task_id),
+        "_queue_name": "default_queue",
+        "node_odm_url": node_odm_url,
+        "dtm_project_id": dtm_project_id,
+        "odm_task_id": odm_task_id,
+        "odm_status_code": status_code,
+    }
+
+    if dtm_task_id is None:
+        if odm_task is None:
+            # Not created by this run, e.g. a submodel of a run started again,
+            # so it must not overwrite the project outputs
+            log.warning(f"Ignoring ODM task {odm_task_id}, it has no record")
+            return
+        if odm_task["submodel"] is not None:
+            log.info(
+                f"Project {dtm_project_id}: Submodel {odm_task['submodel']} "
+                f"processing status {status_code}"
+            )
+            await redis.enqueue_job(
+                "process_submodel_from_odm",
+                submodel=odm_task["submodel"],
+                **job_options,
+            )
+        else:
+            log.info(f"Project {dtm_project_id}: Processing status {status_code}")
+            await redis.enqueue_job("process_assets_from_odm", **job_options)
+        return
+
+    current_state = await task_logic.get_task_state(db, dtm_project_id, dtm_task_id)
+    state_value = State[current_state.get("state")]
+    if status_code == 40:
+        message = "Task completed."
+    elif state_value != State.IMAGE_PROCESSING_FAILED:
+        message = "Image processing failed."
+        await task_logic.update_task_state(
+            db,
+            dtm_project_id,
+            dtm_task_id,
+            dtm_user_id,
+            message,
+            state_value,
+            State.IMAGE_PROCESSING_FAILED,
+            timestamp(),
         )
-        log.info(f"File reprojected to Web Mercator and saved as {output_file}")
+    else:
+        return
 
-    except Exception as e:
-        log.error(f"An error occurred during reprojection: {e}")
-        raise
+    await redis.enqueue_job(
+        "process_assets_from_odm",
+        state=state_value,
+        message=message,
+        dtm_task_id=dtm_task_id,
+        dtm_user_id=dtm_user_id,
+        **job_options,
+    )
+
+
+def extract_zip_member(zip_path: str, member: str, file_path: str) -> bool:
+    """Stream one member of a zip file to disk, without extracting the others.
+
+    :return: False if the zip file has no such member
+    """
+    with zipfile.ZipFile(zip_path) as zip_file:
+        try:
+            source = zip_file.open(member)
+        except KeyError:
+            return False
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        with source, open(file_path, "wb") as target:
+            shutil.copyfileobj(source, target, DOWNLOAD_CHUNK_SIZE)
+    return True
 
 
 async def process_assets_from_odm(
+    ctx: Dict[Any, Any],
     node_odm_url: str,
     dtm_project_id: uuid.UUID,
     odm_task_id: str,
@@ -384,6 +808,10 @@ async def process_assets_from_odm(
     """Downloads results from ODM, reprojects the orthophoto, and uploads assets to S3.
     Updates task state if required.
 
+    Runs as an ARQ job enqueued by the webhooks, see odm_assets_job_id. Only
+    the needed members of assets.zip are extracted, and GDAL runs in a
+    separate process.
+
     :param node_odm_url: URL of the ODM node.
     :param dtm_project_id: UUID of the project.
     :param odm_task_id: UUID of the ODM task.
@@ -393,150 +821,202 @@ async def process_assets_from_odm(
     :param dtm_user_id: User ID for state updates.
     """
     log.info(f"Starting processing for project {dtm_project_id}")
-    node = Node.from_url(node_odm_url)
     output_file_path = f"/tmp/{uuid.uuid4()}"
+    pool = ctx["db_pool"]
+    status = ImageProcessingStatus.FAILED
 
     try:
         os.makedirs(output_file_path, exist_ok=True)
-        task = node.get_task(odm_task_id)
-        log.info(f"Downloading results for task {odm_task_id} to {output_file_path}")
-
-        if str(odm_status_code) == "30":
-            status = ImageProcessingStatus.FAILED
-        elif str(odm_status_code) == "40":
-            assets_path = task.download_zip(output_file_path)
-            if not os.path.exists(assets_path):
-                log.error(f"Downloaded file not found: {assets_path}")
-                raise
-            log.info(f"Successfully downloaded ZIP to {assets_path}")
-
-            # Construct the S3 path dynamically to avoid empty segments
-            task_segment = f"{dtm_task_id}/" if dtm_task_id else ""
-            s3_path = f"dtm-data/projects/{dtm_project_id}/{task_segment}assets.zip"
-            log.info(f"Uploading {assets_path} to S3 path: {s3_path}")
-            add_file_to_bucket(settings.S3_BUCKET_NAME, assets_path, s3_path)
-
-            with zipfile.ZipFile(assets_path, "r") as zip_ref:
-                zip_ref.extractall(output_file_path)
-
-            orthophoto_path = os.path.join(
-                output_file_path, "odm_orthophoto", "odm_orthophoto.tif"
-            )
-            if not os.path.exists(orthophoto_path):
-                log.error(f"Orthophoto not found at {orthophoto_path}")
-                raise FileNotFoundError("Orthophoto file is missing")
-
-            reproject_to_web_mercator(orthophoto_path, orthophoto_path)
-            s3_ortho_path = f"dtm-data/projects/{dtm_project_id}/{task_segment}orthophoto/odm_orthophoto.tif"
-            log.info(f"Uploading reprojected orthophoto to S3 path: {s3_ortho_path}")
-            add_file_to_bucket(settings.S3_BUCKET_NAME, orthophoto_path, s3_ortho_path)
-
-            images_json_path = os.path.join(output_file_path, "images.json")
-            if os.path.exists(images_json_path):
-                s3_images_json_path = (
-                    f"dtm-data/projects/{dtm_project_id}/{task_segment}images.json"
-                )
-                log.info(f"Uploading images.json to S3 path: {s3_images_json_path}")
-                add_file_to_bucket(
-                    settings.S3_BUCKET_NAME, images_json_path, s3_images_json_path
-                )
-            else:
-                log.warning(f"images.json not found in {output_file_path}")
-
-            log.info(f"Processing complete for project {dtm_project_id}")
-
-            if state and dtm_task_id and dtm_user_id:
-                # NOTE: This function uses a separate database connection pool because it is called by an internal server
-                # and doesn't rely on FastAPI's request context. This allows independent database access outside FastAPI's lifecycle.
-                pool = await database.get_db_connection_pool()
-                async with pool as pool_instance:
-                    async with pool_instance.connection() as conn:
-                        await task_logic.update_task_state(
-                            db=conn,
-                            project_id=dtm_project_id,
-                            task_id=dtm_task_id,
-                            user_id=dtm_user_id,
-                            comment=message,
-                            initial_state=state,
-                            final_state=State.IMAGE_PROCESSING_FINISHED,
-                            updated_at=timestamp(),
-                        )
-                        log.info(
-                            f"Task {dtm_task_id} state updated to IMAGE_PROCESSING_FINISHED in the database."
-                        )
-
-                        s3_path_url = f"dtm-data/projects/{dtm_project_id}/{dtm_task_id}/assets.zip"
-                        # update the task table
-                        await project_logic.update_task_field(
-                            conn, dtm_project_id, dtm_task_id, "assets_url", s3_path_url
-                        )
-
-                        # If the project has only one task, copy the orthophoto and assets to the project level
-                        # Mark the project processing status as completed to avoid redundant processing
-                        tasks = await project_logic.get_all_tasks_for_project(
-                            dtm_project_id, conn
-                        )
-
-                        if len(tasks) == 1:
-                            project_ortho_path = f"dtm-data/projects/{dtm_project_id}/orthophoto/odm_orthophoto.tif"
-                            log.info(
-                                f"Copying orthophoto to project level: {project_ortho_path}"
-                            )
+        async with NodeODMClient(node_odm_url) as node:
+            try:
+                if str(odm_status_code) == "40":
+                    await upload_assets_from_odm(
+                        node, odm_task_id, output_file_path, dtm_project_id, dtm_task_id
+                    )
+                    log.info(f"Processing complete for project {dtm_project_id}")
+                    status = ImageProcessingStatus.SUCCESS
 
-                            ortho_copy_status = copy_file_within_bucket(
-                                settings.S3_BUCKET_NAME,
-                                s3_ortho_path,
-                                project_ortho_path,
+                    if dtm_task_id:
+                        async with pool.connection() as conn:
+                            await save_image_footprints(
+                                conn, output_file_path, dtm_project_id, dtm_task_id
                             )
 
-                            project_assets_path = (
-                                f"dtm-data/projects/{dtm_project_id}/assets.zip"
-                            )
-                            log.info(
-                                f"Copying assets to project level: {project_assets_path}"
+                    if state and dtm_task_id and dtm_user_id:
+                        async with pool.connection() as conn:
+                            await finish_task_processing(
+                                conn,
+                                dtm_project_id,
+                                dtm_task_id,
+                                dtm_user_id,
+                                state,
+                                message,
                             )
-
-                            assets_copy_status = copy_file_within_bucket(
-                                settings.S3_BUCKET_NAME, s3_path, project_assets_path
-                            )
-
-                            # Update project processing status if both copies were successful
-                            if ortho_copy_status and assets_copy_status:
-                                await project_logic.update_processing_status(
-                                    conn, dtm_project_id, ImageProcessingStatus.SUCCESS
-                                )
-
-            status = ImageProcessingStatus.SUCCESS
-        if not dtm_task_id:
-            # Update the image processing status
-            pool = await database.get_db_connection_pool()
-            async with pool as pool_instance:
-                async with pool_instance.connection() as conn:
-                    await project_logic.update_processing_status(
-                        conn, dtm_project_id, status
+            finally:
+                try:
+                    log.info(f"Attempting to delete task {odm_task_id} from NodeODM.")
+                    await node.remove_task(odm_task_id)
+                    log.info(
+                        f"Successful attempt at deleting task {odm_task_id} from NodeODM."
+                    )
+                except Exception as e:
+                    log.error(
+                        f"Error occurred while cleaning up task {odm_task_id} from NodeODM: {e}."
                     )
 
     except Exception as e:
         log.error(f"Error during processing for project {dtm_project_id}: {e}")
 
     finally:
-        if task:
-            try:
-                log.info(f"Attempting to delete task {odm_task_id} from NodeODM.")
-                task.remove()
-                log.info(
-                    f"Successful attempt at deleting task {odm_task_id} from NodeODM."
-                )
-            except Exception as e:
-                log.error(
-                    f"Error occurred while cleaning up task {odm_task_id} from NodeODM: {e}."
-                )
-
         if os.path.exists(output_file_path):
             try:
-                shutil.rmtree(output_file_path)
+                await asyncio.to_thread(shutil.rmtree, output_file_path)
                 log.info(f"Temporary directory {output_file_path} cleaned up.")
             except Exception as cleanup_error:
                 log.error(
                     f"Error cleaning up directory {output_file_path}: {cleanup_error}"
                 )
+
+    if not dtm_task_id:
+        # Update the image processing status
+        async with pool.connection() as conn:
+            await project_logic.update_processing_status(conn, dtm_project_id, status)
+
+
+async def upload_assets_from_odm(
+    node: NodeODMClient,
+    odm_task_id: str,
+    output_file_path: str,
+    dtm_project_id: uuid.UUID,
+    dtm_task_id: Optional[uuid.UUID] = None,
+):
+    """Download the assets of an ODM task, and upload them to S3.
+
+    The whole assets.zip is uploaded while the orthophoto, DSM and
+    images.json are extracted from it, and each is uploaded once ready.
+    """
+    s3 = async_s3_client()
+    assets_path = await node.download_asset(
+        odm_task_id, "all.zip", os.path.join(output_file_path, "assets.zip")
+    )
+    log.info(f"Successfully downloaded ZIP to {assets_path}")
+
+    # Construct the S3 path dynamically to avoid empty segments
+    task_segment = f"{dtm_task_id}/" if dtm_task_id else ""
+    s3_prefix = f"dtm-data/projects/{dtm_project_id}/{task_segment}"
+
+    def upload(local_path: str, s3_file_path: str) -> asyncio.Task:
+        log.info(f"Uploading {local_path} to S3 path: {s3_file_path}")
+        return asyncio.create_task(
+            s3.fput(settings.S3_BUCKET_NAME, s3_file_path, local_path, parallel=True)
+        )
+
+    # The outputs are independent, so each upload starts as soon as its file
+    # is ready and they run concurrently
+    uploads = [upload(assets_path, f"{s3_prefix}assets.zip")]
+    try:
+        for member, s3_file_path in ODM_ASSET_MEMBERS.items():
+            member_path = os.path.join(output_file_path, "extracted", member)
+            if not await asyncio.to_thread(
+                extract_zip_member, assets_path, member, member_path
+            ):
+                if member == ODM_ORTHOPHOTO_MEMBER:
+                    raise FileNotFoundError("Orthophoto file is missing")
+                log.warning(f"{member} not found in {assets_path}")
+                continue
+
+            if member == ODM_ORTHOPHOTO_MEMBER:
+                member_path = await run_in_process(
+                    mosaic.reproject_to_web_mercator,
+                    member_path,
+                    os.path.join(output_file_path, "odm_orthophoto.tif"),
+                )
+            uploads.append(upload(member_path, f"{s3_prefix}{s3_file_path}"))
+    except BaseException:
+        # Don't remove the output directory under running uploads
+        await asyncio.gather(*uploads, return_exceptions=True)
+        raise
+    await asyncio.gather(*uploads)
+
+
+async def save_image_footprints(
+    db: Connection,
+    output_file_path: str,
+    dtm_project_id: uuid.UUID,
+    dtm_task_id: uuid.UUID,
+):
+    """Store the footprints of a task's processed images, for GCP lookups.
+
+    Read from the images.json extracted by upload_assets_from_odm. A failure
+    is only logged, as footprints of older tasks are stored on lookup.
+    """
+    images_json_path = os.path.join(output_file_path, "extracted", "images.json")
+    try:
+        with open(images_json_path) as images_json:
+            images = json.load(images_json)
+        await gcp_crud.save_task_footprints(db, dtm_project_id, dtm_task_id, images)
+    except (OSError, ValueError) as e:
+        log.warning(f"Failed to store image footprints of task {dtm_task_id}: {e}")
+
+
+async def finish_task_processing(
+    db: Connection,
+    dtm_project_id: uuid.UUID,
+    dtm_task_id: uuid.UUID,
+    dtm_user_id: str,
+    state: State,
+    message: Optional[str],
+):
+    """Mark a task processed, copying its outputs to the project if it is alone."""
+    s3 = async_s3_client()
+    await task_logic.update_task_state(
+        db=db,
+        project_id=dtm_project_id,
+        task_id=dtm_task_id,
+        user_id=dtm_user_id,
+        comment=message,
+        initial_state=state,
+        final_state=State.IMAGE_PROCESSING_FINISHED,
+        updated_at=timestamp(),
+    )
+    log.info(
+        f"Task {dtm_task_id} state updated to IMAGE_PROCESSING_FINISHED in the database."
+    )
+
+    task_prefix = f"dtm-data/projects/{dtm_project_id}/{dtm_task_id}/"
+    s3_path = f"{task_prefix}assets.zip"
+    # update the task table
+    await project_logic.update_task_field(
+        db, dtm_project_id, dtm_task_id, "assets_url", s3_path
+    )
+
+    # If the project has only one task, copy the orthophoto and assets to the
+    # project level. Mark the project processing status as completed to avoid
+    # redundant processing
+    tasks = await project_logic.get_all_tasks_for_project(dtm_project_id, db)
+    if len(tasks) != 1:
+        return
+
+    project_ortho_path = (
+        f"dtm-data/projects/{dtm_project_id}/orthophoto/odm_orthophoto.tif"
+    )
+    log.info(f"Copying orthophoto to project level: {project_ortho_path}")
+    project_assets_path = f"dtm-data/projects/{dtm_project_id}/assets.zip"
+    log.info(f"Copying assets to project level: {project_assets_path}")
+
+    # Update project processing status if both copies were successful
+    try:
+        await asyncio.gather(
+            s3.copy(
+                settings.S3_BUCKET_NAME,
+                f"{task_prefix}orthophoto/odm_orthophoto.tif",
+                project_ortho_path,
+            ),
+            s3.copy(settings.S3_BUCKET_NAME, s3_path, project_assets_path),
+        )
+    except S3Error as e:
+        log.error(f"Error copying outputs to project level: {e}")
+    else:
+        await project_logic.update_processing_status(
+            db, dtm_project_id, ImageProcessingStatus.SUCCESS
+        )
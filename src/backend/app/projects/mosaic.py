@@ -0,0 +1,264 @@
+"""Reproject and merge rasters with GDAL, written as Cloud Optimized GeoTIFFs.
+
+GDAL is blocking and CPU bound, run these functions with run_in_process so
+the event loop stays responsive.
+"""
+
+import asyncio
+import json
+import os
+import tempfile
+import uuid
+from typing import Dict, Optional, Sequence, Tuple
+
+from loguru import logger as log
+from osgeo import gdal
+
+from app.config import settings
+from app.s3 import async_s3_client
+from app.utils import run_in_process
+
+# Mosaics are served as web map tiles, like the per-task orthophotos
+MOSAIC_SRS = "EPSG:3857"
+DSM_NODATA = -9999
+COG_CREATION_OPTIONS = [
+    "COMPRESS=DEFLATE",
+    "PREDICTOR=2",
+    "BIGTIFF=IF_SAFER",
+    "NUM_THREADS=ALL_CPUS",
+    "OVERVIEW_RESAMPLING=AVERAGE",
+]
+# Orthophotos are 8 bit RGB imagery: lossy compression keeps them small, with
+# the alpha band stored as a mask, as JPEG has no alpha channel. The internal
+# overviews let tiles at any zoom be read with a few range requests.
+ORTHOPHOTO_COG_OPTIONS = [
+    f"COMPRESS={settings.ORTHOPHOTO_COMPRESSION}",
+    f"QUALITY={settings.ORTHOPHOTO_QUALITY}",
+    "OVERVIEWS=AUTO",
+    "BIGTIFF=IF_SAFER",
+    "NUM_THREADS=ALL_CPUS",
+    "OVERVIEW_RESAMPLING=AVERAGE",
+]
+TILE_SIZE = 256
+
+
+def write_orthophoto_cog(source: gdal.Dataset, output_path: str) -> str:
+    """Write an orthophoto as a COG, with its alpha band (if any) as a mask.
+
+    Args:
+        source (gdal.Dataset): The orthophoto, usually a warped VRT.
+        output_path (str): The COG to write.
+
+    Returns:
+        str: The output path.
+    """
+    options = {"format": "COG", "creationOptions": ORTHOPHOTO_COG_OPTIONS}
+    alpha_band = source.RasterCount
+    band = source.GetRasterBand(alpha_band)
+    if band.GetColorInterpretation() == gdal.GCI_AlphaBand:
+        options.update(bandList=list(range(1, alpha_band)), maskBand=alpha_band)
+    gdal.Translate(output_path, source, **options)
+    return output_path
+
+
+def reproject_to_web_mercator(input_file: str, output_file: str) -> str:
+    """Reproject an orthophoto to a Web Mercator (EPSG:3857) COG.
+
+    Args:
+        input_file (str): Path to the input raster.
+        output_file (str): Path to the output COG, not the input path.
+
+    Returns:
+        str: The output path.
+    """
+    if os.path.abspath(input_file) == os.path.abspath(output_file):
+        raise ValueError("Reprojecting a raster onto itself is unsupported")
+
+    with (
+        gdal.ExceptionMgr(useExceptions=True),
+        tempfile.TemporaryDirectory(dir=os.path.dirname(output_file)) as work_dir,
+    ):
+        warped = gdal.Warp(
+            os.path.join(work_dir, "warped.vrt"),
+            input_file,
+            format="VRT",
+            dstSRS=MOSAIC_SRS,
+            resampleAlg="near",
+        )
+        write_orthophoto_cog(warped, output_file)
+        warped = None
+    log.info(f"File reprojected to Web Mercator and saved as {output_file}")
+    return output_file
+
+
+def write_cutline(geometry: str, path: str) -> str:
+    """Write a GeoJSON geometry (EPSG:4326) as a cutline file for gdal.Warp."""
+    feature_collection = {
+        "type": "FeatureCollection",
+        "features": [
+            {"type": "Feature", "properties": {}, "geometry": json.loads(geometry)}
+        ],
+    }
+    with open(path, "w") as cutline_file:
+        json.dump(feature_collection, cutline_file)
+    return path
+
+
+def build_mosaic(
+    inputs: Sequence[Tuple[str, Optional[str]]],
+    output_path: str,
+    nodata: Optional[float] = None,
+) -> str:
+    """Merge rasters into one COG with overviews, each clipped to a cutline.
+
+    Each input is warped to MOSAIC_SRS as a VRT, so no intermediate rasters
+    are written, and the COG is written in one pass over the mosaic VRT.
+
+    Args:
+        inputs: (raster path, GeoJSON cutline geometry or None) pairs.
+        output_path: The COG to write.
+        nodata: The nodata value of single band rasters, e.g. DSMs. Without
+            it, the inputs are expected to have an alpha band, like ODM
+            orthophotos.
+
+    Returns:
+        str: The output path.
+    """
+    if not inputs:
+        raise ValueError("No rasters to merge")
+
+    warp_options = {
+        "format": "VRT",
+        "dstSRS": MOSAIC_SRS,
+        "resampleAlg": "bilinear",
+        "multithread": True,
+    }
+    if nodata is None:
+        warp_options["dstAlpha"] = True
+    else:
+        warp_options["dstNodata"] = nodata
+
+    with (
+        gdal.ExceptionMgr(useExceptions=True),
+        tempfile.TemporaryDirectory(dir=os.path.dirname(output_path)) as work_dir,
+    ):
+        warped = []
+        for index, (raster_path, cutline) in enumerate(inputs):
+            options = dict(warp_options)
+            if cutline:
+                options["cutlineDSName"] = write_cutline(
+                    cutline, os.path.join(work_dir, f"cutline_{index}.geojson")
+                )
+            vrt_path = os.path.join(work_dir, f"warped_{index}.vrt")
+            gdal.Warp(vrt_path, raster_path, **options)
+            warped.append(vrt_path)
+
+        vrt_options = {"resolution": "highest"}
+        if nodata is not None:
+            vrt_options.update(srcNodata=nodata, VRTNodata=nodata)
+        mosaic = gdal.BuildVRT(
+            os.path.join(work_dir, "mosaic.vrt"), warped, **vrt_options
+        )
+        log.info(f"Writing mosaic of {len(warped)} rasters to {output_path}")
+        if nodata is None:
+            write_orthophoto_cog(mosaic, output_path)
+        else:
+            gdal.Translate(
+                output_path,
+                mosaic,
+                format="COG",
+                creationOptions=COG_CREATION_OPTIONS,
+            )
+        mosaic = None
+
+    return output_path
+
+
+async def build_mosaic_from_s3(
+    inputs: Sequence[Tuple[str, Optional[str]]],
+    s3_output_path: str,
+    nodata: Optional[float] = None,
+) -> str:
+    """Merge rasters in S3 into a COG, uploaded to s3_output_path.
+
+    Args:
+        inputs: (S3 path, GeoJSON cutline geometry or None) pairs.
+        s3_output_path: The S3 path of the COG.
+        nodata: See build_mosaic.
+
+    Returns:
+        str: The S3 path of the COG.
+    """
+    s3 = async_s3_client()
+    bucket_name = settings.S3_BUCKET_NAME
+    with tempfile.TemporaryDirectory() as temp_dir:
+        local_inputs = [
+            (os.path.join(temp_dir, f"input_{index}.tif"), cutline)
+            for index, (_, cutline) in enumerate(inputs)
+        ]
+        await asyncio.gather(
+            *(
+                s3.fget(bucket_name, s3_path, local_path)
+                for (s3_path, _), (local_path, _) in zip(inputs, local_inputs)
+            )
+        )
+
+        output_path = os.path.join(temp_dir, "mosaic.tif")
+        await run_in_process(build_mosaic, local_inputs, output_path, nodata)
+
+        await s3.fput(bucket_name, s3_output_path, output_path, parallel=True)
+    log.info(f"Uploaded mosaic of {len(inputs)} rasters to {s3_output_path}")
+    return s3_output_path
+
+
+def render_tile(
+    source: str,
+    bounds: Tuple[float, float, float, float],
+    config_options: Optional[Dict[str, str]] = None,
+    clear_cache: bool = False,
+) -> bytes:
+    """Render a web map tile of a raster as a PNG, transparent outside it.
+
+    GDAL picks the overview closest to the tile resolution and reads only
+    the blocks covering the tile, so a tile of a remote COG (/vsis3/ or
+    /vsicurl/) costs a few HTTP range requests, whatever the raster size.
+
+    Args:
+        source (str): The raster path, or a GDAL virtual file system path.
+        bounds: The tile (min x, min y, max x, max y), in MOSAIC_SRS.
+        config_options: GDAL config options to read the source with, set
+            for the current thread only.
+        clear_cache (bool): Whether the remote source changed, so the blocks
+            and size GDAL cached for it must be dropped first.
+
+    Returns:
+        bytes: The PNG tile.
+    """
+    png_path = f"/vsimem/tile_{uuid.uuid4().hex}.png"
+    with (
+        gdal.ExceptionMgr(useExceptions=True),
+        gdal.config_options(config_options or {}),
+    ):
+        if clear_cache:
+            gdal.VSICurlPartialClearCache(source)
+        tile = gdal.Warp(
+            "",
+            source,
+            format="MEM",
+            dstSRS=MOSAIC_SRS,
+            outputBounds=bounds,
+            width=TILE_SIZE,
+            height=TILE_SIZE,
+            resampleAlg="bilinear",
+            dstAlpha=True,
+        )
+        gdal.GetDriverByName("PNG").CreateCopy(png_path, tile)
+        tile = None
+        try:
+            png_file = gdal.VSIFOpenL(png_path, "rb")
+            size = gdal.VSIStatL(png_path).size
+            content = gdal.VSIFReadL(1, size, png_file)
+            gdal.VSIFCloseL(png_file)
+        finally:
+            gdal.Unlink(png_path)
+    return content
@@ -0,0 +1,237 @@
+"""Async client for the NodeODM task API.
+
+Images are streamed from their (presigned) S3 URLs straight into NodeODM's
+chunked upload API, without being staged on local disk.
+"""
+
+import asyncio
+import json
+import mimetypes
+import os
+from contextlib import AsyncExitStack
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+
+import aiohttp
+from loguru import logger as log
+
+# Files sent per /task/new/upload request, and requests in flight
+UPLOAD_BATCH_SIZE = 10
+UPLOAD_CONCURRENCY = 4
+UPLOAD_RETRIES = 4
+UPLOAD_BACKOFF_SECONDS = 2
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class NodeODMError(Exception):
+    """Raised when NodeODM rejects a request or returns an error."""
+
+
+class NodeODMClient:
+    """Async client for one NodeODM node.
+
+    Use as an async context manager, so the HTTP session is closed::
+
+        async with NodeODMClient("http://nodeodm:9900") as node:
+            odm_task_id = await node.create_task_from_urls(sources)
+    """
+
+    def __init__(
+        self,
+        url: str,
+        token: Optional[str] = None,
+        timeout: Optional[aiohttp.ClientTimeout] = None,
+    ):
+        parts = urlsplit(url)
+        self.base_url = urlunsplit(
+            (parts.scheme, parts.netloc, parts.path.rstrip("/"), "", "")
+        )
+        self.token = token or parse_qs(parts.query).get("token", [""])[0]
+        self.timeout = timeout or aiohttp.ClientTimeout(
+            total=None, sock_connect=30, sock_read=600
+        )
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "NodeODMClient":
+        self._session = aiohttp.ClientSession(timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self._session.close()
+        self._session = None
+
+    async def _request(self, method: str, path: str, **kwargs) -> Any:
+        params = {"token": self.token} if self.token else None
+        async with self._session.request(
+            method, f"{self.base_url}{path}", params=params, **kwargs
+        ) as response:
+            if response.status == 401:
+                raise NodeODMError("Unauthorized, check the NodeODM token")
+            try:
+                result = await response.json(content_type=None)
+            except (json.JSONDecodeError, aiohttp.ContentTypeError) as e:
+                raise NodeODMError(
+                    f"Invalid response from {path} ({response.status})"
+                ) from e
+        if isinstance(result, dict) and "error" in result:
+            raise NodeODMError(result["error"])
+        return result
+
+    async def info(self) -> Dict[str, Any]:
+        """Get the node info, e.g. its queueCount and maxImages."""
+        return await self._request("GET", "/info")
+
+    async def task_info(self, odm_task_id: str) -> Dict[str, Any]:
+        """Get the status and progress of a task."""
+        return await self._request("GET", f"/task/{odm_task_id}/info")
+
+    async def init_task(
+        self,
+        name: Optional[str] = None,
+        options: Optional[List[Dict[str, Any]]] = None,
+        webhook: Optional[str] = None,
+    ) -> str:
+        """Start a chunked task upload, returning the new task UUID."""
+        form = aiohttp.FormData()
+        if name:
+            form.add_field("name", name)
+        form.add_field("options", json.dumps(options or []))
+        if webhook:
+            form.add_field("webhook", webhook)
+
+        result = await self._request("POST", "/task/new/init", data=form)
+        if "uuid" not in result:
+            raise NodeODMError(f"Invalid response from /task/new/init: {result}")
+        return result["uuid"]
+
+    async def upload_files(
+        self, odm_task_id: str, files: Sequence[Tuple[str, Any]]
+    ) -> None:
+        """Upload files to an initialised task, in one request.
+
+        Args:
+            files: (file name, content) pairs. The content can be bytes, a
+                file object or an aiohttp stream, which is sent as it is read.
+        """
+        form = aiohttp.FormData()
+        for file_name, content in files:
+            form.add_field(
+                "images",
+                content,
+                filename=file_name,
+                content_type=mimetypes.guess_type(file_name)[0] or "image/jpeg",
+            )
+        result = await self._request(
+            "POST", f"/task/new/upload/{odm_task_id}", data=form
+        )
+        if not result.get("success"):
+            raise NodeODMError(f"Failed upload with unexpected result: {result}")
+
+    async def commit_task(self, odm_task_id: str) -> str:
+        """Finish the upload and queue the task for processing."""
+        result = await self._request("POST", f"/task/new/commit/{odm_task_id}")
+        return result.get("uuid", odm_task_id)
+
+    async def remove_task(self, odm_task_id: str) -> None:
+        """Cancel and delete a task."""
+        await self._request("POST", "/task/remove", data={"uuid": odm_task_id})
+
+    async def download_asset(self, odm_task_id: str, asset: str, file_path: str):
+        """Stream one output of a completed task to disk.
+
+        Args:
+            asset: e.g. "all.zip", "orthophoto.tif" or "dsm.tif".
+        """
+        params = {"token": self.token} if self.token else None
+        async with self._session.get(
+            f"{self.base_url}/task/{odm_task_id}/download/{asset}", params=params
+        ) as response:
+            if response.status != 200 or response.content_type == "application/json":
+                raise NodeODMError(
+                    f"Failed to download {asset} of task {odm_task_id} "
+                    f"({response.status}): {await response.text()}"
+                )
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            with open(file_path, "wb") as asset_file:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    await asyncio.to_thread(asset_file.write, chunk)
+        return file_path
+
+    async def _upload_batch_from_urls(
+        self, odm_task_id: str, batch: Sequence[Tuple[str, str]]
+    ):
+        """Stream a batch of files from their URLs into one upload request."""
+        for attempt in range(1, UPLOAD_RETRIES + 1):
+            try:
+                async with AsyncExitStack() as stack:
+                    sources = []
+                    for file_name, url in batch:
+                        response = await stack.enter_async_context(
+                            self._session.get(url)
+                        )
+                        response.raise_for_status()
+                        sources.append((file_name, response.content))
+                    await self.upload_files(odm_task_id, sources)
+                return
+            except (aiohttp.ClientError, asyncio.TimeoutError, NodeODMError) as e:
+                if attempt == UPLOAD_RETRIES:
+                    raise NodeODMError(
+                        f"Failed to upload {batch[0][0]} and {len(batch) - 1} "
+                        f"other files: {e}"
+                    ) from e
+                delay = UPLOAD_BACKOFF_SECONDS * attempt
+                log.warning(f"Upload to NodeODM failed ({e}), retrying in {delay}s")
+                await asyncio.sleep(delay)
+
+    async def create_task_from_urls(
+        self,
+        sources: Sequence[Tuple[str, str]],
+        name: Optional[str] = None,
+        options: Optional[List[Dict[str, Any]]] = None,
+        webhook: Optional[str] = None,
+        batch_size: int = UPLOAD_BATCH_SIZE,
+        concurrency: int = UPLOAD_CONCURRENCY,
+    ) -> str:
+        """Create a task from files streamed from URLs, e.g. presigned S3 URLs.
+
+        Files are uploaded in batches, several batches at a time, and
+        nothing is written to local disk. The task is removed from the node
+        if any upload fails.
+
+        Args:
+            sources: (file name on the node, URL to read it from) pairs.
+
+        Returns:
+            str: The UUID of the committed NodeODM task.
+        """
+        if not sources:
+            raise NodeODMError("Not enough images")
+
+        odm_task_id = await self.init_task(name, options, webhook)
+        batches = [
+            sources[i : i + batch_size] for i in range(0, len(sources), batch_size)
+        ]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def upload(batch):
+            async with semaphore:
+                await self._upload_batch_from_urls(odm_task_id, batch)
+
+        log.info(
+            f"Streaming {len(sources)} files to NodeODM task {odm_task_id} "
+            f"in {len(batches)} batches"
+        )
+        uploads = [asyncio.create_task(upload(batch)) for batch in batches]
+        try:
+            await asyncio.gather(*uploads)
+            return await self.commit_task(odm_task_id)
+        except BaseException:
+            # Stop the other uploads before removing the task
+            for task in uploads:
+                task.cancel()
+            await asyncio.gather(*uploads, return_exceptions=True)
+            try:
+                await self.remove_task(odm_task_id)
+            except Exception as e:
+                log.warning(f"Failed to remove NodeODM task {odm_task_id}: {e}")
+            raise
@@ -0,0 +1,179 @@
+"""Registry of NodeODM nodes, and queue-aware scheduling of tasks on them.
+
+Each ODM task created by DTM is recorded with the node that owns it, so its
+results are downloaded from, and its cleanup sent to, the right node.
+"""
+
+import asyncio
+import uuid
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from loguru import logger as log
+from psycopg import Connection
+from psycopg.rows import dict_row
+
+from app.config import settings
+from app.projects.nodeodm import NodeODMClient, NodeODMError
+
+
+@dataclass
+class ODMNode:
+    url: str
+    # Relative capacity, a node of weight 2 takes twice the queue of weight 1
+    weight: float = 1
+
+
+def get_nodes() -> List[ODMNode]:
+    """Get the configured nodes, NODE_ODM_URL first then NODE_ODM_URLS."""
+    nodes = {}
+    entries = (settings.NODE_ODM_URLS or "").split(",")
+    for entry in [settings.NODE_ODM_URL or "", *entries]:
+        url, _, weight = entry.strip().partition("|")
+        if not url or url in nodes:
+            continue
+        try:
+            nodes[url] = ODMNode(url, float(weight) if weight else 1)
+        except ValueError:
+            log.warning(f"Invalid NodeODM weight '{weight}' for {url}, using 1")
+            nodes[url] = ODMNode(url)
+    return list(nodes.values())
+
+
+async def get_node_info(node: ODMNode) -> Optional[Dict[str, Any]]:
+    """Get the /info of a node, or None if it is unreachable or unhealthy."""
+    timeout = aiohttp.ClientTimeout(total=settings.NODE_ODM_HEALTH_TIMEOUT)
+    try:
+        async with NodeODMClient(node.url, timeout=timeout) as client:
+            return await client.info()
+    except (aiohttp.ClientError, asyncio.TimeoutError, NodeODMError) as e:
+        log.warning(f"NodeODM node {node.url} failed its health check: {e}")
+        return None
+
+
+def node_load(node: ODMNode, info: Dict[str, Any]) -> float:
+    """Queued tasks per unit of capacity, lower is better."""
+    parallel_tasks = info.get("maxParallelTasks") or 1
+    return info.get("taskQueueCount", 0) / (parallel_tasks * node.weight)
+
+
+async def rank_nodes(image_count: int = 0) -> List[str]:
+    """Order the nodes to try for a new task, least loaded first.
+
+    Nodes failing their health check are kept last, as a failover when no
+    healthy node accepts the task. Nodes whose maxImages is below the image
+    count are left out, and NodeODMError is raised if that leaves none.
+
+    Args:
+        image_count (int): The number of files to process.
+
+    Returns:
+        List[str]: The node URLs, in the order they should be tried.
+    """
+    nodes = get_nodes()
+    if not nodes:
+        raise NodeODMError("No NodeODM node configured")
+    if len(nodes) == 1:
+        return [nodes[0].url]
+
+    infos = await asyncio.gather(*(get_node_info(node) for node in nodes))
+    healthy, unhealthy = [], []
+    for node, info in zip(nodes, infos):
+        if info is None:
+            unhealthy.append(node)
+        elif info.get("maxImages") and image_count > info["maxImages"]:
+            log.info(
+                f"Skipping NodeODM node {node.url}, it accepts at most "
+                f"{info['maxImages']} images"
+            )
+        else:
+            healthy.append((node_load(node, info), -node.weight, node))
+
+    ranked = [node.url for *_, node in sorted(healthy, key=lambda n: n[:2])]
+    ranked += [node.url for node in unhealthy]
+    if not ranked:
+        raise NodeODMError(f"No NodeODM node accepts {image_count} images")
+    return ranked
+
+
+async def record_odm_task(
+    db: Connection,
+    odm_task_id: str,
+    node_url: str,
+    project_id: uuid.UUID,
+    task_id: Optional[uuid.UUID] = None,
+    submodel: Optional[Dict[str, Any]] = None,
+):
+    """Record the node owning an ODM task.
+
+    Args:
+        submodel (dict, optional): The submodel, submodel_count and task_ids
+            of a split-merge submodel, recorded with the task so a webhook
+            never sees it as processing the whole project.
+    """
+    submodel = submodel or {}
+    async with db.cursor() as cur:
+        await cur.execute(
+            """
+            INSERT INTO odm_tasks
+                (id, node_url, project_id, task_id, submodel, submodel_count, task_ids)
+            VALUES (
+                %(id)s, %(node_url)s, %(project_id)s, %(task_id)s,
+                %(submodel)s, %(submodel_count)s, %(task_ids)s::uuid[]
+            )
+            ON CONFLICT (id) DO UPDATE SET node_url = EXCLUDED.node_url
+            """,
+            {
+                "id": odm_task_id,
+                "node_url": node_url,
+                "project_id": project_id,
+                "task_id": task_id,
+                "submodel": submodel.get("submodel"),
+                "submodel_count": submodel.get("submodel_count"),
+                "task_ids": submodel.get("task_ids"),
+            },
+        )
+    await db.commit()
+
+
+async def get_odm_task(db: Connection, odm_task_id: str) -> Optional[dict]:
+    """Get the record of an ODM task, if it was created by DTM."""
+    async with db.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
+            """
+            SELECT id, node_url, project_id, task_id, submodel, submodel_count,
+                task_ids, status
+            FROM odm_tasks
+            WHERE id = %(id)s
+            """,
+            {"id": odm_task_id},
+        )
+        return await cur.fetchone()
+
+
+async def get_project_odm_tasks(
+    db: Connection, project_id: uuid.UUID, task_id: Optional[uuid.UUID] = None
+) -> List[dict]:
+    """Get the ODM tasks of a project, or of one of its tasks, newest first."""
+    async with db.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
+            """
+            SELECT id, node_url, task_id, submodel, created_at
+            FROM odm_tasks
+            WHERE project_id = %(project_id)s
+                AND (%(task_id)s::uuid IS NULL OR task_id = %(task_id)s)
+            ORDER BY created_at DESC
+            """,
+            {"project_id": project_id, "task_id": task_id},
+        )
+        return await cur.fetchall()
+
+
+async def get_odm_task_node(db: Connection, odm_task_id: str) -> str:
+    """Get the URL of the node owning an ODM task.
+
+    Tasks created before nodes were recorded fall back to NODE_ODM_URL.
+    """
+    odm_task = await get_odm_task(db, odm_task_id)
+    return odm_task["node_url"] if odm_task else settings.NODE_ODM_URL
@@ -0,0 +1,234 @@
+"""Poll NodeODM for the status and progress of ODM tasks, from one loop.
+
+Watched tasks are kept in Redis, in a sorted set scored by the time of their
+next poll. Each ARQ worker runs the loop, claiming due tasks with a lease, so
+a task is polled by one worker at a time, and by another if that one dies.
+Tasks are polled less often, with exponential backoff, while their progress
+stalls or their node fails to answer.
+
+Progress is published to Redis, for the processing progress endpoint. Tasks
+created without a webhook are also finished by the poller, see
+image_processing.handle_odm_task_status.
+"""
+
+import asyncio
+import json
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from itertools import groupby
+from typing import Any, Dict, List, Optional
+
+import aiohttp
+from arq import ArqRedis
+from loguru import logger as log
+from pyodm.types import TaskStatus
+
+from app.config import settings
+from app.projects import image_processing
+from app.projects.nodeodm import NodeODMClient, NodeODMError
+from app.utils import timestamp
+
+WATCHED_KEY = "odm:watched"
+WATCH_KEY = "odm:watch:{}"
+PROGRESS_KEY = "odm:progress:{}"
+# Seconds a claimed task is leased to a worker, before others may poll it
+CLAIM_LEASE = 300
+CLAIM_BATCH_SIZE = 100
+LOOP_INTERVAL = 1
+PROGRESS_TTL = 7 * 24 * 3600
+# Consecutive failed polls before a task is no longer watched
+MAX_POLL_ERRORS = 10
+ENDED_STATUSES = {TaskStatus.FAILED, TaskStatus.COMPLETED, TaskStatus.CANCELED}
+
+# Atomically take the due tasks, pushing their next poll to the lease expiry
+CLAIM_SCRIPT = """
+local due = redis.call("ZRANGEBYSCORE", KEYS[1], "-inf", ARGV[1], "LIMIT", 0, ARGV[3])
+for _, odm_task_id in ipairs(due) do
+    redis.call("ZADD", KEYS[1], ARGV[2], odm_task_id)
+end
+return due
+"""
+
+
+@dataclass
+class WatchedTask:
+    odm_task_id: str
+    node_url: str
+    dtm_project_id: str
+    dtm_user_id: str
+    dtm_task_id: Optional[str] = None
+    # Handle the task once it ends, as no webhook will
+    finish: bool = False
+    interval: float = settings.ODM_POLL_MIN_INTERVAL
+    progress: float = -1
+    errors: int = 0
+
+
+async def watch(
+    redis: ArqRedis,
+    odm_task_id: str,
+    node_url: str,
+    dtm_project_id: uuid.UUID,
+    dtm_user_id: str,
+    dtm_task_id: Optional[uuid.UUID] = None,
+    finish: bool = False,
+):
+    """Start polling an ODM task.
+
+    Args:
+        finish (bool): Handle the task once it ends, for tasks created
+            without a webhook.
+    """
+    task = WatchedTask(
+        odm_task_id,
+        node_url,
+        str(dtm_project_id),
+        dtm_user_id,
+        str(dtm_task_id) if dtm_task_id else None,
+        finish,
+    )
+    await save(redis, task)
+
+
+async def save(redis: ArqRedis, task: WatchedTask):
+    """Store a watched task, and schedule its next poll."""
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.set(WATCH_KEY.format(task.odm_task_id), json.dumps(asdict(task)))
+        pipe.zadd(WATCHED_KEY, {task.odm_task_id: time.time() + task.interval})
+        await pipe.execute()
+
+
+async def unwatch(redis: ArqRedis, odm_task_id: str):
+    """Stop polling an ODM task."""
+    async with redis.pipeline(transaction=True) as pipe:
+        pipe.zrem(WATCHED_KEY, odm_task_id)
+        pipe.delete(WATCH_KEY.format(odm_task_id))
+        await pipe.execute()
+
+
+async def get_progress(
+    redis: ArqRedis, odm_task_ids: List[str]
+) -> List[Optional[Dict[str, Any]]]:
+    """Get the last published progress of ODM tasks, None if never polled."""
+    if not odm_task_ids:
+        return []
+    values = await redis.mget([PROGRESS_KEY.format(id) for id in odm_task_ids])
+    return [json.loads(value) if value else None for value in values]
+
+
+async def finish(ctx: Dict[Any, Any], task: WatchedTask, status: TaskStatus):
+    """Stop polling an ended task, handling its status if it has no webhook."""
+    redis = ctx["redis"]
+    if task.finish:
+        async with ctx["db_pool"].connection() as db:
+            await image_processing.handle_odm_task_status(
+                db,
+                redis,
+                task.odm_task_id,
+                status.value,
+                uuid.UUID(task.dtm_project_id),
+                task.dtm_user_id,
+                uuid.UUID(task.dtm_task_id) if task.dtm_task_id else None,
+            )
+    await unwatch(redis, task.odm_task_id)
+
+
+async def poll_task(ctx: Dict[Any, Any], node: NodeODMClient, task: WatchedTask):
+    """Poll an ODM task once, publish its progress and schedule the next poll."""
+    redis = ctx["redis"]
+    try:
+        info = await node.task_info(task.odm_task_id)
+    except (NodeODMError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+        task.errors += 1
+        if task.errors >= MAX_POLL_ERRORS:
+            log.error(f"Giving up polling ODM task {task.odm_task_id}: {e}")
+            # A task without webhook is failed, as nothing else would end it
+            await finish(ctx, task, TaskStatus.FAILED)
+            return
+        log.warning(f"Failed to poll ODM task {task.odm_task_id}: {e}")
+        task.interval = min(2 * task.interval, settings.ODM_POLL_MAX_INTERVAL)
+        await save(redis, task)
+        return
+
+    status = TaskStatus(info["status"]["code"])
+    progress = info.get("progress", 0)
+    await redis.set(
+        PROGRESS_KEY.format(task.odm_task_id),
+        json.dumps(
+            {
+                "status": status.name,
+                "progress": progress,
+                "processing_time": info.get("processingTime"),
+                "updated_at": timestamp().isoformat(),
+            }
+        ),
+        ex=PROGRESS_TTL,
+    )
+
+    if status in ENDED_STATUSES:
+        log.info(f"ODM task {task.odm_task_id} ended with status {status.name}")
+        await finish(ctx, task, status)
+        return
+
+    if progress > task.progress:
+        task.interval = settings.ODM_POLL_MIN_INTERVAL
+    else:
+        task.interval = min(2 * task.interval, settings.ODM_POLL_MAX_INTERVAL)
+    task.progress = progress
+    task.errors = 0
+    await save(redis, task)
+
+
+async def poll_tasks(ctx: Dict[Any, Any], tasks: List[WatchedTask]):
+    """Poll tasks concurrently, with one connection pool per node."""
+    timeout = aiohttp.ClientTimeout(total=settings.NODE_ODM_HEALTH_TIMEOUT)
+
+    async def poll_node(node_url: str, node_tasks: List[WatchedTask]):
+        async with NodeODMClient(node_url, timeout=timeout) as node:
+            results = await asyncio.gather(
+                *(poll_task(ctx, node, task) for task in node_tasks),
+                return_exceptions=True,
+            )
+        # Tasks whose poll failed unexpectedly are polled again once their
+        # claim expires
+        for task, result in zip(node_tasks, results):
+            if isinstance(result, Exception):
+                log.error(f"Error polling ODM task {task.odm_task_id}: {result}")
+
+    tasks = sorted(tasks, key=lambda task: task.node_url)
+    await asyncio.gather(
+        *(
+            poll_node(node_url, list(node_tasks))
+            for node_url, node_tasks in groupby(tasks, key=lambda task: task.node_url)
+        )
+    )
+
+
+async def run(ctx: Dict[Any, Any]):
+    """Poll the due watched tasks, until cancelled. Started by the worker."""
+    redis = ctx["redis"]
+    claim = redis.register_script(CLAIM_SCRIPT)
+    while True:
+        try:
+            now = time.time()
+            odm_task_ids = [
+                odm_task_id.decode()
+                for odm_task_id in await claim(
+                    keys=[WATCHED_KEY], args=[now, now + CLAIM_LEASE, CLAIM_BATCH_SIZE]
+                )
+            ]
+            if odm_task_ids:
+                values = await redis.mget([WATCH_KEY.format(id) for id in odm_task_ids])
+                tasks = []
+                for odm_task_id, value in zip(odm_task_ids, values):
+                    if value:
+                        tasks.append(WatchedTask(**json.loads(value)))
+                    else:
+                        await redis.zrem(WATCHED_KEY, odm_task_id)
+                await poll_tasks(ctx, tasks)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log.error(f"Error polling ODM tasks: {e}")
+        await asyncio.sleep(LOOP_INTERVAL)
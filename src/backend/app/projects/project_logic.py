@@ -1,9 +1,9 @@
+import asyncio
 import json
 import os
 import shutil
 import uuid
-from io import BytesIO
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 import geojson
 import pyproj
@@ -28,22 +28,50 @@ from drone_flightplan import (
 from drone_flightplan.enums import FlightMode
 
 from app.config import settings
-from app.models.enums import ImageProcessingStatus, OAMUploadStatus
-from app.projects import project_schemas
-from app.projects.image_processing import DroneImageProcessor
-from app.s3 import (
-    add_obj_to_bucket,
-    get_file_from_bucket,
-    get_object_metadata,
-    get_presigned_url,
-    list_objects_from_bucket,
-)
+from app.models.enums import HTTPStatus, ImageProcessingStatus, OAMUploadStatus
+from app.projects import image_processing, mosaic, project_schemas
+from app.s3 import async_s3_client, gdal_s3_config, gdal_vsis3_path
 from app.tasks.task_splitter import split_by_square
 from app.utils import (
+    LRUCache,
     calculate_flight_time_from_placemarks,
     merge_multipolygon,
 )
 
+# Half the width of the EPSG:3857 world, in metres
+WEB_MERCATOR_MAX_EXTENT = 20037508.342789244
+# Number of clustering grid cells along one edge of a tile
+CENTROID_TILE_GRID_CELLS = 16
+
+centroid_tile_cache = LRUCache(maxsize=settings.CENTROID_TILE_CACHE_SIZE)
+orthophoto_tile_cache = LRUCache(maxsize=settings.ORTHOPHOTO_TILE_CACHE_SIZE)
+# The orthophoto ETag each project's tiles were last read with
+orthophoto_etags: Dict[uuid.UUID, str] = {}
+
+
+def get_orthophoto_s3_path(project_id: uuid.UUID) -> str:
+    """Get the S3 path of the orthophoto of a project."""
+    return f"dtm-data/projects/{project_id}/orthophoto/odm_orthophoto.tif"
+
+
+async def get_project_version(db: Connection, project_id: uuid.UUID):
+    """Get the version counter of a project.
+
+    The version is bumped by database triggers whenever the project, its
+    tasks or its task events change, so it can validate cached reads.
+    Returns None if the project does not exist.
+    """
+    async with db.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
+            """
+            SELECT version
+            FROM projects
+            WHERE id = %(project_id)s;
+            """,
+            {"project_id": project_id},
+        )
+        return await cur.fetchone()
+
 
 async def get_centroids(db: Connection):
     try:
@@ -80,6 +108,111 @@ async def get_centroids(db: Connection):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def get_centroid_tile(db: Connection, z: int, x: int, y: int) -> bytes:
+    """Get a Mapbox vector tile of clustered project centroids.
+
+    Centroids are snapped to a grid aligned with the tile, so that every
+    tile at a given zoom groups projects into the same clusters. Above
+    CENTROID_TILE_MAX_CLUSTER_ZOOM each project is returned individually.
+
+    Tiles only depend on the set of projects, so they are cached against a
+    fingerprint of the projects table (count and latest creation time),
+    which changes whenever a project is created or deleted.
+    """
+    async with db.cursor() as cur:
+        await cur.execute("SELECT COUNT(*), MAX(created_at) FROM projects;")
+        fingerprint = await cur.fetchone()
+
+    cache_key = (*fingerprint, z, x, y)
+    tile = centroid_tile_cache.get(cache_key)
+    if tile is not None:
+        return tile
+
+    if z > settings.CENTROID_TILE_MAX_CLUSTER_ZOOM:
+        cell_size = 0
+    else:
+        tile_width = 2 * WEB_MERCATOR_MAX_EXTENT / (2**z)
+        cell_size = tile_width / CENTROID_TILE_GRID_CELLS
+
+    async with db.cursor() as cur:
+        await cur.execute(
+            """
+            WITH bounds AS (
+                SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom
+            ),
+            points AS (
+                SELECT
+                    p.id,
+                    p.slug,
+                    p.name,
+                    ST_Transform(p.centroid, 3857) AS geom
+                FROM projects p, bounds b
+                WHERE p.centroid && ST_Transform(b.geom, 4326)
+            ),
+            clusters AS (
+                SELECT
+                    COUNT(*) AS point_count,
+                    ST_Centroid(ST_Collect(geom)) AS geom,
+                    (ARRAY_AGG(id::text))[1] AS id,
+                    (ARRAY_AGG(slug))[1] AS slug,
+                    (ARRAY_AGG(name))[1] AS name
+                FROM points
+                GROUP BY ST_SnapToGrid(geom, %(cell_size)s)
+            )
+            SELECT ST_AsMVT(tile, 'projects', 4096, 'geom')
+            FROM (
+                SELECT
+                    ST_AsMVTGeom(c.geom, b.geom, 4096, 64, true) AS geom,
+                    c.point_count,
+                    c.point_count > 1 AS cluster,
+                    CASE WHEN c.point_count = 1 THEN c.id END AS id,
+                    CASE WHEN c.point_count = 1 THEN c.slug END AS slug,
+                    CASE WHEN c.point_count = 1 THEN c.name END AS name
+                FROM clusters c, bounds b
+            ) AS tile;
+            """,
+            {"z": z, "x": x, "y": y, "cell_size": cell_size},
+        )
+        row = await cur.fetchone()
+
+    tile = bytes(row[0]) if row and row[0] else b""
+    centroid_tile_cache.set(cache_key, tile)
+    return tile
+
+
+async def get_orthophoto_tile(
+    project_id: uuid.UUID, etag: str, z: int, x: int, y: int
+) -> bytes:
+    """Get a PNG web map tile of the orthophoto of a project.
+
+    The tile is read from the orthophoto COG in S3 with range requests, so
+    the orthophoto is never downloaded as a whole. Tiles are cached against
+    the S3 ETag of the orthophoto, which changes when it is reprocessed, and
+    GDAL's cache of the old orthophoto is cleared when it does.
+    """
+    cache_key = (project_id, etag, z, x, y)
+    tile = orthophoto_tile_cache.get(cache_key)
+    if tile is not None:
+        return tile
+
+    tile_width = 2 * WEB_MERCATOR_MAX_EXTENT / (2**z)
+    min_x = -WEB_MERCATOR_MAX_EXTENT + x * tile_width
+    max_y = WEB_MERCATOR_MAX_EXTENT - y * tile_width
+    bounds = (min_x, max_y - tile_width, min_x + tile_width, max_y)
+
+    clear_cache = orthophoto_etags.get(project_id, etag) != etag
+    orthophoto_etags[project_id] = etag
+    tile = await asyncio.to_thread(
+        mosaic.render_tile,
+        gdal_vsis3_path(settings.S3_BUCKET_NAME, get_orthophoto_s3_path(project_id)),
+        bounds,
+        gdal_s3_config(),
+        clear_cache,
+    )
+    orthophoto_tile_cache.set(cache_key, tile)
+    return tile
+
+
 async def upload_file_to_s3(
     project_id: uuid.UUID, file: UploadFile, file_name: str
 ) -> str:
@@ -97,16 +230,14 @@ async def upload_file_to_s3(
     # Define the S3 file path
     file_path = f"dtm-data/projects/{project_id}/{file_name}"
 
-    # Read the file bytes
-    file_bytes = await file.read()
-    file_obj = BytesIO(file_bytes)
-
-    # Upload the file to the S3 bucket
-    add_obj_to_bucket(
+    # Stream the file to the S3 bucket, without reading it into memory
+    await file.seek(0)
+    await async_s3_client().put_stream(
         settings.S3_BUCKET_NAME,
-        file_obj,
         file_path,
-        file.content_type,
+        file.file,
+        file.size,
+        content_type=file.content_type or "application/octet-stream",
     )
 
     # Construct the S3 URL for the file
@@ -115,6 +246,196 @@ async def upload_file_to_s3(
     return file_url
 
 
+async def delete_task_images(project_id: uuid.UUID, task_id: uuid.UUID):
+    """Delete all uploaded images of a task from S3, in one bulk request.
+
+    Raises:
+        HTTPException: If any of the images could not be deleted.
+    """
+    s3 = async_s3_client()
+    image_dir = f"dtm-data/projects/{project_id}/{task_id}/images/"
+    objects = await s3.list(settings.S3_BUCKET_NAME, image_dir)
+    errors = await s3.delete_many(
+        settings.S3_BUCKET_NAME, (obj.object_name for obj in objects)
+    )
+    if errors:
+        log.error(f"Errors occurred when deleting images in {image_dir}: {errors}")
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail=f"Failed to delete existing image: {errors[0]}",
+        )
+
+
+def _multipart_upload_error(e: S3Error) -> HTTPException:
+    """Translate an S3 error from a multipart upload call."""
+    if e.code == "NoSuchUpload":
+        return HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail="Upload not found, it may have been completed or aborted",
+        )
+    return HTTPException(
+        status_code=HTTPStatus.BAD_REQUEST, detail=f"Multipart upload failed. {e}"
+    )
+
+
+async def get_multipart_upload(db: Connection, s3_key: str) -> Optional[dict]:
+    """Get the unfinished multipart upload of an object, and the file it sends."""
+    async with db.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
+            """
+            SELECT id AS upload_id, size, fingerprint
+            FROM multipart_uploads
+            WHERE s3_key = %(s3_key)s
+            """,
+            {"s3_key": s3_key},
+        )
+        return await cur.fetchone()
+
+
+async def delete_multipart_upload(db: Connection, upload_id: str):
+    """Forget a multipart upload, once completed or aborted."""
+    await db.execute(
+        "DELETE FROM multipart_uploads WHERE id = %(id)s", {"id": upload_id}
+    )
+    await db.commit()
+
+
+async def start_multipart_upload(
+    db: Connection, project_id: uuid.UUID, data: project_schemas.MultipartStartIn
+) -> dict:
+    """Start a multipart upload, or resume the unfinished one for the same file.
+
+    S3 keeps track of the parts already received, so a resumed upload
+    returns them and the client only sends the parts that are missing. An
+    upload is only resumed with the same size and fingerprint, and the
+    unfinished upload of another file with the same name is aborted.
+    """
+    s3 = async_s3_client()
+    key = data.object_key(project_id)
+    upload = await get_multipart_upload(db, key)
+    same_file = (
+        upload is not None
+        and upload["size"] == data.size
+        and upload["fingerprint"] == data.fingerprint
+    )
+    try:
+        if same_file:
+            try:
+                parts = await s3.list_parts(
+                    settings.S3_BUCKET_NAME, key, upload["upload_id"]
+                )
+                return multipart_upload_out(upload["upload_id"], key, parts)
+            except S3Error as e:
+                # Aborted or expired in S3, e.g. by a lifecycle rule
+                if e.code != "NoSuchUpload":
+                    raise
+        elif upload:
+            log.info(f"Aborting the upload of another file to {key}")
+            try:
+                await s3.abort_multipart_upload(
+                    settings.S3_BUCKET_NAME, key, upload["upload_id"]
+                )
+            except S3Error as e:
+                if e.code != "NoSuchUpload":
+                    raise
+
+        upload_id = await s3.create_multipart_upload(
+            settings.S3_BUCKET_NAME, key, data.content_type
+        )
+    except S3Error as e:
+        raise _multipart_upload_error(e) from e
+
+    await db.execute(
+        """
+        INSERT INTO multipart_uploads (id, project_id, s3_key, size, fingerprint)
+        VALUES (%(id)s, %(project_id)s, %(s3_key)s, %(size)s, %(fingerprint)s)
+        ON CONFLICT (s3_key) DO UPDATE
+        SET id = EXCLUDED.id,
+            size = EXCLUDED.size,
+            fingerprint = EXCLUDED.fingerprint,
+            created_at = now()
+        """,
+        {
+            "id": upload_id,
+            "project_id": project_id,
+            "s3_key": key,
+            "size": data.size,
+            "fingerprint": data.fingerprint,
+        },
+    )
+    await db.commit()
+    return multipart_upload_out(upload_id, key, [])
+
+
+def multipart_upload_out(upload_id: str, key: str, parts: list) -> dict:
+    """Describe a started multipart upload, with the parts S3 has received."""
+    return {
+        "upload_id": upload_id,
+        "key": key,
+        "part_size": settings.S3_MULTIPART_PART_SIZE,
+        "parts": [
+            {"part_number": part.part_number, "etag": part.etag, "size": part.size}
+            for part in parts
+        ],
+    }
+
+
+async def complete_multipart_upload(
+    db: Connection, project_id: uuid.UUID, data: project_schemas.MultipartCompleteIn
+) -> dict:
+    """Assemble a multipart upload from the parts S3 has received.
+
+    The part list comes from S3 rather than the client, so a client that
+    lost track of its ETags after an interruption can still complete. It
+    must be exactly parts 1 to `part_count` adding up to `total_size`, so
+    a file missing a part is never assembled.
+
+    Returns:
+        dict: The S3 key, ETag and size of the completed file.
+    """
+    s3 = async_s3_client()
+    key = data.object_key(project_id)
+    try:
+        parts = await s3.list_parts(settings.S3_BUCKET_NAME, key, data.upload_id)
+        part_numbers = sorted(part.part_number for part in parts)
+        if part_numbers != list(range(1, data.part_count + 1)):
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail=f"Expected parts 1 to {data.part_count}, "
+                f"S3 has {len(parts)} parts",
+            )
+        size = sum(part.size or 0 for part in parts)
+        if size != data.total_size:
+            raise HTTPException(
+                status_code=HTTPStatus.BAD_REQUEST,
+                detail=f"Expected {data.total_size} bytes, the parts have {size}",
+            )
+        result = await s3.complete_multipart_upload(
+            settings.S3_BUCKET_NAME, key, data.upload_id, parts
+        )
+    except S3Error as e:
+        raise _multipart_upload_error(e) from e
+    await delete_multipart_upload(db, data.upload_id)
+    return {
+        "key": key,
+        "etag": result.etag,
+        "size": size,
+    }
+
+
+async def abort_multipart_upload(
+    db: Connection, project_id: uuid.UUID, data: project_schemas.MultipartUploadIn
+):
+    """Abort a multipart upload, freeing the storage of its parts."""
+    try:
+        await async_s3_client().abort_multipart_upload(
+            settings.S3_BUCKET_NAME, data.object_key(project_id), data.upload_id
+        )
+    except S3Error as e:
+        raise _multipart_upload_error(e) from e
+    await delete_multipart_upload(db, data.upload_id)
+
+
 async def update_project_oam_status(
     db: Connection, project_id: uuid.UUID, status: OAMUploadStatus
 ):
@@ -208,7 +529,7 @@ async def process_task_metrics(db, tasks_data, project):
             dem_path = f"/tmp/{uuid.uuid4()}/dem.tif"
             points = create_waypoint(**waypoint_params)
             try:
-                get_file_from_bucket(
+                await async_s3_client().fget(
                     settings.S3_BUCKET_NAME,
                     f"dtm-data/projects/{project.id}/dem.tif",
                     dem_path,
@@ -473,13 +794,13 @@ async def process_drone_images(
         pool = ctx["db_pool"]
         async with pool.connection() as conn:
             # Initialize the processor with the database connection
-            processor = DroneImageProcessor(
-                node_odm_url=settings.NODE_ODM_URL,
+            processor = image_processing.DroneImageProcessor(
                 project_id=project_id,
                 task_id=task_id,
                 user_id=user_id,
                 db=conn,
                 task_ids=None,
+                redis=ctx.get("redis"),
             )
 
             # Define processing options
@@ -539,13 +860,13 @@ async def process_all_drone_images(
         pool = ctx["db_pool"]
         async with pool.connection() as conn:
             # Initialize the processor
-            processor = DroneImageProcessor(
-                node_odm_url=settings.NODE_ODM_URL,
+            processor = image_processing.DroneImageProcessor(
                 project_id=project_id,
                 task_id=None,
                 user_id=user_id,
                 task_ids=tasks,
                 db=conn,
+                redis=ctx.get("redis"),
             )
 
             # Define processing options
@@ -572,29 +893,82 @@ async def process_all_drone_images(
         raise
 
 
-def get_project_info_from_s3(project_id: uuid.UUID, task_id: uuid.UUID):
-    """Helper function to get the number of images and the URL to download the assets."""
-    try:
-        # Prefix for the images
-        images_prefix = f"dtm-data/projects/{project_id}/{task_id}/images/"
+async def build_project_orthomosaic(ctx: Dict[Any, Any], project_id: uuid.UUID):
+    """Build the project orthophoto from the orthophotos of processed tasks.
 
-        # List and count the images
-        objects = list_objects_from_bucket(
-            settings.S3_BUCKET_NAME, prefix=images_prefix
-        )
-        image_extensions = (".jpg", ".jpeg", ".png", ".tif", ".tiff")
-        image_count = sum(
-            1 for obj in objects if obj.object_name.lower().endswith(image_extensions)
+    Each task orthophoto is clipped to its task outline, so a project
+    orthophoto takes minutes instead of reprocessing every image.
+    """
+    job_id = ctx.get("job_id", "unknown")
+    log.info(f"Starting build_project_orthomosaic (Job ID: {job_id})")
+    s3 = async_s3_client()
+
+    pool = ctx["db_pool"]
+    async with pool.connection() as conn:
+        await update_processing_status(
+            conn, project_id, ImageProcessingStatus.PROCESSING
         )
+        try:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    """
+                    SELECT id, ST_AsGeoJSON(outline)
+                    FROM tasks
+                    WHERE project_id = %(project_id)s AND assets_url IS NOT NULL
+                    ORDER BY project_task_index
+                    """,
+                    {"project_id": project_id},
+                )
+                tasks = await cur.fetchall()
 
+            orthophotos = [
+                (
+                    f"dtm-data/projects/{project_id}/{task_id}/orthophoto/"
+                    "odm_orthophoto.tif",
+                    outline,
+                )
+                for task_id, outline in tasks
+            ]
+            found = await asyncio.gather(
+                *(s3.exists(settings.S3_BUCKET_NAME, path) for path, _ in orthophotos)
+            )
+            orthophotos = [item for item, exists in zip(orthophotos, found) if exists]
+            if not orthophotos:
+                raise ValueError("No processed task orthophotos to mosaic")
+
+            await mosaic.build_mosaic_from_s3(
+                orthophotos, get_orthophoto_s3_path(project_id)
+            )
+        except Exception as e:
+            log.error(f"Error in build_project_orthomosaic (Job ID: {job_id}): {e}")
+            await update_processing_status(
+                conn, project_id, ImageProcessingStatus.FAILED
+            )
+            raise
+
+        await update_processing_status(conn, project_id, ImageProcessingStatus.SUCCESS)
+
+    log.info(f"Built orthomosaic of {len(orthophotos)} tasks of project {project_id}")
+    return {"project_id": str(project_id), "tasks": len(orthophotos)}
+
+
+async def get_project_info_from_s3(
+    project_id: uuid.UUID, task_id: uuid.UUID, image_count: int
+):
+    """Helper function to get the URL to download the assets of a task.
+
+    The image count comes from the image manifest, see image_logic.
+    """
+    s3 = async_s3_client()
+    try:
         # Generate a presigned URL for the assets ZIP file
         try:
             # Check if the object exists
             assets_path = f"dtm-data/projects/{project_id}/{task_id}/assets.zip"
-            get_object_metadata(settings.S3_BUCKET_NAME, assets_path)
+            await s3.stat(settings.S3_BUCKET_NAME, assets_path)
 
             # If it exists, generate the presigned URL
-            presigned_url = get_presigned_url(
+            presigned_url = await s3.presign(
                 settings.S3_BUCKET_NAME, assets_path, expires=2
             )
         except S3Error as e:
@@ -758,10 +1132,10 @@ async def process_waypoints_and_waylines(
 
         try:
             os.makedirs(temp_dir, exist_ok=True)
-            # Read DEM content into memory and write to the file
-            file_content = await dem.read()
+            # Copy the DEM to disk in chunks, without reading it into memory
+            await dem.seek(0)
             with open(dem_path, "wb") as file:
-                file.write(file_content)
+                await run_in_threadpool(shutil.copyfileobj, dem.file, file)
 
             # Process waypoints with terrain-follow elevation
             waypoint_params["mode"] = FlightMode.WAYPOINTS
@@ -1,11 +1,13 @@
+import asyncio
 import json
 import os
 import uuid
-from datetime import timedelta
+from datetime import datetime, timezone
 from typing import Annotated, Dict, List, Optional
 from uuid import UUID
 
 import geojson
+import orjson
 from arq import ArqRedis
 from fastapi import (
     APIRouter,
@@ -21,9 +23,10 @@ from fastapi import (
     Response,
     UploadFile,
 )
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from geojson_pydantic import FeatureCollection
 from loguru import logger as log
-from minio.deleteobjects import DeleteObject
+from minio import S3Error
 from psycopg import Connection
 from shapely.geometry import mapping, shape
 from shapely.ops import unary_union
@@ -31,11 +34,25 @@ from shapely.ops import unary_union
 from app.arq.tasks import get_redis_pool
 from app.config import settings
 from app.db import database
+from app.images import image_logic
 from app.jaxa.upload_dem import upload_dem_file
-from app.models.enums import HTTPStatus, OAMUploadStatus, ProjectCompletionStatus, State
-from app.projects import image_processing, project_deps, project_logic, project_schemas
+from app.models.enums import (
+    HTTPStatus,
+    MultipartUploadTarget,
+    OAMUploadStatus,
+    ProjectCompletionStatus,
+    ProjectProcessingMode,
+)
+from app.projects import (
+    image_processing,
+    odm_nodes,
+    odm_poller,
+    project_deps,
+    project_logic,
+    project_schemas,
+)
 from app.projects.oam import upload_to_oam
-from app.s3 import add_file_to_bucket, s3_client
+from app.s3 import BatchPresigner, async_s3_client
 from app.tasks import task_logic, task_schemas
 from app.users.permissions import (
     IsProjectCreator,
@@ -45,11 +62,18 @@ from app.users.permissions import (
 from app.users.user_deps import login_required
 from app.users.user_schemas import AuthUser
 from app.utils import (
+    check_not_modified,
     geojson_to_kml,
+    make_etag,
     send_project_approval_email_to_regulator,
     timestamp,
 )
 
+# Interval of keep-alive comments on idle event streams
+SSE_HEARTBEAT_SECONDS = 15
+# Presigned URLs signed per chunk of a streamed batch response
+PRESIGN_STREAM_CHUNK = 500
+
 router = APIRouter(
     prefix="/projects",
     responses={404: {"description": "Not found"}},
@@ -68,6 +92,32 @@ async def read_project_centroids(
     )
 
 
+@router.get("/centroids/tiles/{z}/{x}/{y}.pbf", tags=["Projects"])
+async def read_project_centroid_tile(
+    db: Annotated[Connection, Depends(database.get_db)],
+    z: Annotated[int, Path(ge=0, le=22, description="Tile zoom level.")],
+    x: Annotated[int, Path(ge=0, description="Tile column.")],
+    y: Annotated[int, Path(ge=0, description="Tile row.")],
+):
+    """Get a vector tile of project centroids, clustered per zoom level.
+
+    Each feature has a `point_count` property. Single projects (not
+    clustered) additionally carry their `id`, `slug` and `name`.
+    """
+    if x >= 2**z or y >= 2**z:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail=f"Tile {z}/{x}/{y} is out of range.",
+        )
+
+    tile = await project_logic.get_centroid_tile(db, z, x, y)
+    return Response(
+        content=tile,
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={"Cache-Control": "public, max-age=60"},
+    )
+
+
 @router.get("/{project_id}/download-boundaries", tags=["Projects"])
 async def download_boundaries(
     project_id: Annotated[
@@ -173,6 +223,7 @@ async def delete_project_by_id(
     ],
 ):
     project_id = await project_schemas.DbProject.delete(db, project.id)
+    project_logic.centroid_tile_cache.clear()
     return {"message": f"Project successfully deleted {project_id}"}
 
 
@@ -187,6 +238,7 @@ async def create_project(
 ):
     """Create a project in the database."""
     project_id = await project_schemas.DbProject.create(db, project_info, user_data.id)
+    project_logic.centroid_tile_cache.clear()
 
     # Upload DEM and Image to S3
     dem_url = (
@@ -315,59 +367,29 @@ async def generate_presigned_url(
         list: A list of dictionaries with the image name and the pre-signed URL to upload.
     """
     try:
-        # Initialize the S3 client
-        client = s3_client()
-        urls = []
-
-        # Process each image in the request
-        for image in data.image_name:
-            image_path = (
-                f"dtm-data/projects/{data.project_id}/{data.task_id}/images/{image}"
-            )
-
-            # If replace_existing is True, delete the image first
-            if replace_existing:
-                image_dir = (
-                    f"dtm-data/projects/{data.project_id}/{data.task_id}/images/"
+        # If replace_existing is True, delete the existing images first
+        if replace_existing:
+            try:
+                await project_logic.delete_task_images(data.project_id, data.task_id)
+            except Exception as e:
+                raise HTTPException(
+                    status_code=HTTPStatus.BAD_REQUEST,
+                    detail=f"Failed to delete existing image. {e}",
                 )
-                try:
-                    # Prepare the list of objects to delete (recursively if necessary)
-                    delete_object_list = map(
-                        lambda x: DeleteObject(x.object_name),
-                        client.list_objects(
-                            settings.S3_BUCKET_NAME, image_dir, recursive=True
-                        ),
-                    )
-
-                    # Remove the objects (images)
-                    errors = client.remove_objects(
-                        settings.S3_BUCKET_NAME, delete_object_list
-                    )
-
-                    # Handle deletion errors, if any
-                    for error in errors:
-                        log.error("Error occurred when deleting object", error)
-                        raise HTTPException(
-                            status_code=HTTPStatus.BAD_REQUEST,
-                            detail=f"Failed to delete existing image: {error}",
-                        )
-
-                except Exception as e:
-                    raise HTTPException(
-                        status_code=HTTPStatus.BAD_REQUEST,
-                        detail=f"Failed to delete existing image. {e}",
-                    )
-
-            # Generate a new pre-signed URL for the image upload
-            url = client.get_presigned_url(
-                "PUT",
-                settings.S3_BUCKET_NAME,
-                image_path,
-                expires=timedelta(hours=data.expiry),
-            )
-            urls.append({"image_name": image, "url": url})
 
-        return urls
+        # Generate a new pre-signed URL for each image upload
+        presigner = await BatchPresigner.create(
+            settings.S3_BUCKET_NAME, "PUT", data.expiry
+        )
+        return [
+            {
+                "image_name": image,
+                "url": presigner.sign(
+                    f"dtm-data/projects/{data.project_id}/{data.task_id}/images/{image}"
+                ),
+            }
+            for image in data.image_name
+        ]
 
     except Exception as e:
         raise HTTPException(
@@ -376,6 +398,149 @@ async def generate_presigned_url(
         )
 
 
+@router.post("/generate-presigned-url/batch/", tags=["Image Upload"])
+async def generate_presigned_urls_batch(
+    user: Annotated[AuthUser, Depends(login_required)],
+    data: project_schemas.PresignedUrlRequest,
+    replace_existing: bool = False,
+):
+    """Generate pre-signed upload URLs for a large batch of images.
+
+    Same output as `/generate-presigned-url/`, but the URLs are signed
+    locally and streamed as a JSON array, so thousands of images can be
+    requested at once without building the whole response in memory.
+
+    Args:
+        image_name: The names of the images you want to upload.
+        expiry : Expiry time in hours.
+        replace_existing: Delete the task's existing images first.
+    """
+    if replace_existing:
+        await project_logic.delete_task_images(data.project_id, data.task_id)
+
+    presigner = await BatchPresigner.create(settings.S3_BUCKET_NAME, "PUT", data.expiry)
+    image_prefix = f"dtm-data/projects/{data.project_id}/{data.task_id}/images/"
+
+    async def stream_urls():
+        yield b"["
+        for start in range(0, len(data.image_name), PRESIGN_STREAM_CHUNK):
+            chunk = data.image_name[start : start + PRESIGN_STREAM_CHUNK]
+            body = b",".join(
+                orjson.dumps(
+                    {"image_name": image, "url": presigner.sign(image_prefix + image)}
+                )
+                for image in chunk
+            )
+            yield body if start == 0 else b"," + body
+            # Let other requests run between chunks
+            await asyncio.sleep(0)
+        yield b"]"
+
+    return StreamingResponse(stream_urls(), media_type="application/json")
+
+
+@router.post(
+    "/{project_id}/multipart/start",
+    tags=["Image Upload"],
+    response_model=project_schemas.MultipartUploadOut,
+)
+async def start_multipart_upload(
+    db: Annotated[Connection, Depends(database.get_db)],
+    user: Annotated[AuthUser, Depends(login_required)],
+    project: Annotated[
+        project_schemas.DbProject, Depends(project_deps.get_project_by_id)
+    ],
+    data: project_schemas.MultipartStartIn,
+):
+    """Start a browser-direct multipart upload of a task image or project DEM.
+
+    If an unfinished upload of the same file (name, size and fingerprint)
+    exists it is resumed: the response lists the parts S3 already has, so
+    only the missing parts need to be sent. Parts should be `part_size`
+    bytes, except the last.
+    """
+    return await project_logic.start_multipart_upload(db, project.id, data)
+
+
+@router.post("/{project_id}/multipart/sign-parts", tags=["Image Upload"])
+async def sign_multipart_upload_parts(
+    user: Annotated[AuthUser, Depends(login_required)],
+    project: Annotated[
+        project_schemas.DbProject, Depends(project_deps.get_project_by_id)
+    ],
+    data: project_schemas.MultipartSignPartsIn,
+):
+    """Generate pre-signed URLs to PUT parts of a multipart upload.
+
+    Parts can be uploaded in parallel and in any order.
+
+    Returns:
+        list: The part numbers with their pre-signed upload URLs.
+    """
+    presigner = await BatchPresigner.create(settings.S3_BUCKET_NAME, "PUT", data.expiry)
+    key = data.object_key(project.id)
+    return [
+        {
+            "part_number": part_number,
+            "url": presigner.sign(
+                key, {"partNumber": part_number, "uploadId": data.upload_id}
+            ),
+        }
+        for part_number in data.part_numbers
+    ]
+
+
+@router.post("/{project_id}/multipart/complete", tags=["Image Upload"])
+async def complete_multipart_upload(
+    db: Annotated[Connection, Depends(database.get_db)],
+    user: Annotated[AuthUser, Depends(login_required)],
+    project: Annotated[
+        project_schemas.DbProject, Depends(project_deps.get_project_by_id)
+    ],
+    data: project_schemas.MultipartCompleteIn,
+):
+    """Complete a multipart upload from the parts received by S3.
+
+    A completed image is added to the task's image manifest, and a
+    completed DEM upload becomes the project's DEM.
+    """
+    upload = await project_logic.complete_multipart_upload(db, project.id, data)
+    key = upload["key"]
+    if data.target == MultipartUploadTarget.DEM:
+        dem_url = f"{settings.S3_DOWNLOAD_ROOT}/{settings.S3_BUCKET_NAME}{key}"
+        await project_logic.update_url(db, project.id, dem_url)
+    else:
+        await image_logic.upsert_images(
+            db,
+            project.id,
+            data.task_id,
+            [
+                {
+                    "name": data.file_name,
+                    "s3_key": key,
+                    "size": upload["size"],
+                    "etag": upload["etag"],
+                    "uploaded_at": timestamp(),
+                }
+            ],
+        )
+    return {"message": "Upload completed", "key": key}
+
+
+@router.post("/{project_id}/multipart/abort", tags=["Image Upload"])
+async def abort_multipart_upload(
+    db: Annotated[Connection, Depends(database.get_db)],
+    user: Annotated[AuthUser, Depends(login_required)],
+    project: Annotated[
+        project_schemas.DbProject, Depends(project_deps.get_project_by_id)
+    ],
+    data: project_schemas.MultipartUploadIn,
+):
+    """Abort a multipart upload and discard the parts uploaded so far."""
+    await project_logic.abort_multipart_upload(db, project.id, data)
+    return {"message": "Upload aborted"}
+
+
 @router.get("/", tags=["Projects"], response_model=project_schemas.ProjectOut)
 async def read_projects(
     db: Annotated[Connection, Depends(database.get_db)],
@@ -430,12 +595,127 @@ async def read_projects(
     "/{project_id}", tags=["Projects"], response_model=project_schemas.ProjectInfo
 )
 async def read_project(
-    project: Annotated[
-        project_schemas.DbProject, Depends(project_deps.get_project_by_id)
+    project_id: Annotated[
+        UUID,
+        Path(
+            description="The project ID in UUID format.",
+        ),
     ],
+    db: Annotated[Connection, Depends(database.get_db)],
+    request: Request,
+    response: Response,
+):
+    """Get a specific project and all associated tasks by ID.
+
+    Supports conditional requests: the ETag changes whenever the project,
+    its tasks or task events change, so unchanged projects return 304.
+    """
+    version = await project_logic.get_project_version(db, project_id)
+    if version:
+        # The response embeds presigned URLs, so the ETag also rolls over
+        # every hour to keep clients from holding on to expired links.
+        window = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        etag = make_etag(project_id, version["version"], int(window.timestamp()))
+        not_modified = check_not_modified(request, response, etag)
+        if not_modified:
+            return not_modified
+
+    content = await project_schemas.DbProject.one_json(db, project_id)
+    return ORJSONResponse(content, headers=response.headers)
+
+
+@router.get("/{project_id}/orthophoto/tiles/{z}/{x}/{y}.png", tags=["Projects"])
+async def read_orthophoto_tile(
+    project_id: Annotated[
+        UUID,
+        Path(
+            description="The project ID in UUID format.",
+        ),
+    ],
+    z: Annotated[int, Path(ge=0, le=24, description="Tile zoom level.")],
+    x: Annotated[int, Path(ge=0, description="Tile column.")],
+    y: Annotated[int, Path(ge=0, description="Tile row.")],
+    request: Request,
+    response: Response,
 ):
-    """Get a specific project and all associated tasks by ID."""
-    return project
+    """Get a 256x256 PNG tile of the project orthophoto, in XYZ scheme.
+
+    Tiles are read from the orthophoto in S3 with range requests, so viewers
+    never need the whole GeoTIFF. Areas outside the orthophoto are
+    transparent. The ETag changes when the orthophoto is reprocessed.
+    """
+    if x >= 2**z or y >= 2**z:
+        raise HTTPException(
+            status_code=HTTPStatus.BAD_REQUEST,
+            detail=f"Tile {z}/{x}/{y} is out of range.",
+        )
+
+    try:
+        orthophoto = await async_s3_client().stat(
+            settings.S3_BUCKET_NAME, project_logic.get_orthophoto_s3_path(project_id)
+        )
+    except S3Error as e:
+        raise HTTPException(
+            status_code=HTTPStatus.NOT_FOUND,
+            detail="The project has no orthophoto.",
+        ) from e
+
+    etag = make_etag(project_id, orthophoto.etag, z, x, y)
+    not_modified = check_not_modified(request, response, etag, orthophoto.last_modified)
+    if not_modified:
+        return not_modified
+
+    tile = await project_logic.get_orthophoto_tile(project_id, orthophoto.etag, z, x, y)
+    return Response(content=tile, media_type="image/png", headers=response.headers)
+
+
+@router.get("/{project_id}/events/stream", tags=["Projects"])
+async def stream_project_events(
+    project_id: Annotated[
+        UUID,
+        Path(
+            description="The project ID in UUID format.",
+        ),
+    ],
+    request: Request,
+):
+    """Stream new task events of a project as Server-Sent Events.
+
+    Each `task_event` message carries the event as JSON, with its
+    `created_at` as the message id. After a reconnect, clients can catch
+    up with `GET /tasks/states/{project_id}?since=<last id>`.
+    """
+    # Not using the get_db dependency, which would hold a pool connection
+    # for as long as the stream stays open.
+    async with request.app.state.db_pool.connection() as db:
+        if not await project_logic.get_project_version(db, project_id):
+            raise HTTPException(
+                status_code=HTTPStatus.NOT_FOUND,
+                detail=f"Project with ID {project_id} not found.",
+            )
+
+    broadcaster = request.app.state.task_event_broadcaster
+
+    async def event_stream():
+        async with broadcaster.subscribe(project_id) as queue:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    payload = await asyncio.wait_for(
+                        queue.get(), timeout=SSE_HEARTBEAT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    # Keep proxies from closing an idle connection
+                    yield ": heartbeat\n\n"
+                    continue
+                event_id = json.loads(payload).get("created_at", "")
+                yield f"id: {event_id}\nevent: task_event\ndata: {payload}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.post("/process_imagery/{project_id}/{task_id}/", tags=["Image Processing"])
@@ -469,20 +749,43 @@ async def process_all_imagery(
     db: Annotated[Connection, Depends(database.get_db)],
     redis_pool: ArqRedis = Depends(get_redis_pool),
     gcp_file: UploadFile = File(None),
+    mode: Optional[ProjectProcessingMode] = None,
 ):
-    """API endpoint to process all tasks associated with a project."""
+    """API endpoint to process all tasks associated with a project.
+
+    By default, projects with more than SPLIT_MERGE_MAX_IMAGES images are
+    processed in split-merge mode. The mosaic mode only builds the project
+    orthophoto from the already processed tasks.
+    """
     user_id = user_data.id
-    if gcp_file:
-        gcp_file_path = f"/tmp/{uuid.uuid4()}"
-        with open(gcp_file_path, "wb") as f:
-            f.write(await gcp_file.read())
+    if mode == ProjectProcessingMode.MOSAIC:
+        job = await redis_pool.enqueue_job(
+            "build_project_orthomosaic", project.id, _queue_name="default_queue"
+        )
+        return {"message": "Orthomosaic build started.", "job_id": job.job_id}
 
+    if gcp_file:
         s3_path = f"dtm-data/projects/{project.id}/gcp/gcp_list.txt"
-        add_file_to_bucket(settings.S3_BUCKET_NAME, gcp_file_path, s3_path)
+        await async_s3_client().put_stream(
+            settings.S3_BUCKET_NAME, s3_path, gcp_file.file, gcp_file.size
+        )
 
     tasks = await project_logic.get_all_tasks_for_project(project.id, db)
+    if mode is None:
+        image_counts = await image_logic.get_image_counts(db, project.id)
+        total_images = sum(image_counts.get(uuid.UUID(task), 0) for task in tasks)
+        mode = (
+            ProjectProcessingMode.SPLIT_MERGE
+            if total_images > settings.SPLIT_MERGE_MAX_IMAGES
+            else ProjectProcessingMode.FULL
+        )
+
     job = await redis_pool.enqueue_job(
-        "process_all_drone_images",
+        (
+            "process_split_merge"
+            if mode == ProjectProcessingMode.SPLIT_MERGE
+            else "process_all_drone_images"
+        ),
         project.id,
         tasks,
         user_id,
@@ -495,12 +798,48 @@ async def process_all_imagery(
     }
 
 
+@router.get("/{project_id}/processing/progress", tags=["Image Processing"])
+async def read_processing_progress(
+    project: Annotated[
+        project_schemas.DbProject, Depends(project_deps.get_project_by_id)
+    ],
+    user_data: Annotated[AuthUser, Depends(login_required)],
+    db: Annotated[Connection, Depends(database.get_db)],
+    redis_pool: ArqRedis = Depends(get_redis_pool),
+    task_id: Optional[UUID] = Query(
+        default=None,
+        description="The task ID in UUID format, to only get its processing.",
+    ),
+):
+    """Get the progress of the ODM tasks processing a project, newest first.
+
+    Progress is a percentage, as last polled from NodeODM by the worker.
+    ODM tasks which were never polled are left out.
+    """
+    odm_tasks = await odm_nodes.get_project_odm_tasks(db, project.id, task_id)
+    progress = await odm_poller.get_progress(
+        redis_pool, [odm_task["id"] for odm_task in odm_tasks]
+    )
+    return [
+        {
+            "odm_task_id": odm_task["id"],
+            "task_id": odm_task["task_id"],
+            "submodel": odm_task["submodel"],
+            "created_at": odm_task["created_at"],
+            **task_progress,
+        }
+        for odm_task, task_progress in zip(odm_tasks, progress)
+        if task_progress
+    ]
+
+
 @router.post("/odm/webhook/{dtm_user_id}/{dtm_project_id}/", tags=["Image Processing"])
 async def odm_webhook_for_processing_whole_project(
     request: Request,
+    db: Annotated[Connection, Depends(database.get_db)],
     dtm_project_id: uuid.UUID,
     dtm_user_id: str,
-    background_tasks: BackgroundTasks,
+    redis_pool: ArqRedis = Depends(get_redis_pool),
 ):
     payload = await request.json()
     odm_task_id = payload.get("uuid")
@@ -509,15 +848,9 @@ async def odm_webhook_for_processing_whole_project(
     if not odm_task_id or not status:
         raise HTTPException(status_code=400, detail="Invalid webhook payload")
 
-    if status["code"] in {30, 40}:
-        log.info(f"Project {dtm_project_id}: Processing status {status['code']}")
-        background_tasks.add_task(
-            image_processing.process_assets_from_odm,
-            node_odm_url=settings.NODE_ODM_URL,
-            dtm_project_id=dtm_project_id,
-            odm_task_id=odm_task_id,
-            odm_status_code=status["code"],
-        )
+    await image_processing.handle_odm_task_status(
+        db, redis_pool, odm_task_id, status["code"], dtm_project_id, dtm_user_id
+    )
 
     return {"message": "Webhook received", "task_id": dtm_project_id}
 
@@ -532,7 +865,7 @@ async def odm_webhook_for_processing_a_single_task(
     dtm_project_id: uuid.UUID,
     dtm_task_id: uuid.UUID,
     dtm_user_id: str,
-    background_tasks: BackgroundTasks,
+    redis_pool: ArqRedis = Depends(get_redis_pool),
 ):
     payload = await request.json()
     odm_task_id = payload.get("uuid")
@@ -541,44 +874,15 @@ async def odm_webhook_for_processing_a_single_task(
     if not odm_task_id or not status:
         raise HTTPException(status_code=400, detail="Invalid webhook payload")
 
-    current_state = await task_logic.get_task_state(db, dtm_project_id, dtm_task_id)
-    state_value = State[current_state.get("state")]
-
-    if status["code"] == 40:
-        background_tasks.add_task(
-            image_processing.process_assets_from_odm,
-            node_odm_url=settings.NODE_ODM_URL,
-            dtm_project_id=dtm_project_id,
-            odm_task_id=odm_task_id,
-            state=state_value,
-            message="Task completed.",
-            dtm_task_id=dtm_task_id,
-            dtm_user_id=dtm_user_id,
-            odm_status_code=40,
-        )
-
-    elif status["code"] == 30 and state_value != State.IMAGE_PROCESSING_FAILED:
-        await task_logic.update_task_state(
-            db,
-            dtm_project_id,
-            dtm_task_id,
-            dtm_user_id,
-            "Image processing failed.",
-            state_value,
-            State.IMAGE_PROCESSING_FAILED,
-            timestamp(),
-        )
-        background_tasks.add_task(
-            image_processing.process_assets_from_odm,
-            node_odm_url=settings.NODE_ODM_URL,
-            dtm_project_id=dtm_project_id,
-            odm_task_id=odm_task_id,
-            state=state_value,
-            message="Image processing failed.",
-            dtm_task_id=dtm_task_id,
-            dtm_user_id=dtm_user_id,
-            odm_status_code=30,
-        )
+    await image_processing.handle_odm_task_status(
+        db,
+        redis_pool,
+        odm_task_id,
+        status["code"],
+        dtm_project_id,
+        dtm_user_id,
+        dtm_task_id,
+    )
 
     return {"message": "Webhook received", "task_id": odm_task_id}
 
@@ -692,18 +996,21 @@ async def get_assets_info(
     if task_id is None:
         # Fetch all tasks associated with the project
         tasks = await project_deps.get_tasks_by_project_id(project.id, db)
-        results = []
-
-        for task in tasks:
-            task_info = project_logic.get_project_info_from_s3(
-                project.id, task.get("id")
+        image_counts = await image_logic.get_image_counts(db, project.id)
+        return await asyncio.gather(
+            *(
+                project_logic.get_project_info_from_s3(
+                    project.id, task.get("id"), image_counts.get(task.get("id"), 0)
+                )
+                for task in tasks
             )
-            results.append(task_info)
-
-        return results
+        )
     else:
         current_state = await task_logic.get_task_state(db, project.id, task_id)
-        project_info = project_logic.get_project_info_from_s3(project.id, task_id)
+        image_count = await image_logic.get_task_image_count(db, task_id)
+        project_info = await project_logic.get_project_info_from_s3(
+            project.id, task_id, image_count
+        )
         project_info.state = current_state.get("state")
         return project_info
 
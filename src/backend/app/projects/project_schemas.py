@@ -4,7 +4,9 @@ from datetime import date, datetime
 from typing import Annotated, List, Optional, Union
 
 import geojson
+import orjson
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 from geojson_pydantic import Feature, FeatureCollection, MultiPolygon, Point, Polygon
 from loguru import logger as log
 from psycopg import Connection
@@ -25,6 +27,7 @@ from app.models.enums import (
     FinalOutput,
     HTTPStatus,
     IntEnum,
+    MultipartUploadTarget,
     ProjectCompletionStatus,
     ProjectStatus,
     ProjectVisibility,
@@ -110,6 +113,9 @@ class ProjectIn(BaseModel):
     front_overlap: Optional[float] = None
     side_overlap: Optional[float] = None
     is_terrain_follow: bool = False
+    # Image staging before processing, see image_staging
+    processing_gsd_cm_px: Optional[float] = Field(default=None, gt=0)
+    cull_images: bool = False
     outline: Annotated[
         FeatureCollection | Feature | Polygon, AfterValidator(validate_geojson)
     ]
@@ -244,6 +250,8 @@ class DbProject(BaseModel):
     gsd_cm_px: Optional[float] = None
     altitude_from_ground: Optional[float] = None
     is_terrain_follow: bool = False
+    processing_gsd_cm_px: Optional[float] = None
+    cull_images: bool = False
     image_url: Optional[str] = None
     created_at: datetime
 
@@ -384,6 +392,159 @@ class DbProject(BaseModel):
             project_record.task_count = len(task_records)
             return project_record
 
+    @staticmethod
+    async def one_json(db: Connection, project_id: uuid.UUID) -> dict:
+        """Get a single project & all associated tasks, ready to render as JSON.
+
+        Returns the same content as `ProjectInfo` built from `one`, but the
+        GeoJSON outlines and the tasks are rendered to JSON text by PostGIS
+        and spliced into the response as `orjson.Fragment`, instead
+        of being decoded, validated and re-encoded in Python. Only the
+        scalar project fields go through `ProjectInfo` validation.
+        """
+        async with db.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT
+                    projects.*,
+                    json_build_object(
+                        'type', 'Feature',
+                        'geometry', ST_AsGeoJSON(projects.outline)::json,
+                        'properties', json_build_object(
+                            'id', projects.id,
+                            'bbox', json_build_array(
+                                ST_XMin(ST_Envelope(projects.outline)),
+                                ST_YMin(ST_Envelope(projects.outline)),
+                                ST_XMax(ST_Envelope(projects.outline)),
+                                ST_YMax(ST_Envelope(projects.outline))
+                            )
+                        ),
+                        'id', projects.id
+                    )::text AS outline_json,
+                    json_build_object(
+                        'type', 'Feature',
+                        'geometry', ST_AsGeoJSON(projects.outline)::json,
+                        'properties', json_build_object(
+                            'id', projects.id,
+                            'bbox', json_build_array(
+                                ST_XMin(ST_Envelope(projects.no_fly_zones)),
+                                ST_YMin(ST_Envelope(projects.no_fly_zones)),
+                                ST_XMax(ST_Envelope(projects.no_fly_zones)),
+                                ST_YMax(ST_Envelope(projects.no_fly_zones))
+                            )
+                        ),
+                        'id', projects.id
+                    )::text AS no_fly_zones_json,
+                    users.name as author_name,
+                    (
+                        SELECT COALESCE(SUM(ST_Area(t.outline::geography)) / 1000000, 0)
+                        FROM tasks t
+                        WHERE t.project_id = projects.id
+                    ) AS project_area
+                FROM
+                    projects
+                JOIN
+                    users ON projects.author_id = users.id
+                WHERE
+                    projects.id = %(project_id)s;
+                """,
+                {"project_id": project_id},
+            )
+            project_record = await cur.fetchone()
+
+        if not project_record:
+            raise HTTPException(
+                status_code=HTTPStatus.FORBIDDEN,
+                detail=f"Project with ID {project_id} not found.",
+            )
+
+        async with db.cursor() as cur:
+            await cur.execute(
+                """
+                WITH TaskStateCalculation AS (
+                    SELECT DISTINCT ON (te.task_id)
+                        te.task_id,
+                        te.user_id,
+                        te.state
+                    FROM
+                        task_events te
+                    WHERE
+                        te.project_id = %(project_id)s
+                    ORDER BY
+                        te.task_id, te.created_at DESC
+                )
+                SELECT
+                    json_build_object(
+                        'id', t.id,
+                        'project_id', t.project_id,
+                        'project_task_index', t.project_task_index,
+                        'outline', json_build_object(
+                            'type', 'Feature',
+                            'geometry', ST_AsGeoJSON(t.outline)::json,
+                            'properties', json_build_object(
+                                'id', t.id,
+                                'bbox', json_build_array(
+                                    ST_XMin(ST_Envelope(t.outline)),
+                                    ST_YMin(ST_Envelope(t.outline)),
+                                    ST_XMax(ST_Envelope(t.outline)),
+                                    ST_YMax(ST_Envelope(t.outline))
+                                )
+                            ),
+                            'id', t.id
+                        ),
+                        'state', tsc.state,
+                        'user_id', tsc.user_id,
+                        'name', u.name,
+                        'image_count', NULL,
+                        'assets_url', t.assets_url,
+                        'total_area_sqkm', t.total_area_sqkm,
+                        'flight_time_minutes', t.flight_time_minutes,
+                        'flight_distance_km', t.flight_distance_km,
+                        'total_image_uploaded', t.total_image_uploaded
+                    )::text AS task_json,
+                    t.assets_url
+                FROM
+                    tasks t
+                LEFT JOIN
+                    TaskStateCalculation tsc ON t.id = tsc.task_id
+                LEFT JOIN
+                    users u ON tsc.user_id = u.id
+                WHERE
+                    t.project_id = %(project_id)s
+                ORDER BY
+                    t.project_task_index;
+                """,
+                {"project_id": project_id},
+            )
+            task_rows = await cur.fetchall()
+
+        # Only the few tasks with assets are decoded, to build their URL like
+        # TaskOut.set_assets_url
+        tasks = []
+        for task_json, assets_url in task_rows:
+            if assets_url:
+                task = orjson.loads(task_json)
+                task["assets_url"] = generate_static_url(
+                    settings.S3_BUCKET_NAME, assets_url
+                )
+                tasks.append(task)
+            else:
+                tasks.append(orjson.Fragment(task_json))
+
+        outline_json = project_record.pop("outline_json")
+        no_fly_zones_json = project_record.pop("no_fly_zones_json")
+        project_record.update(outline=None, no_fly_zones=None, tasks=[])
+
+        # The validators presign and stat S3 objects, which blocks
+        project_info = await run_in_threadpool(
+            ProjectInfo.model_validate, project_record
+        )
+        content = project_info.model_dump(mode="json")
+        content["outline"] = orjson.Fragment(outline_json)
+        content["no_fly_zones"] = orjson.Fragment(no_fly_zones_json)
+        content["tasks"] = tasks
+        return content
+
     async def all(
         db: Connection,
         user_id: Optional[str] = None,
@@ -585,6 +746,18 @@ class DbProject(BaseModel):
             DELETE FROM task_events
             WHERE project_id = %(project_id)s
             RETURNING project_id
+        ), deleted_images AS (
+            DELETE FROM images
+            WHERE project_id = %(project_id)s
+            RETURNING project_id
+        ), deleted_odm_tasks AS (
+            DELETE FROM odm_tasks
+            WHERE project_id = %(project_id)s
+            RETURNING project_id
+        ), deleted_image_footprints AS (
+            DELETE FROM image_footprints
+            WHERE project_id = %(project_id)s
+            RETURNING project_id
         )
         SELECT id FROM deleted_project
         """
@@ -656,6 +829,8 @@ class ProjectInfo(BaseModel):
     created_at: datetime
     author_id: str
     is_terrain_follow: bool = False
+    processing_gsd_cm_px: Optional[float] = None
+    cull_images: bool = False
 
     @model_validator(mode="after")
     def set_image_url(cls, values):
@@ -719,3 +894,74 @@ class PresignedUrlRequest(BaseModel):
     task_id: uuid.UUID
     image_name: List[str]
     expiry: int  # Expiry time in hours
+
+
+class MultipartUploadRequest(BaseModel):
+    """Identify the file of a multipart upload.
+
+    The S3 key is always derived here, never taken from the client: task
+    images go under the task's images directory, and the DEM replaces the
+    project's dem.tif.
+    """
+
+    target: MultipartUploadTarget = MultipartUploadTarget.IMAGE
+    task_id: Optional[uuid.UUID] = None
+    file_name: Optional[str] = None
+    content_type: str = "application/octet-stream"
+
+    @model_validator(mode="after")
+    def check_target(cls, values):
+        """Require a task and a plain file name for image uploads."""
+        if values.target == MultipartUploadTarget.IMAGE:
+            if not values.task_id or not values.file_name:
+                raise ValueError("task_id and file_name are required for images")
+            if "/" in values.file_name or values.file_name in (".", ".."):
+                raise ValueError("file_name must not contain a path")
+        return values
+
+    def object_key(self, project_id: uuid.UUID) -> str:
+        """Return the S3 key of the uploaded file."""
+        if self.target == MultipartUploadTarget.DEM:
+            return f"dtm-data/projects/{project_id}/dem.tif"
+        return f"dtm-data/projects/{project_id}/{self.task_id}/images/{self.file_name}"
+
+
+class MultipartStartIn(MultipartUploadRequest):
+    """Start or resume a multipart upload of a file.
+
+    An unfinished upload is only resumed for the same size and fingerprint,
+    so a different file with the same name never reuses its parts.
+    """
+
+    size: Annotated[int, Field(ge=1)]
+    # Identifies the file content, e.g. its last modified time or a hash
+    fingerprint: Annotated[str, Field(min_length=1, max_length=256)]
+
+
+class MultipartUploadIn(MultipartUploadRequest):
+    upload_id: str
+
+
+class MultipartCompleteIn(MultipartUploadIn):
+    """Complete a multipart upload, with the shape of the file the client sent."""
+
+    part_count: Annotated[int, Field(ge=1, le=10000)]
+    total_size: Annotated[int, Field(ge=1)]
+
+
+class MultipartSignPartsIn(MultipartUploadIn):
+    part_numbers: List[Annotated[int, Field(ge=1, le=10000)]]
+    expiry: int = 2  # Expiry time in hours
+
+
+class UploadedPart(BaseModel):
+    part_number: int
+    etag: str
+    size: Optional[int] = None
+
+
+class MultipartUploadOut(BaseModel):
+    upload_id: str
+    key: str
+    part_size: int
+    parts: List[UploadedPart] = []
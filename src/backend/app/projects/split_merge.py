@@ -0,0 +1,423 @@
+"""Split-merge processing of project imagery.
+
+Instead of one ODM task with every image of a project, adjacent tasks are
+grouped into submodels of at most SPLIT_MERGE_MAX_IMAGES images, each
+processed as its own ODM task across the node pool. Each submodel also
+processes the images of its neighbouring tasks, for overlap at the seams,
+and these count against the same budget.
+When all submodels are done, their orthophotos and DSMs are merged into
+the project COGs, each clipped to the outline of the tasks it covers.
+"""
+
+import asyncio
+import math
+import os
+import tempfile
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from loguru import logger as log
+from psycopg import Connection
+from psycopg.rows import dict_row
+
+from app.config import settings
+from app.images import image_logic
+from app.models.enums import ImageProcessingStatus
+from app.projects import image_processing, mosaic, project_logic
+from app.projects.nodeodm import NodeODMClient
+from app.s3 import async_s3_client
+
+SUBMODEL_OPTIONS = [
+    {"name": "dsm", "value": True},
+    {"name": "orthophoto-resolution", "value": 5},
+]
+# NodeODM asset downloaded for each submodel, and its name in S3
+SUBMODEL_ASSETS = {"orthophoto.tif": "odm_orthophoto.tif", "dsm.tif": "dsm.tif"}
+# Submodel output merged into each project output, with its nodata value
+MERGED_OUTPUTS = {
+    "odm_orthophoto.tif": ("orthophoto/odm_orthophoto.tif", None),
+    "dsm.tif": ("dsm/dsm.tif", mosaic.DSM_NODATA),
+}
+
+
+@dataclass
+class Submodel:
+    # The tasks whose area the submodel covers in the merged outputs
+    task_ids: List[uuid.UUID]
+    # The images processed, those of the overlap tasks included
+    image_count: int = 0
+    # Neighbouring tasks, processed for overlap but cut off when merging
+    overlap_task_ids: List[uuid.UUID] = field(default_factory=list)
+
+
+def submodel_prefix(project_id: uuid.UUID, submodel: int) -> str:
+    """Get the S3 prefix of the outputs of a submodel."""
+    return f"dtm-data/projects/{project_id}/submodels/{submodel}/"
+
+
+async def get_task_layout(
+    db: Connection, project_id: uuid.UUID, task_ids: List[str]
+) -> Dict[uuid.UUID, Dict[str, Any]]:
+    """Get the centroid, adjacent tasks and image count of each task."""
+    image_counts = await image_logic.get_image_counts(db, project_id)
+    async with db.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
+            """
+            SELECT
+                t.id,
+                ST_X(ST_Centroid(t.outline)) AS x,
+                ST_Y(ST_Centroid(t.outline)) AS y,
+                ARRAY(
+                    SELECT n.id
+                    FROM tasks n
+                    WHERE n.id = ANY(%(task_ids)s::uuid[])
+                        AND n.id <> t.id
+                        AND ST_Intersects(n.outline, t.outline)
+                ) AS neighbours
+            FROM tasks t
+            WHERE t.project_id = %(project_id)s AND t.id = ANY(%(task_ids)s::uuid[])
+            """,
+            {"project_id": project_id, "task_ids": task_ids},
+        )
+        tasks = await cur.fetchall()
+
+    return {
+        task["id"]: {**task, "image_count": image_counts.get(task["id"], 0)}
+        for task in tasks
+    }
+
+
+def overlap_ring(
+    tasks: Dict[uuid.UUID, Dict[str, Any]], members: Iterable[uuid.UUID]
+) -> Set[uuid.UUID]:
+    """Get the tasks adjacent to a group of tasks, outside of it."""
+    members = set(members)
+    return {n for t in members for n in tasks[t]["neighbours"] if n in tasks} - members
+
+
+def group_tasks(
+    tasks: Dict[uuid.UUID, Dict[str, Any]], max_images: int
+) -> List[Submodel]:
+    """Group adjacent tasks into submodels of at most max_images images.
+
+    Groups are grown from the south-west, one task at a time, adding the
+    adjacent task nearest to the first task of the group, so they stay
+    compact. The images of the overlap ring count against max_images, and
+    a task is only added if the group and its new ring still fit. When
+    even the ring of a lone task doesn't fit, it is trimmed to the nearest
+    tasks that do, and a task with more images than max_images is a
+    submodel alone, without overlap.
+
+    Args:
+        tasks: The x, y (centroid), neighbours and image_count of each task,
+            see get_task_layout.
+        max_images: The maximum number of images per submodel.
+
+    Returns:
+        List[Submodel]: The submodels.
+    """
+
+    def image_count(task_ids: Iterable[uuid.UUID]) -> int:
+        return sum(tasks[t]["image_count"] for t in task_ids)
+
+    remaining = set(tasks)
+    submodels = []
+
+    for seed in sorted(tasks, key=lambda t: (tasks[t]["y"], tasks[t]["x"], str(t))):
+        if seed not in remaining:
+            continue
+        remaining.discard(seed)
+        submodel = Submodel([seed])
+        origin = (tasks[seed]["x"], tasks[seed]["y"])
+
+        def distance(task_id: uuid.UUID, origin=origin) -> Tuple[float, str]:
+            return (
+                math.dist((tasks[task_id]["x"], tasks[task_id]["y"]), origin),
+                str(task_id),
+            )
+
+        candidates = set(tasks[seed]["neighbours"]) & remaining
+        while candidates:
+            task_id = min(candidates, key=distance)
+            candidates.discard(task_id)
+            members = [*submodel.task_ids, task_id]
+            ring = overlap_ring(tasks, members)
+            if image_count(members) + image_count(ring) > max_images:
+                continue
+            remaining.discard(task_id)
+            submodel.task_ids = members
+            candidates |= set(tasks[task_id]["neighbours"]) & remaining
+
+        submodel.image_count = image_count(submodel.task_ids)
+        for task_id in sorted(overlap_ring(tasks, submodel.task_ids), key=distance):
+            if submodel.image_count + tasks[task_id]["image_count"] <= max_images:
+                submodel.overlap_task_ids.append(task_id)
+                submodel.image_count += tasks[task_id]["image_count"]
+        submodel.overlap_task_ids.sort(key=str)
+        submodels.append(submodel)
+
+    return submodels
+
+
+async def fail_submodels(db: Connection, project_id: uuid.UUID):
+    """Mark the unfinished submodels of a project as failed, so none is merged."""
+    await db.execute(
+        """
+        UPDATE odm_tasks
+        SET status = 'FAILED'
+        WHERE project_id = %(project_id)s
+            AND submodel IS NOT NULL
+            AND status IS NULL
+        """,
+        {"project_id": project_id},
+    )
+    await db.commit()
+
+
+async def finish_submodel(
+    db: Connection,
+    project_id: uuid.UUID,
+    odm_task_id: str,
+    status: ImageProcessingStatus,
+) -> Optional[bool]:
+    """Record the result of a submodel.
+
+    The submodels of the project are locked, so only the last one to finish
+    sees all of them done. Submodels are recorded as they are submitted, so
+    the merge also waits for the submodel count of the run to be recorded.
+
+    Returns:
+        bool: Whether all submodels succeeded, and the merge should start,
+            or None if the ODM task is not an unfinished submodel of the
+            current run.
+    """
+    async with db.transaction():
+        async with db.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT id, status, submodel_count
+                FROM odm_tasks
+                WHERE project_id = %(project_id)s AND submodel IS NOT NULL
+                FOR UPDATE
+                """,
+                {"project_id": project_id},
+            )
+            rows = {row["id"]: row for row in await cur.fetchall()}
+            if odm_task_id not in rows or rows[odm_task_id]["status"] is not None:
+                # A repeated webhook, or a submodel of an earlier run
+                return None
+
+            await cur.execute(
+                "UPDATE odm_tasks SET status = %(status)s WHERE id = %(id)s",
+                {"id": odm_task_id, "status": status.name},
+            )
+            rows[odm_task_id]["status"] = status.name
+
+    return len(rows) == rows[odm_task_id]["submodel_count"] and all(
+        row["status"] == ImageProcessingStatus.SUCCESS.name for row in rows.values()
+    )
+
+
+async def remove_odm_tasks(odm_tasks: List[Tuple[str, str]]):
+    """Remove ODM tasks from their nodes, given their IDs and node URLs."""
+    for odm_task_id, node_url in odm_tasks:
+        try:
+            async with NodeODMClient(node_url) as node:
+                await node.remove_task(odm_task_id)
+        except Exception as e:
+            log.error(f"Error removing task {odm_task_id} from NodeODM: {e}")
+
+
+async def process_split_merge(
+    ctx: Dict[Any, Any], project_id: uuid.UUID, tasks: list, user_id: str
+):
+    """Start processing the imagery of a project as submodels.
+
+    Submodels are submitted one at a time, so each is scheduled with the
+    node queues updated by the previous ones. If one can't be submitted,
+    those already submitted are removed from their nodes.
+    """
+    job_id = ctx.get("job_id", "unknown")
+    log.info(f"Starting process_split_merge (Job ID: {job_id})")
+
+    pool = ctx["db_pool"]
+    async with pool.connection() as conn:
+        layout = await get_task_layout(conn, project_id, tasks)
+        submodels = group_tasks(layout, settings.SPLIT_MERGE_MAX_IMAGES)
+        log.info(
+            f"Processing {len(layout)} tasks of project {project_id} "
+            f"as {len(submodels)} submodels"
+        )
+
+        # Submodels of previous runs are never merged again
+        await conn.execute(
+            """
+            DELETE FROM odm_tasks
+            WHERE project_id = %(project_id)s AND submodel IS NOT NULL
+            """,
+            {"project_id": project_id},
+        )
+        await project_logic.update_processing_status(
+            conn, project_id, ImageProcessingStatus.PROCESSING
+        )
+
+        webhook_url = (
+            f"{settings.BACKEND_URL}/api/projects/odm/webhook/{user_id}/{project_id}/"
+        )
+        # The ODM tasks created so far, with their node
+        odm_tasks = []
+        try:
+            for index, submodel in enumerate(submodels):
+                processor = image_processing.DroneImageProcessor(
+                    project_id=project_id,
+                    user_id=user_id,
+                    db=conn,
+                    task_ids=submodel.task_ids + submodel.overlap_task_ids,
+                    redis=ctx.get("redis"),
+                    submodel={
+                        "submodel": index,
+                        "submodel_count": len(submodels),
+                        "task_ids": submodel.task_ids,
+                    },
+                )
+                task = await processor.process_multiple_tasks(
+                    settings.S3_BUCKET_NAME,
+                    name=f"DTM-Project-{project_id}-Submodel-{index}",
+                    options=SUBMODEL_OPTIONS,
+                    webhook=webhook_url,
+                )
+                odm_tasks.append((task.uuid, processor.node_odm_url))
+        except Exception as e:
+            log.error(f"Error in process_split_merge (Job ID: {job_id}): {e}")
+            await remove_odm_tasks(odm_tasks)
+            await fail_submodels(conn, project_id)
+            await project_logic.update_processing_status(
+                conn, project_id, ImageProcessingStatus.FAILED
+            )
+            raise
+
+    return {"project_id": str(project_id), "submodels": len(submodels)}
+
+
+async def process_submodel_from_odm(
+    ctx: Dict[Any, Any],
+    node_odm_url: str,
+    dtm_project_id: uuid.UUID,
+    odm_task_id: str,
+    submodel: int,
+    odm_status_code: int,
+):
+    """Upload the orthophoto and DSM of a finished submodel to S3.
+
+    Runs as an ARQ job enqueued by the webhook. The last submodel to finish
+    enqueues the merge.
+    """
+    status = ImageProcessingStatus.FAILED
+    async with NodeODMClient(node_odm_url) as node:
+        try:
+            if odm_status_code == 40:
+                await upload_submodel_assets(
+                    node, dtm_project_id, odm_task_id, submodel
+                )
+                status = ImageProcessingStatus.SUCCESS
+        except Exception as e:
+            log.error(f"Error processing submodel task {odm_task_id}: {e}")
+        finally:
+            try:
+                await node.remove_task(odm_task_id)
+            except Exception as e:
+                log.error(f"Error removing task {odm_task_id} from NodeODM: {e}")
+
+    async with ctx["db_pool"].connection() as conn:
+        merge = await finish_submodel(conn, dtm_project_id, odm_task_id, status)
+        if merge is None:
+            log.warning(f"ODM task {odm_task_id} is not a current submodel, ignored")
+            return
+        if status == ImageProcessingStatus.FAILED:
+            await fail_submodels(conn, dtm_project_id)
+            await project_logic.update_processing_status(conn, dtm_project_id, status)
+
+    if merge:
+        log.info(f"All submodels of project {dtm_project_id} done, merging")
+        await ctx["redis"].enqueue_job(
+            "merge_submodels", dtm_project_id, _queue_name="default_queue"
+        )
+
+
+async def upload_submodel_assets(
+    node: NodeODMClient, project_id: uuid.UUID, odm_task_id: str, submodel: int
+):
+    """Copy the submodel outputs needed for the merge from NodeODM to S3."""
+    s3 = async_s3_client()
+    prefix = submodel_prefix(project_id, submodel)
+    with tempfile.TemporaryDirectory() as temp_dir:
+
+        async def copy_asset(asset: str, name: str):
+            file_path = await node.download_asset(
+                odm_task_id, asset, os.path.join(temp_dir, name)
+            )
+            await s3.fput(
+                settings.S3_BUCKET_NAME, f"{prefix}{name}", file_path, parallel=True
+            )
+
+        await asyncio.gather(
+            *(copy_asset(asset, name) for asset, name in SUBMODEL_ASSETS.items())
+        )
+
+
+async def merge_submodels(ctx: Dict[Any, Any], project_id: uuid.UUID):
+    """Merge the submodel orthophotos and DSMs into the project outputs."""
+    job_id = ctx.get("job_id", "unknown")
+    log.info(f"Starting merge_submodels (Job ID: {job_id})")
+    project_prefix = f"dtm-data/projects/{project_id}/"
+
+    pool = ctx["db_pool"]
+    async with pool.connection() as conn:
+        try:
+            async with conn.cursor(row_factory=dict_row) as cur:
+                await cur.execute(
+                    """
+                    SELECT
+                        o.submodel,
+                        (
+                            SELECT ST_AsGeoJSON(ST_Union(t.outline))
+                            FROM tasks t
+                            WHERE t.id = ANY(o.task_ids)
+                        ) AS cutline
+                    FROM odm_tasks o
+                    WHERE o.project_id = %(project_id)s AND o.submodel IS NOT NULL
+                    ORDER BY o.submodel
+                    """,
+                    {"project_id": project_id},
+                )
+                submodels = await cur.fetchall()
+
+            await asyncio.gather(
+                *(
+                    mosaic.build_mosaic_from_s3(
+                        [
+                            (
+                                f"{submodel_prefix(project_id, row['submodel'])}{name}",
+                                row["cutline"],
+                            )
+                            for row in submodels
+                        ],
+                        f"{project_prefix}{output_path}",
+                        nodata,
+                    )
+                    for name, (output_path, nodata) in MERGED_OUTPUTS.items()
+                )
+            )
+        except Exception as e:
+            log.error(f"Error in merge_submodels (Job ID: {job_id}): {e}")
+            await project_logic.update_processing_status(
+                conn, project_id, ImageProcessingStatus.FAILED
+            )
+            raise
+
+        await project_logic.update_processing_status(
+            conn, project_id, ImageProcessingStatus.SUCCESS
+        )
+    log.info(f"Merged {len(submodels)} submodels of project {project_id}")
+    return {"project_id": str(project_id), "submodels": len(submodels)}
@@ -1,27 +1,79 @@
-from datetime import timedelta
+import asyncio
+import functools
+import hashlib
+import hmac
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from io import BytesIO
-from typing import Any
-from urllib.parse import urljoin
+from typing import Any, BinaryIO, Callable, Iterable, List, Optional
+from urllib.parse import quote, urljoin
 
+import certifi
+import urllib3
 from loguru import logger as log
 from minio import Minio
 from minio.commonconfig import CopySource
+from minio.datatypes import Object, Part
+from minio.deleteobjects import DeleteError, DeleteObject
 from minio.error import S3Error
+from minio.helpers import ObjectWriteResult
 
 from app.config import settings
 from app.utils import strip_presigned_url_for_local_dev
 
+# Part size for multipart uploads of streams with unknown length
+S3_PART_SIZE = 10 * 1024 * 1024
 
-def s3_client():
-    """Return the initialised S3 client with credentials."""
-    minio_url, is_secure = is_connection_secure(settings.S3_ENDPOINT)
-    log.debug("Connecting to Minio S3 server")
-    return Minio(
-        minio_url,
-        settings.S3_ACCESS_KEY,
-        settings.S3_SECRET_KEY,
-        secure=is_secure,
-    )
+_client: Optional[Minio] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+def s3_client() -> Minio:
+    """Return the shared S3 client, creating it on first use.
+
+    One client, with a single sized urllib3 connection pool, is kept per
+    process so that connections are reused across calls and threads. It
+    is recreated after a fork, as pooled sockets can't be shared between
+    processes.
+    """
+    global _client, _client_pid
+
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            minio_url, is_secure = is_connection_secure(settings.S3_ENDPOINT)
+            log.debug("Connecting to Minio S3 server")
+            http_client = urllib3.PoolManager(
+                maxsize=settings.S3_POOL_MAXSIZE,
+                timeout=urllib3.Timeout(
+                    connect=settings.S3_CONNECT_TIMEOUT,
+                    read=settings.S3_READ_TIMEOUT,
+                ),
+                cert_reqs="CERT_REQUIRED",
+                ca_certs=os.environ.get("SSL_CERT_FILE") or certifi.where(),
+                retries=urllib3.Retry(
+                    total=settings.S3_MAX_RETRIES,
+                    backoff_factor=0.2,
+                    status_forcelist=[500, 502, 503, 504],
+                ),
+            )
+            _client = Minio(
+                minio_url,
+                settings.S3_ACCESS_KEY,
+                settings.S3_SECRET_KEY,
+                secure=is_secure,
+                region=settings.S3_REGION,
+                http_client=http_client,
+            )
+            _client_pid = os.getpid()
+
+    return _client
 
 
 def is_connection_secure(minio_url: str):
@@ -63,20 +115,86 @@ def check_file_exists(bucket_name: str, object_name: str) -> bool:
         return False
 
 
-def add_file_to_bucket(bucket_name: str, file_path: str, s3_path: str):
+class UploadProgress:
+    """Log the progress of an upload, at most once per `interval` seconds.
+
+    Implements the progress interface of Minio.fput_object/put_object.
+    Bytes are counted as parts are read for upload.
+    """
+
+    def __init__(self, interval: float = 10):
+        self.interval = interval
+        self.object_name = None
+        self.total_length = None
+        self.uploaded = 0
+        self._last_logged = 0.0
+
+    def set_meta(self, object_name: str, total_length: Optional[int]):
+        self.object_name = object_name
+        self.total_length = total_length
+        self._last_logged = time.monotonic()
+
+    def update(self, size: int):
+        self.uploaded += size
+        now = time.monotonic()
+        done = self.uploaded == self.total_length
+        if not done and now - self._last_logged < self.interval:
+            return
+        self._last_logged = now
+        uploaded_mb = self.uploaded / (1024 * 1024)
+        if self.total_length:
+            total_mb = self.total_length / (1024 * 1024)
+            log.info(
+                f"Uploading {self.object_name}: {uploaded_mb:.0f}/{total_mb:.0f} MB "
+                f"({self.uploaded / self.total_length:.0%})"
+            )
+        else:
+            log.info(f"Uploading {self.object_name}: {uploaded_mb:.0f} MB")
+
+
+def add_file_to_bucket(
+    bucket_name: str,
+    file_path: str,
+    s3_path: str,
+    content_type: str = "application/octet-stream",
+    parallel: bool = False,
+    part_size: Optional[int] = None,
+    num_parallel_uploads: Optional[int] = None,
+) -> ObjectWriteResult:
     """Upload a file from the filesystem to an S3 bucket.
 
     Args:
         bucket_name (str): The name of the S3 bucket.
         file_path (str): The path to the file on the local filesystem.
         s3_path (str): The path in the S3 bucket where the file will be stored.
+        content_type (str, optional): The content type of the uploaded file.
+        parallel (bool, optional): Upload in parallel multipart mode, logging
+            progress, for large files. The part size and concurrency default
+            to S3_UPLOAD_PART_SIZE and S3_UPLOAD_CONCURRENCY.
+        part_size (int, optional): The multipart part size in bytes.
+        num_parallel_uploads (int, optional): The number of parts to upload
+            concurrently.
+
+    Returns:
+        ObjectWriteResult: The result of the upload.
     """
-    # Ensure s3_path starts with a forward slash
-    # if not s3_path.startswith("/"):
-    #     s3_path = f"/{s3_path}"
+    kwargs = {}
+    if parallel:
+        kwargs["part_size"] = part_size or settings.S3_UPLOAD_PART_SIZE
+        kwargs["num_parallel_uploads"] = (
+            num_parallel_uploads or settings.S3_UPLOAD_CONCURRENCY
+        )
+        kwargs["progress"] = UploadProgress()
+    else:
+        if part_size:
+            kwargs["part_size"] = part_size
+        if num_parallel_uploads:
+            kwargs["num_parallel_uploads"] = num_parallel_uploads
 
     client = s3_client()
-    client.fput_object(bucket_name, s3_path, file_path)
+    return client.fput_object(
+        bucket_name, s3_path.lstrip("/"), file_path, content_type, **kwargs
+    )
 
 
 def add_obj_to_bucket(
@@ -233,6 +351,153 @@ def get_presigned_url(bucket_name: str, object_name: str, expires: int = 2):
     return strip_presigned_url_for_local_dev(url)
 
 
+class BatchPresigner:
+    """Presign many object URLs in one bucket, locally.
+
+    Produces the same SigV4 query-string signatures as
+    Minio.get_presigned_url, but the credentials, scope and signing key are
+    derived once per batch rather than per URL, and no network calls are
+    made. Use it for bulk issuance, such as upload URLs for a whole flight.
+
+    Local signing needs S3_REGION to be set, and emits path-style URLs
+    (https://endpoint/bucket/key). Otherwise, or for AWS endpoints, which
+    the Minio client addresses virtual-host style, each URL is presigned
+    by the Minio client instead. Create presigners from async code with
+    `create`.
+    """
+
+    def __init__(self, bucket_name: str, method: str = "PUT", expires: int = 2):
+        """Prepare the signing context.
+
+        Args:
+            bucket_name (str): The name of the S3 bucket.
+            method (str): The HTTP method the URLs are valid for.
+            expires (int): The time in hours until the URLs expire.
+        """
+        host, is_secure = is_connection_secure(settings.S3_ENDPOINT)
+        region = settings.S3_REGION
+
+        self.method = method
+        self._bucket_name = bucket_name
+        self._expires = timedelta(hours=expires)
+        self.local = bool(region) and not host.endswith("amazonaws.com")
+        if not self.local:
+            return
+
+        now = datetime.now(timezone.utc)
+        amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+        scope = f"{now.strftime('%Y%m%d')}/{region}/s3/aws4_request"
+        credential = quote(f"{settings.S3_ACCESS_KEY}/{scope}", safe="")
+        expires_seconds = int(self._expires.total_seconds())
+
+        self._base_url = f"{'https' if is_secure else 'http'}://{host}"
+        self._path_prefix = f"/{bucket_name}/"
+        self._query_pairs = [
+            ("X-Amz-Algorithm", "AWS4-HMAC-SHA256"),
+            ("X-Amz-Credential", f"{settings.S3_ACCESS_KEY}/{scope}"),
+            ("X-Amz-Date", amz_date),
+            ("X-Amz-Expires", expires_seconds),
+            ("X-Amz-SignedHeaders", "host"),
+        ]
+        # Already in canonical (sorted) order
+        self._query = (
+            "X-Amz-Algorithm=AWS4-HMAC-SHA256"
+            f"&X-Amz-Credential={credential}"
+            f"&X-Amz-Date={amz_date}"
+            f"&X-Amz-Expires={expires_seconds}"
+            "&X-Amz-SignedHeaders=host"
+        )
+        self._canonical_headers = f"\nhost:{host}\n\nhost\nUNSIGNED-PAYLOAD"
+        self._canonical_suffix = f"\n{self._query}{self._canonical_headers}"
+        self._string_to_sign_prefix = f"AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n"
+
+        signing_key = f"AWS4{settings.S3_SECRET_KEY}".encode()
+        for part in (now.strftime("%Y%m%d"), region, "s3", "aws4_request"):
+            signing_key = hmac.new(signing_key, part.encode(), hashlib.sha256).digest()
+        self._signing_key = signing_key
+
+    @classmethod
+    async def create(
+        cls, bucket_name: str, method: str = "PUT", expires: int = 2
+    ) -> "BatchPresigner":
+        """Prepare a presigner without blocking the event loop.
+
+        Without local signing, the Minio client looks up the bucket region
+        on its first presigned URL, so that one is signed in a thread.
+        """
+        presigner = cls(bucket_name, method, expires)
+        if not presigner.local:
+            await asyncio.to_thread(presigner.sign, "_")
+        return presigner
+
+    def sign(self, object_name: str, query_params: Optional[dict] = None) -> str:
+        """Return the presigned URL for an object.
+
+        Extra query parameters, such as the partNumber and uploadId of a
+        multipart upload part, are included in the signature.
+        """
+        if not self.local:
+            return s3_client().get_presigned_url(
+                self.method,
+                self._bucket_name,
+                object_name,
+                expires=self._expires,
+                extra_query_params={
+                    key: str(value) for key, value in (query_params or {}).items()
+                },
+            )
+
+        path = self._path_prefix + quote(object_name.lstrip("/"))
+        if query_params:
+            query = "&".join(
+                f"{quote(str(key), safe='')}={quote(str(value), safe='')}"
+                for key, value in sorted(
+                    [*self._query_pairs, *query_params.items()],
+                    key=lambda pair: quote(str(pair[0]), safe=""),
+                )
+            )
+            canonical_request = (
+                f"{self.method}\n{path}\n{query}{self._canonical_headers}"
+            )
+        else:
+            query = self._query
+            canonical_request = f"{self.method}\n{path}{self._canonical_suffix}"
+        string_to_sign = (
+            self._string_to_sign_prefix
+            + hashlib.sha256(canonical_request.encode()).hexdigest()
+        )
+        signature = hmac.new(
+            self._signing_key, string_to_sign.encode(), hashlib.sha256
+        ).hexdigest()
+        return f"{self._base_url}{path}?{query}&X-Amz-Signature={signature}"
+
+
+def gdal_vsis3_path(bucket_name: str, object_name: str) -> str:
+    """Get the GDAL /vsis3/ path of an object, read with gdal_s3_config."""
+    return f"/vsis3/{bucket_name}/{object_name.lstrip('/')}"
+
+
+@functools.cache
+def gdal_s3_config() -> dict:
+    """GDAL config options to read /vsis3/ paths from the S3_ENDPOINT.
+
+    GDAL reads only the byte ranges it needs, merging consecutive ones, and
+    the directory listing it would otherwise do on open is skipped.
+    """
+    endpoint, is_secure = is_connection_secure(settings.S3_ENDPOINT)
+    return {
+        "AWS_S3_ENDPOINT": endpoint,
+        "AWS_HTTPS": "YES" if is_secure else "NO",
+        "AWS_VIRTUAL_HOSTING": "FALSE",
+        "AWS_ACCESS_KEY_ID": settings.S3_ACCESS_KEY or "",
+        "AWS_SECRET_ACCESS_KEY": settings.S3_SECRET_KEY or "",
+        "AWS_REGION": settings.S3_REGION or "us-east-1",
+        "GDAL_DISABLE_READDIR_ON_OPEN": "EMPTY_DIR",
+        "GDAL_HTTP_MERGE_CONSECUTIVE_RANGES": "YES",
+        "VSI_CACHE": "TRUE",
+    }
+
+
 def get_object_metadata(bucket_name: str, object_name: str):
     """Get object metadata from an S3 bucket.
 
@@ -328,3 +593,264 @@ def copy_file_within_bucket(
     except Exception as e:
         log.error(f"Unexpected error during object copy: {e}")
         return False
+
+
+class AsyncS3:
+    """Awaitable S3 operations for use from async code.
+
+    Calls to the shared Minio client block on network I/O, so they are run
+    on a bounded thread pool instead of the event loop. The pool is sized
+    like the client's connection pool, so threads don't queue for sockets.
+
+    Minio has no public multipart API, so the multipart methods call its
+    private `_create_multipart_upload`, `_list_parts` and friends. These
+    are why minio is pinned below 7.3 in pyproject.toml.
+    """
+
+    def __init__(self, max_workers: int = settings.S3_POOL_MAXSIZE):
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="s3"
+        )
+
+    async def _run(self, func: Callable, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def put(
+        self,
+        bucket_name: str,
+        s3_path: str,
+        data: bytes | BinaryIO,
+        length: Optional[int] = None,
+        content_type: str = "application/octet-stream",
+        **kwargs: Any,
+    ) -> ObjectWriteResult:
+        """Upload bytes or a readable binary stream.
+
+        Streams are uploaded in multipart chunks, see put_stream.
+        """
+        if not isinstance(data, (bytes, bytearray, memoryview)):
+            return await self.put_stream(
+                bucket_name, s3_path, data, length, content_type, **kwargs
+            )
+
+        return await self._run(
+            s3_client().put_object,
+            bucket_name,
+            s3_path.lstrip("/"),
+            BytesIO(data),
+            len(data),
+            content_type=content_type,
+            **kwargs,
+        )
+
+    async def put_stream(
+        self,
+        bucket_name: str,
+        s3_path: str,
+        stream: BinaryIO,
+        length: Optional[int] = None,
+        content_type: str = "application/octet-stream",
+        part_size: int = S3_PART_SIZE,
+        **kwargs: Any,
+    ) -> ObjectWriteResult:
+        """Upload a readable binary stream in fixed-size multipart chunks.
+
+        Only a few parts are held in memory at a time, whatever the size of
+        the stream, so large files such as DEMs are never read whole. A
+        stream of unknown length is read until EOF.
+        """
+        return await self._run(
+            s3_client().put_object,
+            bucket_name,
+            s3_path.lstrip("/"),
+            stream,
+            -1 if length is None else length,
+            content_type=content_type,
+            part_size=part_size,
+            **kwargs,
+        )
+
+    async def fput(
+        self,
+        bucket_name: str,
+        s3_path: str,
+        file_path: str,
+        content_type: str = "application/octet-stream",
+        **kwargs: Any,
+    ) -> ObjectWriteResult:
+        """Upload a file from the local filesystem, see add_file_to_bucket."""
+        return await self._run(
+            add_file_to_bucket,
+            bucket_name,
+            file_path,
+            s3_path,
+            content_type=content_type,
+            **kwargs,
+        )
+
+    async def get(
+        self, bucket_name: str, s3_path: str, offset: int = 0, length: int = 0
+    ) -> bytes:
+        """Download an object into memory, or `length` bytes of it from `offset`."""
+
+        def _get():
+            response = s3_client().get_object(
+                bucket_name, s3_path, offset=offset, length=length
+            )
+            try:
+                return response.read()
+            finally:
+                response.close()
+                response.release_conn()
+
+        return await self._run(_get)
+
+    async def fget(self, bucket_name: str, s3_path: str, file_path: str):
+        """Download an object to the local filesystem."""
+        return await self._run(s3_client().fget_object, bucket_name, s3_path, file_path)
+
+    async def list(
+        self, bucket_name: str, prefix: str, recursive: bool = True
+    ) -> List[Object]:
+        """List the objects under a prefix."""
+        return await self._run(
+            lambda: list(
+                s3_client().list_objects(
+                    bucket_name, prefix=prefix, recursive=recursive
+                )
+            )
+        )
+
+    async def stat(self, bucket_name: str, s3_path: str) -> Object:
+        """Get object metadata. Raises S3Error if the object doesn't exist."""
+        return await self._run(s3_client().stat_object, bucket_name, s3_path)
+
+    async def exists(self, bucket_name: str, s3_path: str) -> bool:
+        """Check if an object exists."""
+        try:
+            await self.stat(bucket_name, s3_path)
+            return True
+        except S3Error:
+            return False
+
+    async def copy(
+        self, bucket_name: str, source_path: str, destination_path: str
+    ) -> ObjectWriteResult:
+        """Copy an object within a bucket."""
+        return await self._run(
+            s3_client().copy_object,
+            bucket_name,
+            destination_path.lstrip("/"),
+            CopySource(bucket_name, source_path.lstrip("/")),
+        )
+
+    async def delete_many(
+        self, bucket_name: str, object_names: Iterable[str]
+    ) -> List[DeleteError]:
+        """Delete objects in bulk, returning the errors for any that failed."""
+        delete_objects = [DeleteObject(name) for name in object_names]
+        if not delete_objects:
+            return []
+        # remove_objects is lazy, the deletion happens as errors are consumed
+        return await self._run(
+            lambda: list(s3_client().remove_objects(bucket_name, delete_objects))
+        )
+
+    async def presign(
+        self,
+        bucket_name: str,
+        object_name: str,
+        expires: int = 2,
+        method: str = "GET",
+    ) -> str:
+        """Generate a presigned URL, valid for `expires` hours.
+
+        Download (GET) URLs are adjusted for local development, as in
+        get_presigned_url.
+        """
+        url = await self._run(
+            s3_client().get_presigned_url,
+            method,
+            bucket_name,
+            object_name,
+            expires=timedelta(hours=expires),
+        )
+        if method == "GET":
+            return strip_presigned_url_for_local_dev(url)
+        return url
+
+    async def create_multipart_upload(
+        self,
+        bucket_name: str,
+        s3_path: str,
+        content_type: str = "application/octet-stream",
+    ) -> str:
+        """Start a multipart upload, returning its upload ID."""
+        return await self._run(
+            s3_client()._create_multipart_upload,
+            bucket_name,
+            s3_path.lstrip("/"),
+            {"Content-Type": content_type},
+        )
+
+    async def list_parts(
+        self, bucket_name: str, s3_path: str, upload_id: str
+    ) -> List[Part]:
+        """List all the parts uploaded so far in a multipart upload."""
+
+        def _list_parts():
+            parts = []
+            marker = None
+            while True:
+                result = s3_client()._list_parts(
+                    bucket_name,
+                    s3_path.lstrip("/"),
+                    upload_id,
+                    part_number_marker=marker,
+                )
+                parts.extend(result.parts)
+                if not result.is_truncated:
+                    return parts
+                marker = str(result.next_part_number_marker)
+
+        return await self._run(_list_parts)
+
+    async def complete_multipart_upload(
+        self, bucket_name: str, s3_path: str, upload_id: str, parts: List[Part]
+    ):
+        """Assemble the uploaded parts into the final object."""
+        return await self._run(
+            s3_client()._complete_multipart_upload,
+            bucket_name,
+            s3_path.lstrip("/"),
+            upload_id,
+            sorted(parts, key=lambda part: part.part_number),
+        )
+
+    async def abort_multipart_upload(
+        self, bucket_name: str, s3_path: str, upload_id: str
+    ):
+        """Abort a multipart upload, discarding any uploaded parts."""
+        return await self._run(
+            s3_client()._abort_multipart_upload,
+            bucket_name,
+            s3_path.lstrip("/"),
+            upload_id,
+        )
+
+
+_async_client: Optional[AsyncS3] = None
+_async_client_pid: Optional[int] = None
+
+
+def async_s3_client() -> AsyncS3:
+    """Return the shared async S3 facade for this process."""
+    global _async_client, _async_client_pid
+
+    if _async_client is None or _async_client_pid != os.getpid():
+        _async_client = AsyncS3()
+        _async_client_pid = os.getpid()
+    return _async_client
@@ -7,6 +7,7 @@ from psycopg import Connection
 from psycopg.rows import class_row, dict_row
 
 from app.config import settings
+from app.images import image_logic
 from app.models.enums import EventType, HTTPStatus, State, UserRole
 from app.projects import project_logic
 from app.tasks.task_schemas import NewEvent, TaskStats
@@ -25,6 +26,24 @@ async def list_task_id_for_project(db: Connection, project_id: uuid.UUID):
         return await cur.fetchall()
 
 
+async def get_task_project_version(db: Connection, task_id: uuid.UUID):
+    """Get the version of the project of a task.
+
+    Returns None if the task does not exist.
+    """
+    async with db.cursor(row_factory=dict_row) as cur:
+        await cur.execute(
+            """
+            SELECT p.version
+            FROM tasks t
+            JOIN projects p ON p.id = t.project_id
+            WHERE t.id = %(task_id)s;
+            """,
+            {"task_id": task_id},
+        )
+        return await cur.fetchone()
+
+
 async def get_task_stats(db: Connection, user_data: AuthUser):
     try:
         async with db.cursor(row_factory=class_row(TaskStats)) as cur:
@@ -604,10 +623,11 @@ async def handle_event(
                     status_code=403,
                     detail="You cannot upload an image for this task as it is locked by another user.",
                 )
-            # update the count of the task to image uploaded.
-            total_image_count = project_logic.get_project_info_from_s3(
-                project_id, task_id
-            ).image_count
+            # The upload is complete: record the task's images in the manifest
+            # and update the count of the task to image uploaded.
+            total_image_count = await image_logic.sync_task_images(
+                db, project_id, task_id
+            )
 
             await project_logic.update_task_field(
                 db, project_id, task_id, "total_image_uploaded", str(total_image_count)
@@ -1,15 +1,19 @@
 import uuid
-from typing import Annotated
+from datetime import datetime
+from typing import Annotated, Optional
 
-from fastapi import APIRouter, BackgroundTasks, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Request, Response
 from loguru import logger as log
 from psycopg import Connection
 
+from app.arq.tasks import get_redis_pool
 from app.db import database
-from app.projects import project_deps, project_schemas
+from app.models.enums import EventType
+from app.projects import project_deps, project_logic, project_schemas
 from app.tasks import task_logic, task_schemas
 from app.users.user_deps import login_required
 from app.users.user_schemas import AuthUser
+from app.utils import check_not_modified, make_etag
 
 router = APIRouter(
     prefix="/tasks",
@@ -22,9 +26,18 @@ router = APIRouter(
 async def read_task(
     task_id: uuid.UUID,
     db: Annotated[Connection, Depends(database.get_db)],
+    request: Request,
+    response: Response,
     user_data: AuthUser = Depends(login_required),
 ):
     """Retrieve details of a specific task by its ID."""
+    version = await task_logic.get_task_project_version(db, task_id)
+    if version:
+        etag = make_etag(task_id, version["version"])
+        not_modified = check_not_modified(request, response, etag)
+        if not_modified:
+            return not_modified
+
     return await task_schemas.TaskDetailsOut.get_task_details(db, task_id)
 
 
@@ -55,9 +68,37 @@ async def list_tasks(
 
 @router.get("/states/{project_id}")
 async def task_states(
-    db: Annotated[Connection, Depends(database.get_db)], project_id: uuid.UUID
+    db: Annotated[Connection, Depends(database.get_db)],
+    project_id: uuid.UUID,
+    request: Request,
+    response: Response,
+    since: Annotated[
+        Optional[datetime],
+        Query(
+            description=(
+                "Sync cursor from a previous response. If set, only tasks "
+                "whose state changed since then are returned, with a new cursor."
+            ),
+        ),
+    ] = None,
 ):
-    """Get all tasks states for a project."""
+    """Get all tasks states for a project.
+
+    The full list carries the sync cursor in the `X-Sync-Cursor` header.
+    """
+    if since is not None:
+        return await task_schemas.Task.changed_since(db, project_id, since)
+
+    version = await project_logic.get_project_version(db, project_id)
+    if version:
+        etag = make_etag(project_id, version["version"])
+        not_modified = check_not_modified(request, response, etag)
+        if not_modified:
+            return not_modified
+
+    latest = await task_schemas.Task.latest_event_time(db, project_id)
+    if latest:
+        response.headers["X-Sync-Cursor"] = latest.isoformat()
     return await task_schemas.Task.all(db, project_id)
 
 
@@ -76,7 +117,7 @@ async def new_event(
     user_id = user_data.id
     project = project.model_dump()
     user_role = user_data.role
-    return await task_logic.handle_event(
+    result = await task_logic.handle_event(
         db,
         project_id,
         task_id,
@@ -87,3 +128,23 @@ async def new_event(
         user_data,
         background_tasks,
     )
+
+    if detail.event == EventType.IMAGE_UPLOAD:
+        # Read the metadata of the uploaded images, to check them before
+        # processing. The state has changed already, so a failure is logged.
+        # Commit first, so the job sees the images synced by the event.
+        await db.commit()
+        try:
+            redis_pool = await get_redis_pool()
+            try:
+                await redis_pool.enqueue_job(
+                    "extract_image_metadata",
+                    project_id,
+                    task_id,
+                    _queue_name="default_queue",
+                )
+            finally:
+                await redis_pool.close()
+        except Exception as e:
+            log.error(f"Failed to enqueue metadata extraction of task {task_id}: {e}")
+    return result
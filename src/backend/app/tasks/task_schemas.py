@@ -1,5 +1,5 @@
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from typing import List, Literal, Optional
 
 from fastapi import HTTPException
@@ -13,6 +13,9 @@ from app.config import settings
 from app.models.enums import EventType, HTTPStatus, State
 from app.s3 import generate_static_url, is_connection_secure
 
+# How far back behind a client's cursor to look for task state changes
+TASK_STATES_SYNC_OVERLAP = timedelta(seconds=5)
+
 
 class Geometry(BaseModel):
     type: Literal["ST_Polygon"]
@@ -190,6 +193,66 @@ class Task(BaseModel):
             combined_tasks = existing_tasks + remaining_tasks
             return combined_tasks
 
+    @staticmethod
+    async def latest_event_time(db: Connection, project_id: uuid.UUID):
+        """Get the creation time of the latest task event in a project.
+
+        Used as the initial sync cursor for clients that load all states.
+        """
+        async with db.cursor() as cur:
+            await cur.execute(
+                """SELECT MAX(created_at) FROM task_events
+                WHERE project_id = %(project_id)s
+            """,
+                {"project_id": project_id},
+            )
+            (latest,) = await cur.fetchone()
+            return latest
+
+    @staticmethod
+    async def changed_since(
+        db: Connection, project_id: uuid.UUID, since: datetime
+    ) -> "TaskStatesDelta":
+        """Get the tasks whose state changed after `since`.
+
+        A task changed if it has any event newer than the cursor, in which
+        case its latest event is newer too, so only the events past the
+        cursor need to be scanned (using the project_id, created_at index).
+
+        The lookup overlaps the cursor by TASK_STATES_SYNC_OVERLAP, so events
+        from transactions that committed slightly out of order are not
+        missed. Clients may receive a task they already have again.
+        """
+        if since.tzinfo is not None:
+            # task_events.created_at is stored as naive UTC
+            since = since.astimezone(timezone.utc).replace(tzinfo=None)
+
+        async with db.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """SELECT DISTINCT ON (task_id) project_id, task_id, state, created_at
+                FROM task_events
+                WHERE project_id = %(project_id)s
+                    AND created_at > %(since)s
+                ORDER BY task_id, created_at DESC
+            """,
+                {
+                    "project_id": project_id,
+                    "since": since - TASK_STATES_SYNC_OVERLAP,
+                },
+            )
+            events = await cur.fetchall()
+
+        cursor = max((event.pop("created_at") for event in events), default=since)
+        return TaskStatesDelta(
+            cursor=max(cursor, since),
+            tasks=[Task(**event) for event in events],
+        )
+
+
+class TaskStatesDelta(BaseModel):
+    cursor: Optional[datetime] = None
+    tasks: List[Task] = []
+
 
 class UserTasksOut(BaseModel):
     task_id: uuid.UUID
@@ -0,0 +1,99 @@
+"""Live stream of task events, fanned out from a single Postgres listener."""
+
+import asyncio
+import json
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from uuid import UUID
+
+from loguru import logger as log
+from psycopg import AsyncConnection
+
+# Postgres channel notified by the task_events insert trigger
+TASK_EVENTS_CHANNEL = "task_events"
+# Events buffered per subscriber before a slow client starts dropping them
+SUBSCRIBER_QUEUE_SIZE = 100
+# Maximum wait before reconnecting a lost listener connection, in seconds
+MAX_RECONNECT_DELAY = 30
+
+
+class TaskEventBroadcaster:
+    """Fan out task event notifications to in-process subscribers.
+
+    A single connection LISTENs on the task_events channel per worker
+    process, however many clients are streaming. Each notification is
+    delivered to the queues of the subscribers of its project.
+    """
+
+    def __init__(self, conninfo: str):
+        self.conninfo = conninfo
+        self._subscribers: dict[str, set[asyncio.Queue]] = defaultdict(set)
+        self._listener: asyncio.Task | None = None
+
+    async def start(self):
+        """Start listening for notifications in the background."""
+        if self._listener is None:
+            self._listener = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        """Stop the listener."""
+        if self._listener is not None:
+            self._listener.cancel()
+            try:
+                await self._listener
+            except asyncio.CancelledError:
+                pass
+            self._listener = None
+
+    async def _listen(self):
+        """Listen for notifications, reconnecting with backoff if it drops."""
+        delay = 1
+        while True:
+            try:
+                async with await AsyncConnection.connect(
+                    self.conninfo, autocommit=True
+                ) as conn:
+                    await conn.execute(f"LISTEN {TASK_EVENTS_CHANNEL}")
+                    log.debug(f"Listening for {TASK_EVENTS_CHANNEL} notifications")
+                    delay = 1
+                    async for notify in conn.notifies():
+                        self._publish(notify.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                log.warning(
+                    f"Task event listener disconnected, retrying in {delay}s: {e}"
+                )
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    def _publish(self, payload: str):
+        """Deliver a notification payload to the subscribers of its project."""
+        try:
+            project_id = json.loads(payload)["project_id"]
+        except (ValueError, KeyError):
+            log.warning(f"Ignoring malformed task event notification: {payload}")
+            return
+
+        for queue in self._subscribers.get(project_id, ()):
+            try:
+                queue.put_nowait(payload)
+            except asyncio.QueueFull:
+                log.warning(f"Dropping task event for slow subscriber of {project_id}")
+
+    @asynccontextmanager
+    async def subscribe(self, project_id: UUID) -> AsyncIterator[asyncio.Queue]:
+        """Subscribe to the task events of a project.
+
+        Yields a queue receiving the JSON payload of each new event.
+        """
+        key = str(project_id)
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self._subscribers[key].add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers[key].discard(queue)
+            if not self._subscribers[key]:
+                del self._subscribers[key]
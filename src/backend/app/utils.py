@@ -1,18 +1,22 @@
+import asyncio
 import base64
 import json
 import logging
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from datetime import datetime, timezone
 from email.mime.text import MIMEText
-from email.utils import formataddr
+from email.utils import format_datetime, formataddr, parsedate_to_datetime
 from pathlib import Path
-from typing import Any, Dict, Optional, Union
+from typing import Any, Callable, Dict, Hashable, Optional, Union
 
 import geojson
 import requests
 import shapely
 from aiosmtplib import send as send_email
-from fastapi import HTTPException
+from fastapi import HTTPException, Request, Response
 from geoalchemy2 import WKBElement
 from geoalchemy2.shape import from_shape, to_shape
 from geojson_pydantic import Feature, MultiPolygon, Polygon
@@ -25,6 +29,7 @@ from shapely.geometry import Point, mapping, shape
 from shapely.ops import transform, unary_union
 
 from app.config import settings
+from app.models.enums import HTTPStatus
 
 log = logging.getLogger(__name__)
 
@@ -37,6 +42,19 @@ def timestamp():
     return datetime.now(timezone.utc)
 
 
+async def run_in_process(func: Callable, *args) -> Any:
+    """Run a blocking, CPU bound function (e.g. GDAL) in a separate process.
+
+    The process is spawned rather than forked, as forking a process running
+    an event loop is unsafe. The function must be importable from a module
+    without side effects, and its arguments picklable.
+    """
+    with ProcessPoolExecutor(
+        max_workers=1, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        return await asyncio.get_running_loop().run_in_executor(executor, func, *args)
+
+
 def str_to_geojson(
     result: str, properties: Optional[dict] = None, id: Optional[str] = None
 ) -> Union[Feature, dict]:
@@ -627,3 +645,86 @@ def strip_presigned_url_for_local_dev(url: str) -> str:
     except Exception as e:
         log.debug(f"Failed to convert S3 URL for local development: {e}")
         return url
+
+
+class LRUCache:
+    """A small in-process least-recently-used cache.
+
+    Used for derived artefacts (e.g. map tiles) that are expensive to
+    generate but cheap to keep in memory. Not shared between workers.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        self.maxsize = maxsize
+        self._data: OrderedDict = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        """Return the cached value, or None if the key is missing."""
+        try:
+            self._data.move_to_end(key)
+        except KeyError:
+            return None
+        return self._data[key]
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry if full."""
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached entries."""
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def make_etag(*parts: Any) -> str:
+    """Build a strong ETag from the parts identifying a representation."""
+    return '"' + "-".join(str(part) for part in parts) + '"'
+
+
+def check_not_modified(
+    request: Request,
+    response: Response,
+    etag: str,
+    last_modified: Optional[datetime] = None,
+) -> Optional[Response]:
+    """Evaluate conditional GET headers against the current validators.
+
+    The ETag and Last-Modified headers are set on `response`. If the
+    client's copy is still current, a `304 Not Modified` response is
+    returned for the endpoint to send instead of rebuilding the body.
+    """
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if last_modified is not None:
+        if last_modified.tzinfo is None:
+            last_modified = last_modified.replace(tzinfo=timezone.utc)
+        headers["Last-Modified"] = format_datetime(
+            last_modified.astimezone(timezone.utc), usegmt=True
+        )
+    response.headers.update(headers)
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        candidates = {
+            tag.strip().removeprefix("W/") for tag in if_none_match.split(",")
+        }
+        if "*" in candidates or etag in candidates:
+            return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+        return None
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return None
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        if last_modified.replace(microsecond=0) <= since:
+            return Response(status_code=HTTPStatus.NOT_MODIFIED, headers=headers)
+
+    return None
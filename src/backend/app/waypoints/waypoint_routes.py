@@ -29,7 +29,7 @@ from app.config import settings
 from app.db import database
 from app.models.enums import HTTPStatus
 from app.projects import project_deps
-from app.s3 import get_file_from_bucket
+from app.s3 import async_s3_client
 from app.tasks.task_logic import (
     get_take_off_point_from_db,
     get_task_geojson,
@@ -157,7 +157,7 @@ async def get_task_waypoint(
         points = waypoint_data["geojson"]
 
         try:
-            get_file_from_bucket(
+            await async_s3_client().fget(
                 settings.S3_BUCKET_NAME,
                 f"dtm-data/projects/{project_id}/dem.tif",
                 dem_path,
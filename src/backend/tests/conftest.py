@@ -2,6 +2,8 @@ from typing import Any, AsyncGenerator
 
 import pytest
 import pytest_asyncio
+from arq import ArqRedis, create_pool
+from arq.connections import RedisSettings
 from asgi_lifespan import LifespanManager
 from fastapi import FastAPI
 from httpx import ASGITransport, AsyncClient
@@ -28,6 +30,16 @@ async def db() -> AsyncConnection:
         await db_conn.close()
 
 
+@pytest_asyncio.fixture(scope="function")
+async def redis() -> ArqRedis:
+    """The ARQ Redis pool, as used to enqueue jobs."""
+    pool = await create_pool(RedisSettings.from_dsn(settings.REDIS_DSN))
+    try:
+        yield pool
+    finally:
+        await pool.close()
+
+
 @pytest_asyncio.fixture(scope="function")
 async def auth_user(db) -> AuthUser:
     """Create a test user."""
@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from app.gcp.gcp_crud import calculate_footprints, calculate_pixel_coordinates
+
+
+@pytest.mark.parametrize("yaw", [0, 37.5, 180])
+def test_pixel_coordinates(yaw):
+    """Points are located in images from the footprints of the images."""
+    longitudes = np.array([85.3, 85.3])
+    latitudes = np.array([27.7, 27.7])
+    widths = np.array([4000, 4000])
+    heights = np.array([3000, 3000])
+    corners = calculate_footprints(
+        longitudes, latitudes, widths, heights, np.full(2, yaw), 100
+    )
+
+    # The image centre, and the middle of the top edge of the image
+    points = np.stack([longitudes, latitudes], axis=-1)
+    points[1] = corners[1, :2].mean(axis=0)
+
+    pixels = calculate_pixel_coordinates(corners, widths, heights, points)
+
+    assert pixels == pytest.approx(np.array([[2000, 1500], [2000, 0]]), abs=1)
+
+
+def test_footprint_size():
+    """Footprints follow the flight altitude and the camera's field of view."""
+    corners = calculate_footprints(
+        np.array([0.0]),
+        np.array([0.0]),
+        np.array([4000]),
+        np.array([3000]),
+        np.array([0.0]),
+        100,
+        fov_degree=90,
+    )[0]
+
+    metres_per_degree = 6378137 * np.pi / 180
+    width, height = (corners[1] - corners[3]) * metres_per_degree
+    # The diagonal spans twice the altitude, with a 90 degree field of view
+    assert (width, height) == pytest.approx((160, 120))
+
+
+if __name__ == "__main__":
+    """Main func if file invoked directly."""
+    pytest.main()
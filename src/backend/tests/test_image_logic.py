@@ -0,0 +1,77 @@
+import uuid
+from contextlib import asynccontextmanager
+
+import pytest
+from psycopg.rows import dict_row
+
+from app.config import settings
+from app.images.image_logic import (
+    extract_image_metadata,
+    sync_task_images,
+    task_images_prefix,
+)
+from app.s3 import async_s3_client
+from tests.test_image_staging import make_jpeg_header
+
+
+class ConnectionPool:
+    """A pool handing out the test connection, so its transaction is seen."""
+
+    def __init__(self, db):
+        self.db = db
+
+    @asynccontextmanager
+    async def connection(self):
+        yield self.db
+
+
+@pytest.mark.asyncio
+async def test_extract_image_metadata(db, create_test_project):
+    """The metadata of the pending manifest images is read from their headers."""
+    project_id = uuid.UUID(create_test_project)
+    task_id = uuid.uuid4()
+    prefix = task_images_prefix(project_id, task_id)
+    objects = {
+        f"{prefix}DJI_0001.JPG": make_jpeg_header(-27.5, 153.25),
+        f"{prefix}flight.txt": b"Not an image",
+    }
+    s3 = async_s3_client()
+    for s3_key, data in objects.items():
+        await s3.put(settings.S3_BUCKET_NAME, s3_key, data)
+
+    try:
+        assert await sync_task_images(db, project_id, task_id) == 1
+        ctx = {"db_pool": ConnectionPool(db)}
+        result = await extract_image_metadata(ctx, project_id, task_id)
+        assert result == {"images": 1, "located": 1}
+
+        async with db.cursor(row_factory=dict_row) as cur:
+            await cur.execute(
+                """
+                SELECT name, ST_Y(location) AS latitude, ST_X(location) AS longitude,
+                    width, height, metadata_read_at
+                FROM images
+                WHERE task_id = %(task_id)s
+                ORDER BY name
+                """,
+                {"task_id": task_id},
+            )
+            image, other = await cur.fetchall()
+        assert image["name"] == "DJI_0001.JPG"
+        assert image["latitude"] == pytest.approx(-27.5)
+        assert image["longitude"] == pytest.approx(153.25)
+        assert (image["width"], image["height"]) == (5472, 3648)
+        assert image["metadata_read_at"] is not None
+        # Only JPEG headers are read
+        assert other["metadata_read_at"] is None
+
+        # Images already read are skipped
+        result = await extract_image_metadata(ctx, project_id, task_id)
+        assert result == {"images": 0, "located": 0}
+    finally:
+        await s3.delete_many(settings.S3_BUCKET_NAME, list(objects))
+
+
+if __name__ == "__main__":
+    """Main func if file invoked directly."""
+    pytest.main()
@@ -0,0 +1,70 @@
+import os
+import uuid
+import zipfile
+
+import pytest
+from arq.constants import job_key_prefix
+
+from app.projects.image_processing import extract_zip_member, odm_assets_job_id
+
+
+@pytest.fixture
+def assets_zip(tmp_path):
+    """An ODM assets.zip, with an orthophoto among other outputs."""
+    zip_path = tmp_path / "assets.zip"
+    with zipfile.ZipFile(zip_path, "w") as zip_file:
+        zip_file.writestr("odm_orthophoto/odm_orthophoto.tif", b"orthophoto" * 1000)
+        zip_file.writestr("odm_dem/dsm.tif", b"dsm")
+        zip_file.writestr("images.json", b"[]")
+    return str(zip_path)
+
+
+def test_extract_zip_member(assets_zip, tmp_path):
+    """Only the requested member is written out."""
+    output_dir = tmp_path / "extracted"
+    file_path = output_dir / "odm_orthophoto.tif"
+
+    assert extract_zip_member(
+        assets_zip, "odm_orthophoto/odm_orthophoto.tif", str(file_path)
+    )
+
+    assert file_path.read_bytes() == b"orthophoto" * 1000
+    assert os.listdir(output_dir) == ["odm_orthophoto.tif"]
+
+
+def test_extract_zip_member_missing(assets_zip, tmp_path):
+    """A missing member is reported, and nothing is written."""
+    output_dir = tmp_path / "extracted"
+
+    assert not extract_zip_member(
+        assets_zip, "odm_dem/dtm.tif", str(output_dir / "dtm.tif")
+    )
+
+    assert not output_dir.exists()
+
+
+@pytest.mark.asyncio
+async def test_odm_assets_job_enqueued_once(redis):
+    """A webhook delivered twice enqueues the assets job once."""
+    odm_task_id = str(uuid.uuid4())
+    job_id = odm_assets_job_id(odm_task_id)
+    queue_name = f"test_queue_{odm_task_id}"
+
+    try:
+        first = await redis.enqueue_job(
+            "process_assets_from_odm", _job_id=job_id, _queue_name=queue_name
+        )
+        second = await redis.enqueue_job(
+            "process_assets_from_odm", _job_id=job_id, _queue_name=queue_name
+        )
+
+        assert first is not None
+        assert second is None
+        assert await redis.zcard(queue_name) == 1
+    finally:
+        await redis.delete(queue_name, job_key_prefix + job_id)
+
+
+if __name__ == "__main__":
+    """Main func if file invoked directly."""
+    pytest.main()
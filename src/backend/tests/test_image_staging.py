@@ -0,0 +1,156 @@
+import struct
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from shapely.geometry import box
+
+from app.images.exif import (
+    EXIF_HEADER,
+    XMP_HEADER,
+    ImageMetadata,
+    read_metadata,
+    set_exif_dimensions,
+)
+from app.images.image_staging import StagingOptions, cull_images, image_gsd
+
+
+def rational(value: float) -> tuple:
+    return (round(value * 10000), 10000)
+
+
+def ifd(entries: list, offset: int) -> bytes:
+    """Pack a little endian TIFF IFD at `offset`, with its values after it.
+
+    Args:
+        entries: (tag, field type, count, values) tuples, values being the
+            raw bytes of the field.
+    """
+    values_offset = offset + 2 + 12 * len(entries) + 4
+    table, values = b"", b""
+    for tag, field_type, count, data in entries:
+        if len(data) <= 4:
+            table += struct.pack("<HHI", tag, field_type, count) + data.ljust(4, b"\0")
+        else:
+            pointer = values_offset + len(values)
+            table += struct.pack("<HHII", tag, field_type, count, pointer)
+            values += data
+    return struct.pack("<H", len(entries)) + table + b"\0\0\0\0" + values
+
+
+def make_jpeg_header(latitude: float, longitude: float) -> bytes:
+    """Build the start of a JPEG, with EXIF, DJI XMP and frame header segments."""
+    make = b"DJI\0"
+    model = b"FC6310\0"
+    # IFD0 is 2 + 4 * 12 + 4 bytes long, after the 8 byte TIFF header, and
+    # only the model is too long to be stored in its entry
+    exif_offset = 8 + 54 + len(model)
+    exif_entries = [
+        (0x9003, 2, 20, b"2025:03:01 10:20:30\0"),
+        (0x9011, 2, 7, b"+05:45\0"),
+        (0xA405, 3, 1, struct.pack("<H", 24)),
+        (0xA002, 4, 1, struct.pack("<I", 5472)),
+        (0xA003, 3, 1, struct.pack("<H", 3648)),
+    ]
+    exif_size = len(ifd(exif_entries, exif_offset))
+    gps_offset = exif_offset + exif_size
+    gps_entries = [
+        (1, 2, 2, b"S\0"),
+        (2, 5, 3, struct.pack("<6I", *rational(abs(latitude)), 0, 1, 0, 1)),
+        (3, 2, 2, b"E\0"),
+        (4, 5, 3, struct.pack("<6I", *rational(longitude), 0, 1, 0, 1)),
+        (5, 1, 1, b"\0"),
+        (6, 5, 1, struct.pack("<2I", 1234500, 1000)),
+    ]
+    ifd0 = ifd(
+        [
+            (0x010F, 2, len(make), make),
+            (0x0110, 2, len(model), model),
+            (0x8769, 4, 1, struct.pack("<I", exif_offset)),
+            (0x8825, 4, 1, struct.pack("<I", gps_offset)),
+        ],
+        8,
+    )
+    tiff = (
+        b"II*\0"
+        + struct.pack("<I", 8)
+        + ifd0
+        + ifd(exif_entries, exif_offset)
+        + ifd(gps_entries, gps_offset)
+    )
+    xmp = XMP_HEADER + (
+        b'<rdf:Description drone-dji:RelativeAltitude="+99.80" '
+        b'drone-dji:GimbalPitchDegree="-90.00" drone-dji:GimbalYawDegree="+12.5"/>'
+    )
+    frame = b"\x08" + struct.pack(">HH", 3648, 5472) + b"\x03"
+
+    def segment(marker: int, payload: bytes) -> bytes:
+        return struct.pack(">BBH", 0xFF, marker, len(payload) + 2) + payload
+
+    return (
+        b"\xff\xd8"
+        + segment(0xE1, EXIF_HEADER + tiff)
+        + segment(0xE1, xmp)
+        + segment(0xC0, frame)
+        + b"\xff\xda"
+    )
+
+
+def test_read_metadata():
+    """GPS, time, camera and dimensions are read from the JPEG header."""
+    metadata = read_metadata(make_jpeg_header(-27.5, 153.25))
+
+    assert (metadata.width, metadata.height) == (5472, 3648)
+    assert metadata.latitude == pytest.approx(-27.5)
+    assert metadata.longitude == pytest.approx(153.25)
+    assert metadata.altitude == pytest.approx(1234.5)
+    assert metadata.relative_altitude == pytest.approx(99.8)
+    assert metadata.gimbal_pitch == -90
+    assert metadata.gimbal_yaw == 12.5
+    assert (metadata.make, metadata.model) == ("DJI", "FC6310")
+    assert metadata.focal_length_35mm == 24
+    assert metadata.captured_at == datetime(
+        2025, 3, 1, 10, 20, 30, tzinfo=timezone(timedelta(hours=5, minutes=45))
+    )
+
+    # The EXIF of a resampled image records its new size
+    exif_segment = set_exif_dimensions(metadata.exif_segment, 2736, 1824)
+    resampled = read_metadata(b"\xff\xd8" + exif_segment + b"\xff\xda")
+    assert (resampled.width, resampled.height) == (2736, 1824)
+    assert resampled.latitude == pytest.approx(-27.5)
+
+    # 100m * 36mm / (24mm * 5472px), from the project's flight altitude
+    gsd = image_gsd(metadata, StagingOptions(altitude=100))
+    assert gsd == pytest.approx(2.74, abs=0.01)
+
+
+def test_cull_images():
+    """Images outside the area and taken at the same position are culled."""
+    start = datetime(2025, 3, 1, 10, 0, tzinfo=timezone.utc)
+
+    def image(seconds: int, longitude: float, yaw: float = 0) -> ImageMetadata:
+        return ImageMetadata(
+            latitude=0,
+            longitude=longitude,
+            relative_altitude=100,
+            gimbal_yaw=yaw,
+            captured_at=start + timedelta(seconds=seconds),
+        )
+
+    images = [
+        ("hover_1.jpg", image(1, 0.0005)),
+        ("first.jpg", image(0, 0.0005)),
+        ("hover_2.jpg", image(2, 0.0005000001)),
+        ("oblique.jpg", image(3, 0.0005, yaw=90)),
+        ("next.jpg", image(4, 0.0006)),
+        ("outside.jpg", image(5, 0.01)),
+        ("no_gps.jpg", None),
+    ]
+
+    culled = cull_images(images, box(0, -0.001, 0.001, 0.001))
+
+    assert sorted(culled) == ["hover_1.jpg", "hover_2.jpg", "outside.jpg"]
+
+
+if __name__ == "__main__":
+    """Main func if file invoked directly."""
+    pytest.main()
@@ -0,0 +1,107 @@
+import json
+
+import pytest
+from osgeo import gdal, osr
+
+from app.projects.mosaic import TILE_SIZE, build_mosaic, render_tile
+
+WIDTH, HEIGHT = 1200, 600
+# Size of the test rasters, in degrees
+SPAN_X, SPAN_Y = 0.002, 0.001
+
+
+def make_orthophoto(path: str, min_x: float, color: tuple):
+    """Write a single colour RGBA GeoTIFF in EPSG:4326."""
+    dataset = gdal.GetDriverByName("GTiff").Create(
+        path, WIDTH, HEIGHT, 4, gdal.GDT_Byte
+    )
+    dataset.SetGeoTransform((min_x, SPAN_X / WIDTH, 0, SPAN_Y, 0, -SPAN_Y / HEIGHT))
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    dataset.SetProjection(srs.ExportToWkt())
+    for band, value in enumerate((*color, 255), 1):
+        dataset.GetRasterBand(band).Fill(value)
+    dataset.GetRasterBand(4).SetColorInterpretation(gdal.GCI_AlphaBand)
+    dataset = None
+    return path
+
+
+def box(min_x: float, max_x: float) -> str:
+    return json.dumps(
+        {
+            "type": "Polygon",
+            "coordinates": [
+                [
+                    [min_x, 0],
+                    [max_x, 0],
+                    [max_x, SPAN_Y],
+                    [min_x, SPAN_Y],
+                    [min_x, 0],
+                ]
+            ],
+        }
+    )
+
+
+def test_build_mosaic(tmp_path):
+    """Overlapping rasters are clipped to their cutlines and merged to a COG."""
+    red = make_orthophoto(str(tmp_path / "red.tif"), 0, (255, 0, 0))
+    blue = make_orthophoto(str(tmp_path / "blue.tif"), 0.001, (0, 0, 255))
+    output = str(tmp_path / "mosaic.tif")
+
+    build_mosaic([(red, box(0, 0.0015)), (blue, box(0.0015, 0.003))], output)
+
+    dataset = gdal.Open(output)
+    assert dataset.GetMetadataItem("LAYOUT", "IMAGE_STRUCTURE") == "COG"
+    assert dataset.GetMetadataItem("COMPRESSION", "IMAGE_STRUCTURE") == "JPEG"
+    # The alpha band is stored as a mask
+    assert dataset.RasterCount == 3
+    assert dataset.GetRasterBand(1).GetMaskFlags() == gdal.GMF_PER_DATASET
+    assert dataset.GetRasterBand(1).GetOverviewCount() > 0
+    srs = osr.SpatialReference(wkt=dataset.GetProjection())
+    assert srs.GetAuthorityCode(None) == "3857"
+
+    def pixel(fraction_x: float) -> tuple:
+        x = int(dataset.RasterXSize * fraction_x)
+        return tuple(dataset.ReadRaster(x, dataset.RasterYSize // 2, 1, 1))
+
+    # JPEG is lossy, hence the approximate colours
+    assert pixel(1 / 6) == pytest.approx((255, 0, 0), abs=8)
+    # Covered by both, but clipped to the red raster's cutline
+    assert pixel(0.4) == pytest.approx((255, 0, 0), abs=8)
+    assert pixel(5 / 6) == pytest.approx((0, 0, 255), abs=8)
+
+
+def test_render_tile(tmp_path):
+    """Tiles are rendered as RGBA PNGs, transparent outside the raster."""
+    red = make_orthophoto(str(tmp_path / "red.tif"), 0, (255, 0, 0))
+    output = build_mosaic([(red, None)], str(tmp_path / "mosaic.tif"))
+
+    dataset = gdal.Open(output)
+    min_x, pixel_width, _, max_y, _, pixel_height = dataset.GetGeoTransform()
+    width = dataset.RasterXSize * pixel_width
+    height = -dataset.RasterYSize * pixel_height
+    dataset = None
+    # Twice the size of the raster, which covers the lower left quarter
+    bounds = (min_x, max_y - height, min_x + 2 * width, max_y + height)
+
+    tile_path = str(tmp_path / "tile.png")
+    with open(tile_path, "wb") as tile_file:
+        tile_file.write(render_tile(output, bounds))
+
+    tile = gdal.Open(tile_path)
+    assert tile.GetDriver().ShortName == "PNG"
+    assert (tile.RasterXSize, tile.RasterYSize) == (TILE_SIZE, TILE_SIZE)
+    assert tile.RasterCount == 4
+
+    def pixel(x: int, y: int) -> tuple:
+        return tuple(tile.ReadRaster(x, y, 1, 1))
+
+    lower_left = pixel(TILE_SIZE // 4, TILE_SIZE * 3 // 4)
+    assert lower_left == pytest.approx((255, 0, 0, 255), abs=8)
+    assert pixel(TILE_SIZE * 3 // 4, TILE_SIZE // 4)[3] == 0
+
+
+if __name__ == "__main__":
+    """Main func if file invoked directly."""
+    pytest.main()
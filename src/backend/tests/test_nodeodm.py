@@ -0,0 +1,174 @@
+import json
+import os
+import uuid
+
+import pytest
+import pytest_asyncio
+from aiohttp import web
+
+from app.config import settings
+from app.projects import nodeodm, odm_nodes
+from app.projects.nodeodm import NodeODMClient, NodeODMError
+
+
+class FakeNodeODM:
+    """A NodeODM HTTP stub, which also serves the source files."""
+
+    def __init__(self):
+        self.sources = {}
+        self.tasks = {}
+        self.removed = []
+        self.info = {"taskQueueCount": 0, "maxParallelTasks": 1, "maxImages": None}
+        self.app = web.Application()
+        self.app.router.add_get("/info", self.get_info)
+        self.app.router.add_get("/files/{name}", self.get_file)
+        self.app.router.add_post("/task/new/init", self.init)
+        self.app.router.add_post("/task/new/upload/{uuid}", self.upload)
+        self.app.router.add_post("/task/new/commit/{uuid}", self.commit)
+        self.app.router.add_post("/task/remove", self.remove)
+
+    async def get_info(self, request):
+        return web.json_response(self.info)
+
+    async def get_file(self, request):
+        name = request.match_info["name"]
+        if name not in self.sources:
+            raise web.HTTPNotFound()
+        return web.Response(body=self.sources[name])
+
+    async def init(self, request):
+        form = await request.post()
+        task_id = str(uuid.uuid4())
+        self.tasks[task_id] = {
+            "name": form.get("name"),
+            "options": json.loads(form["options"]),
+            "webhook": form.get("webhook"),
+            "files": {},
+            "committed": False,
+        }
+        return web.json_response({"uuid": task_id})
+
+    async def upload(self, request):
+        task = self.tasks[request.match_info["uuid"]]
+        reader = await request.multipart()
+        while part := await reader.next():
+            task["files"][part.filename] = await part.read()
+        return web.json_response({"success": True})
+
+    async def commit(self, request):
+        task_id = request.match_info["uuid"]
+        self.tasks[task_id]["committed"] = True
+        return web.json_response({"uuid": task_id})
+
+    async def remove(self, request):
+        form = await request.post()
+        self.removed.append(form["uuid"])
+        return web.json_response({"success": True})
+
+
+async def start_fake_node(runners):
+    fake = FakeNodeODM()
+    runner = web.AppRunner(fake.app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    runners.append(runner)
+    port = site._server.sockets[0].getsockname()[1]
+    fake.url = f"http://127.0.0.1:{port}"
+    return fake
+
+
+@pytest_asyncio.fixture
+async def fake_nodes():
+    """Start fake nodes on demand, stopping them after the test."""
+    runners = []
+    try:
+        yield lambda: start_fake_node(runners)
+    finally:
+        for runner in runners:
+            await runner.cleanup()
+
+
+@pytest_asyncio.fixture
+async def fake_node(fake_nodes):
+    return await fake_nodes()
+
+
+@pytest.mark.asyncio
+async def test_create_task_from_urls(fake_node):
+    """Files are streamed from their URLs to the node in batches."""
+    fake_node.sources = {f"image_{i}.jpg": os.urandom(50_000) for i in range(23)}
+    sources = [
+        (f"task_file_{i}.jpg", f"{fake_node.url}/files/{name}")
+        for i, name in enumerate(fake_node.sources)
+    ]
+    options = [{"name": "dsm", "value": True}]
+
+    async with NodeODMClient(fake_node.url) as node:
+        odm_task_id = await node.create_task_from_urls(
+            sources, name="DTM-Task", options=options, batch_size=5
+        )
+
+    task = fake_node.tasks[odm_task_id]
+    assert task["committed"]
+    assert task["name"] == "DTM-Task"
+    assert task["options"] == options
+    assert task["files"] == {
+        f"task_file_{i}.jpg": content
+        for i, content in enumerate(fake_node.sources.values())
+    }
+
+
+@pytest.mark.asyncio
+async def test_create_task_from_urls_failure(fake_node, monkeypatch):
+    """A failed upload removes the task from the node."""
+    monkeypatch.setattr(nodeodm, "UPLOAD_BACKOFF_SECONDS", 0)
+    fake_node.sources = {"image.jpg": b"image"}
+    sources = [
+        ("a.jpg", f"{fake_node.url}/files/image.jpg"),
+        ("b.jpg", f"{fake_node.url}/files/missing.jpg"),
+    ]
+
+    async with NodeODMClient(fake_node.url) as node:
+        with pytest.raises(NodeODMError):
+            await node.create_task_from_urls(sources, batch_size=1)
+
+    (odm_task_id,) = fake_node.tasks
+    assert not fake_node.tasks[odm_task_id]["committed"]
+    assert fake_node.removed == [odm_task_id]
+
+
+@pytest.mark.asyncio
+async def test_rank_nodes(fake_nodes, monkeypatch):
+    """Nodes are ordered by queue per capacity, unreachable nodes last."""
+    busy, weighted, idle, small = [await fake_nodes() for _ in range(4)]
+    busy.info["taskQueueCount"] = 3
+    weighted.info["taskQueueCount"] = 2
+    small.info["maxImages"] = 100
+    dead_url = "http://127.0.0.1:1"
+
+    monkeypatch.setattr(settings, "NODE_ODM_URL", busy.url)
+    monkeypatch.setattr(
+        settings,
+        "NODE_ODM_URLS",
+        f"{dead_url},{weighted.url}|4,{idle.url},{small.url},{busy.url}",
+    )
+
+    assert await odm_nodes.rank_nodes(image_count=500) == [
+        idle.url,
+        weighted.url,
+        busy.url,
+        dead_url,
+    ]
+
+    # No node is left when none accepts that many images
+    monkeypatch.setattr(settings, "NODE_ODM_URL", small.url)
+    monkeypatch.setattr(settings, "NODE_ODM_URLS", small.url + "," + busy.url)
+    busy.info["maxImages"] = 200
+    with pytest.raises(NodeODMError, match="No NodeODM node accepts 500 images"):
+        await odm_nodes.rank_nodes(image_count=500)
+
+
+if __name__ == "__main__":
+    """Main func if file invoked directly."""
+    pytest.main()
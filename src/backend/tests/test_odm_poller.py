@@ -0,0 +1,192 @@
+import time
+import uuid
+from contextlib import asynccontextmanager
+
+import pytest
+import pytest_asyncio
+from pyodm.types import TaskStatus
+
+from app.config import settings
+from app.projects import image_processing, odm_poller
+from app.projects.nodeodm import NodeODMError
+from app.projects.odm_poller import CLAIM_LEASE, CLAIM_SCRIPT, WatchedTask
+
+
+class FakeNode:
+    """A NodeODM client answering task info with the given responses in turn."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+
+    async def task_info(self, odm_task_id):
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class FakePool:
+    """A connection pool, for a status handler which doesn't use the database."""
+
+    @asynccontextmanager
+    async def connection(self):
+        yield None
+
+
+def task_info(status: TaskStatus, progress: float = 0) -> dict:
+    return {"status": {"code": status.value}, "progress": progress}
+
+
+@pytest_asyncio.fixture
+async def poller_redis(redis, monkeypatch):
+    """Redis, with the poller keys under a prefix removed afterwards."""
+    prefix = f"test:{uuid.uuid4()}:"
+    monkeypatch.setattr(odm_poller, "WATCHED_KEY", f"{prefix}odm:watched")
+    monkeypatch.setattr(odm_poller, "WATCH_KEY", f"{prefix}odm:watch:{{}}")
+    monkeypatch.setattr(odm_poller, "PROGRESS_KEY", f"{prefix}odm:progress:{{}}")
+    try:
+        yield redis
+    finally:
+        keys = [key async for key in redis.scan_iter(match=f"{prefix}*")]
+        if keys:
+            await redis.delete(*keys)
+
+
+@pytest.fixture
+def handled(monkeypatch):
+    """Record the calls to the shared ODM task status handler."""
+    calls = []
+
+    async def handle_odm_task_status(db, redis, *args):
+        calls.append(args)
+
+    monkeypatch.setattr(
+        image_processing, "handle_odm_task_status", handle_odm_task_status
+    )
+    return calls
+
+
+def watched_task(finish: bool = True) -> WatchedTask:
+    return WatchedTask(
+        odm_task_id=str(uuid.uuid4()),
+        node_url="http://odm",
+        dtm_project_id=str(uuid.uuid4()),
+        dtm_user_id="101039844375937810000",
+        dtm_task_id=str(uuid.uuid4()),
+        finish=finish,
+    )
+
+
+async def is_watched(redis, odm_task_id: str) -> bool:
+    return await redis.zscore(odm_poller.WATCHED_KEY, odm_task_id) is not None
+
+
+@pytest.mark.asyncio
+async def test_claim(poller_redis):
+    """Due tasks are claimed once, then again when their lease expires."""
+    due, later = watched_task(), watched_task()
+    for task in (due, later):
+        await odm_poller.save(poller_redis, task)
+    now = time.time()
+    await poller_redis.zadd(odm_poller.WATCHED_KEY, {due.odm_task_id: now - 1})
+    claim = poller_redis.register_script(CLAIM_SCRIPT)
+
+    async def claimed(at: float) -> list:
+        odm_task_ids = await claim(
+            keys=[odm_poller.WATCHED_KEY], args=[at, at + CLAIM_LEASE, 100]
+        )
+        return [odm_task_id.decode() for odm_task_id in odm_task_ids]
+
+    assert await claimed(now) == [due.odm_task_id]
+    # Leased to the worker which claimed it
+    assert await claimed(now) == []
+    assert await claimed(now + CLAIM_LEASE - 1) == [later.odm_task_id]
+    assert await claimed(now + CLAIM_LEASE + 1) == [due.odm_task_id]
+
+
+@pytest.mark.asyncio
+async def test_poll_backoff(poller_redis):
+    """Polls back off while progress stalls or the node fails."""
+    task = watched_task()
+    node = FakeNode(
+        task_info(TaskStatus.RUNNING, 10),
+        task_info(TaskStatus.RUNNING, 10),
+        task_info(TaskStatus.RUNNING, 10),
+        NodeODMError("Bad gateway"),
+        task_info(TaskStatus.RUNNING, 20),
+        *[task_info(TaskStatus.RUNNING, 20)] * 6,
+    )
+    ctx = {"redis": poller_redis}
+    intervals = []
+    for _ in range(11):
+        await odm_poller.poll_task(ctx, node, task)
+        intervals.append(task.interval)
+
+    low, high = settings.ODM_POLL_MIN_INTERVAL, settings.ODM_POLL_MAX_INTERVAL
+    assert intervals == [
+        low,
+        2 * low,
+        4 * low,
+        8 * low,
+        low,
+        *[min(2**i * low, high) for i in range(1, 7)],
+    ]
+    assert intervals[-1] == high
+
+    # The next poll is scheduled after the interval
+    score = await poller_redis.zscore(odm_poller.WATCHED_KEY, task.odm_task_id)
+    assert score == pytest.approx(time.time() + high, abs=5)
+    (progress,) = await odm_poller.get_progress(poller_redis, [task.odm_task_id])
+    assert (progress["status"], progress["progress"]) == ("RUNNING", 20)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("finish", [True, False])
+async def test_poll_gives_up(poller_redis, handled, finish):
+    """A task failing MAX_POLL_ERRORS polls in a row is failed and unwatched."""
+    task = watched_task(finish)
+    node = FakeNode(*[NodeODMError("Unreachable")] * odm_poller.MAX_POLL_ERRORS)
+    ctx = {"redis": poller_redis, "db_pool": FakePool()}
+
+    for _ in range(odm_poller.MAX_POLL_ERRORS - 1):
+        await odm_poller.poll_task(ctx, node, task)
+        assert await is_watched(poller_redis, task.odm_task_id)
+    await odm_poller.poll_task(ctx, node, task)
+
+    assert not await is_watched(poller_redis, task.odm_task_id)
+    assert not await poller_redis.exists(odm_poller.WATCH_KEY.format(task.odm_task_id))
+    if finish:
+        assert [call[:2] for call in handled] == [
+            (task.odm_task_id, TaskStatus.FAILED.value)
+        ]
+    else:
+        assert handled == []
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "status", [TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELED]
+)
+async def test_poll_finishes(poller_redis, handled, status):
+    """An ended task is passed to the shared status handler, and unwatched."""
+    task = watched_task()
+    await odm_poller.save(poller_redis, task)
+    ctx = {"redis": poller_redis, "db_pool": FakePool()}
+
+    await odm_poller.poll_task(ctx, FakeNode(task_info(status, 100)), task)
+
+    assert handled == [
+        (
+            task.odm_task_id,
+            status.value,
+            uuid.UUID(task.dtm_project_id),
+            task.dtm_user_id,
+            uuid.UUID(task.dtm_task_id),
+        )
+    ]
+    assert not await is_watched(poller_redis, task.odm_task_id)
+
+
+if __name__ == "__main__":
+    """Main func if file invoked directly."""
+    pytest.main()
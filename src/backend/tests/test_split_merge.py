@@ -0,0 +1,79 @@
+import uuid
+
+import pytest
+
+from app.projects.split_merge import group_tasks, overlap_ring
+
+
+def grid_tasks(rows: int, cols: int, image_count: int):
+    """Tasks on a grid, each adjacent to the tasks around it."""
+    ids = {(r, c): uuid.uuid4() for r in range(rows) for c in range(cols)}
+    return {
+        task_id: {
+            "x": c,
+            "y": r,
+            "image_count": image_count,
+            "neighbours": [
+                ids[(r + dr, c + dc)]
+                for dr in (-1, 0, 1)
+                for dc in (-1, 0, 1)
+                if (dr, dc) != (0, 0) and (r + dr, c + dc) in ids
+            ],
+        }
+        for (r, c), task_id in ids.items()
+    }
+
+
+def test_group_tasks():
+    """Every task is in one submodel of adjacent tasks, within the budget."""
+    tasks = grid_tasks(6, 6, image_count=100)
+    submodels = group_tasks(tasks, max_images=1600)
+
+    grouped = [task_id for submodel in submodels for task_id in submodel.task_ids]
+    assert sorted(grouped, key=str) == sorted(tasks, key=str)
+    assert len(submodels) == 4
+
+    for submodel in submodels:
+        # The overlap images count against the budget
+        processed = len(submodel.task_ids) + len(submodel.overlap_task_ids)
+        assert submodel.image_count == 100 * processed <= 1600
+        # Each task after the first is adjacent to an earlier one
+        for i, task_id in enumerate(submodel.task_ids[1:], 1):
+            assert set(tasks[task_id]["neighbours"]) & set(submodel.task_ids[:i])
+        # The overlap is the ring of neighbouring tasks
+        assert set(submodel.overlap_task_ids) == overlap_ring(tasks, submodel.task_ids)
+
+
+def test_group_tasks_trimmed_overlap():
+    """A ring over the budget is trimmed to its nearest tasks."""
+    large, near, far = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    tasks = {
+        large: {"x": 0, "y": 0, "image_count": 300, "neighbours": [near, far]},
+        near: {"x": 1, "y": 0, "image_count": 100, "neighbours": [large, far]},
+        far: {"x": 0, "y": 2, "image_count": 100, "neighbours": [large, near]},
+    }
+
+    submodels = group_tasks(tasks, max_images=450)
+
+    assert submodels[0].task_ids == [large]
+    assert submodels[0].overlap_task_ids == [near]
+    assert submodels[0].image_count == 400
+
+
+def test_group_tasks_large_task():
+    """A task over the budget is processed alone."""
+    tasks = grid_tasks(1, 3, image_count=100)
+    large = next(iter(tasks))
+    tasks[large]["image_count"] = 1000
+
+    submodels = group_tasks(tasks, max_images=500)
+
+    assert submodels[0].task_ids == [large]
+    assert submodels[0].overlap_task_ids == []
+    # The large task doesn't fit in the overlap of the other two together
+    assert len(submodels) == 3
+
+
+if __name__ == "__main__":
+    """Main func if file invoked directly."""
+    pytest.main()
@@ -16,3 +16,31 @@ async def test_task_states(client, create_test_project):
 
     response = await client.get(f"/api/tasks/states/{project_id}")
     assert response.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_task_states_not_modified(client, create_test_project):
+    project_id = create_test_project
+
+    response = await client.get(f"/api/tasks/states/{project_id}")
+    assert response.status_code == 200
+    etag = response.headers["etag"]
+
+    response = await client.get(
+        f"/api/tasks/states/{project_id}", headers={"If-None-Match": etag}
+    )
+    assert response.status_code == 304
+    assert response.headers["etag"] == etag
+
+
+@pytest.mark.asyncio
+async def test_task_states_since(client, create_test_project):
+    project_id = create_test_project
+
+    response = await client.get(
+        f"/api/tasks/states/{project_id}", params={"since": "2100-01-01T00:00:00"}
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["tasks"] == []
+    assert data["cursor"].startswith("2100-01-01")